@@ -0,0 +1,53 @@
+# compares the typed loading of the input files with the default pd.read_csv inference
+# usage: python benchmark.py [data_dir] [repetitions]
+
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+import data
+
+if len(sys.argv) > 1:
+    data.DATA_DIR = sys.argv[1].rstrip('/') + '/'
+
+repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+
+def read_default( name ):
+
+    return pd.read_csv(data.DATA_DIR + data.DATA_FILES[name])
+
+
+# best time over the repetitions and peak python heap for a single call
+# note: tracemalloc does not see the memory pool of the pyarrow engine, only the resulting frame
+def measure( function, name ):
+
+    elapsed = []
+    for j in range(repetitions):
+        start = time.perf_counter()
+        function(name)
+        elapsed.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    frame = function(name)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(elapsed), peak, frame.memory_usage(deep=True).sum()
+
+
+print('engine:', data.CSV_ENGINE, ' repetitions:', repetitions)
+print('%-10s %12s %12s %12s %12s %12s %12s' % ( 'file', 'default ms', 'typed ms', 'default peak', 'typed peak', 'default size', 'typed size' ))
+
+totals = [ 0, 0, 0, 0, 0, 0 ]
+for name in data.DATA_FILES:
+    default_time, default_peak, default_size = measure( read_default, name )
+    typed_time,   typed_peak,   typed_size   = measure( data.read_data_file, name )
+
+    row = [ default_time * 1000, typed_time * 1000, default_peak / 2**20, typed_peak / 2**20, default_size / 2**20, typed_size / 2**20 ]
+    totals = [ total + value for total, value in zip(totals, row) ]
+
+    print('%-10s %12.1f %12.1f %10.2fMB %10.2fMB %10.2fMB %10.2fMB' % ( name, *row ))
+
+print('%-10s %12.1f %12.1f %10.2fMB %10.2fMB %10.2fMB %10.2fMB' % ( 'total', *totals ))
@@ -0,0 +1,76 @@
+# compares the size of the serialized plot sources and their memory with and without PLOT_COMPACT_DATA
+# usage: python benchmark_wire.py [data_dir]
+
+import sys
+import tracemalloc
+import numpy as np
+from bokeh.document import Document
+
+import data
+import util
+from config import PLOT_DATA_PRECISION
+
+if len(sys.argv) > 1:
+    data.DATA_DIR = sys.argv[1].rstrip('/') + '/'
+
+# the outputs shown in each plot source of main.py, by the name of their precision in PLOT_DATA_PRECISION
+SOURCE_OUTPUTS = { 'hosp':           [ 'hosp', 'hosp_uci' ],
+                   'total_deaths':   [ 'total_deaths', 'avg_deaths', 'avg_deaths_inf', 'avg_deaths_sup' ],
+                   'vacc_part':      [ 'vacc_part', 'vacc_full', 'vacc_boost' ],
+                   'avg_prevalence': [ 'max_prevalence', 'avg_prevalence', 'min_prevalence' ] }
+
+
+# the columns of the plot sources for a precision name, the mortality info has one source per age group
+def make_columns( values, name ):
+
+    precision = PLOT_DATA_PRECISION[name]
+    series    = [ values[output] for output in SOURCE_OUTPUTS.get(name, [ name ]) ]
+
+    if name == 'strat_mortality_info':
+        return [ util.make_dates_columns(values['dates'], precision, y=group['s_total'], y2=group['s_avg'], y3=group['avg_inf'], y4=group['avg_sup']) for group in series[0] ]
+
+    dates = values['dates'] if np.shape(series[0])[-1] == len(values['dates']) else values['dates2']
+
+    if np.ndim(series[0]) == 2:
+        return [ util.make_multi_dates_columns(dates, series[0], precision) ]
+
+    return [ util.make_dates_columns(dates, precision, **{ 'y' + str(j): datay for j, datay in enumerate(series) }) ]
+
+
+# serialized size, column bytes and python heap of the plot sources of each precision name
+def measure( values, compact ):
+
+    util.PLOT_COMPACT_DATA = compact
+
+    results = {}
+    for name in PLOT_DATA_PRECISION:
+        tracemalloc.start()
+        sources = [ util.ColumnDataSource(data=columns) for columns in make_columns(values, name) ]
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        document = Document()
+        for source in sources:
+            document.add_root(source)
+
+        column_bytes = sum( column.nbytes for source in sources for key, column in source.data.items() if key != 'x' )
+        results[name] = [ len(document.to_json_string()), column_bytes, current ]
+
+    return results
+
+
+values = data.get_data()['values']
+
+default = measure(values, False)
+compact = measure(values, True)
+
+print('%-22s %14s %14s %14s %14s %14s %14s' % ( 'series', 'default json', 'compact json', 'default cols', 'compact cols', 'default heap', 'compact heap' ))
+
+totals = [ 0, 0, 0, 0, 0, 0 ]
+for name in PLOT_DATA_PRECISION:
+    row    = [ element / 2**10 for pair in zip(default[name], compact[name]) for element in pair ]
+    totals = [ total + element for total, element in zip(totals, row) ]
+
+    print('%-22s %12.1fKB %12.1fKB %12.1fKB %12.1fKB %12.1fKB %12.1fKB' % ( name, *row ))
+
+print('%-22s %12.1fKB %12.1fKB %12.1fKB %12.1fKB %12.1fKB %12.1fKB' % ( 'total', *totals ))
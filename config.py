@@ -25,6 +25,19 @@ TITLE_SIZE_VERTICAL_LAYOUT   = '15pt'  # For mobile
 # for dynamic range adjustments
 PLOT_RANGE_FACTOR = 0.05
 
+# compact wire format for the plot sources, see benchmark_wire.py for the size and memory savings
+# when enabled the y columns are sent as float32, rounded to the decimals of the series below
+# the decimals are one more than what the tooltips show, so that the lines keep their shape
+PLOT_COMPACT_DATA = False
+
+PLOT_DATA_PRECISION = { 'total_tests': 1, 'positivity': 3, 'hosp': 0, 'cfr': 3, 'new': 1, 'rt': 3, 'total_deaths': 1, 'cv19_deaths': 1,
+                        'strat_cv19_new': 1, 'strat_cv19_deaths': 2, 'strat_cfr': 3, 'vacc_part': 0, 'incidence': 3,
+                        'strat_mortality_info': 1, 'avg_prevalence': 4 }
+
+# when enabled the stats tables follow the date sliders in the browser, from cumulative sums sent once with the document
+# the server then does no work for them when a slider moves, which suits the archived, read only deployment
+STATS_CLIENT_SIDE = False
+
 PLOT_X_LABEL  = 'Days'
 PLOT_Y_LABEL  = 'Count'
 PLOT_Y_LABEL2 = 'Value'
@@ -113,6 +126,9 @@ P_HEADING_STYLE = "font-size: 140%; font-weight: bold; padding-top: 7px; padding
 P_TEXT_STYLE    = "font-size: 100%; font-weight: normal; padding-top: 7px; color: #4d4d4d"
 P_TEXT_STYLE_L  = "font-size: 110%; font-weight: normal; padding-top: 7px; color: #4d4d4d"
 
+# shown by the sections after the first until they are built
+SECTION_LOADING_TEXT = f'<p style="{P_TEXT_STYLE}">Loading...</p>'
+
 PREV_TEXT_WIDTH = 410
 PREV_TEXT = f"""<div class="content" style="padding-top: 10px;">
                 <p style="{P_HEADING_STYLE}">
@@ -1,12 +1,22 @@
-import statistics as st
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 import glob
 import os
 import csv
-import math
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+import time
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
 from datetime import datetime
+from pandas_bokeh.geoplot import convert_geoDataFrame_to_patches
+
+from kernels import make_array, get_prefix_sums, get_regression_sums, rolling_sum, rolling_mean, lagged_ratio, pad_nan, patch_gaps
 
 POPULATION = 10298252
 
@@ -28,101 +38,174 @@ MAV_PERIOD = 7  # period for moving average calculations
 
 DATA_DIR = '/home/deployment/coviz-data/'
 
-
-# we tolerate isolated one-day or two day holes and make an average of adjacent days
-def get_patched_data( data, delta, fill_initial=False ):
-
-    # skip to the first non None or Nan element
-    k = 0
-    for value in data:
-        if data[k] is None or math.isnan(data[k]):
-            if fill_initial:
-                data[k] = 0
-            k = k + 1
-        else:
-            break
-
-    length = len(data)
-    for j in range(k, len(data)):
-        if math.isnan(data[j]) and j + delta < length:
-            data[j] = ( ( data[j - delta] + data[j + delta] ) / 2 )
-
-    return data
-
-
-def get_smooth_list( data, window_size ):
-
-    series  = pd.Series(data)
-    windows = series.rolling(window_size)
+# the input files for get_data, relative to DATA_DIR
+DATA_FILES = { 'main':     'merged/data.csv',
+               'tests':    'merged/amostras.csv',
+               'mort':     'dssg/mortalidade.csv',
+               'vacc':     'dssg/vacinas.csv',
+               'vacc_cfr': 'custom/CFR-vs-status.csv',
+               'vacc_chr': 'custom/CHR-vs-status.csv' }
+
+# the pyarrow csv parser is multithreaded and much faster than the default one, but it is optional
+CSV_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+STRAT_GROUPS     = [ '0_9', '10_19', '20_29', '30_39', '40_49', '50_59', '60_69', '70_79', '80_plus' ]
+STRAT_COLUMNS    = [ base + '_' + group + '_' + sex for base in [ 'confirmados', 'obitos' ] for group in STRAT_GROUPS for sex in [ 'f', 'm' ] ]
+# the cumulative columns of each age group summed over sexes, as they are kept after reading data.csv
+STRAT_TOTALS     = { base + '_' + group: [ base + '_' + group + '_' + sex for sex in [ 'f', 'm' ] ] for base in [ 'confirmados', 'obitos' ] for group in STRAT_GROUPS }
+MORTALITY_GROUPS = [ 'grupoetario_1ano', 'grupoetario_1a4anos', 'grupoetario_5a14anos', 'grupoetario_15a24anos', 'grupoetario_25a34anos',
+                     'grupoetario_35a44anos', 'grupoetario_45a54anos', 'grupoetario_55a64anos', 'grupoetario_65a74anos',
+                     'grupoetario_75a84anos', 'grupoetario_85+anos', 'geral_pais' ]
+
+# the offsets of 2015, 2016, 2017, 2018 and 2019 on the precovid mortality, see get_baseline_2015_2019
+BASELINE_YEAR_STARTS = [ 0, 365, 731, 1096, 1461 ]
+
+# the series of each age group in the output of get_stratified_mortality_info
+# total is the raw daily deaths, avg is the 2015-2019 reference with its inf and sup bands, and the s_ fields are smoothed
+MORTALITY_INFO_FIELDS = [ 'total', 's_total', 'avg', 'avg_inf', 'avg_sup', 's_avg', 's_avg_inf', 's_avg_sup' ]
+
+# the columns that we use from each input file and their types, see read_data_file
+# complete count series are int32, series with report holes are float32 (exact for integers up to 2^24)
+# an int32 column that turns out to have holes is loaded as float32 with NaN instead, see read_data_file
+# and the vaccination series stay float64 because they are interpolated
+# columns in 'dates' are parsed from dd-mm-yyyy to datetime64[D], 'default' applies to all the other columns of the file
+# the columns in 'sums' replace the columns they are the sum of, a day is missing in the sum if it is missing in any of them
+# the report holes of the cumulative series in 'patch' are filled when reading, see patch_gaps for max_gap and leading
+# the age groups are patched after summing the sexes, so a hole of either sex is filled from the totals of the adjacent days
+# obitos is not patched, its holes stay missing in the daily covid deaths like they always did
+DATA_SCHEMAS = { 'main':     { 'columns': [ 'data', 'confirmados_novos', 'internados', 'internados_uci', 'obitos' ] + STRAT_COLUMNS,
+                               'dtype':   { 'confirmados_novos': 'int32', 'internados': 'float32', 'internados_uci': 'float32',
+                                            'obitos': 'int32', **{ column: 'float32' for column in STRAT_COLUMNS } },
+                               'dates':   [ 'data' ],
+                               'sums':    STRAT_TOTALS,
+                               'patch':   { 'columns': list(STRAT_TOTALS), 'max_gap': 1, 'leading': 'zero' } },
+                 'tests':    { 'columns': [ 'amostras_novas' ],
+                               'dtype':   { 'amostras_novas': 'float32' },
+                               'dates':   [] },
+                 'mort':     { 'columns': [ 'Data' ] + MORTALITY_GROUPS,
+                               'dtype':   { column: 'int32' for column in MORTALITY_GROUPS },
+                               'dates':   [ 'Data' ] },
+                 'vacc':     { 'columns': [ 'pessoas_inoculadas', 'pessoas_vacinadas_completamente', 'pessoas_reforço' ],
+                               'dtype':   { 'pessoas_inoculadas': 'float64', 'pessoas_vacinadas_completamente': 'float64', 'pessoas_reforço': 'float64' },
+                               'dates':   [] },
+                 'vacc_cfr': { 'columns': None, 'dtype': { 'data': 'object' }, 'default': 'float32', 'dates': [] },
+                 'vacc_chr': { 'columns': None, 'dtype': { 'data': 'object' }, 'default': 'float32', 'dates': [] } }
+
+# shared pool for reading the input files, the parsers spend most of the time in I/O and C code that releases the GIL
+# it has room for the files of get_data plus the map files, which main.py reads at the same time
+loader_pool = ThreadPoolExecutor(max_workers=len(DATA_FILES) + 2, thread_name_prefix='coviz-loader')
+
+# memory mapped copy of the output of get_data, see export_data_artifact
+ARTIFACT_DIR     = '/home/deployment/coviz-artifact/'
+ARTIFACT_VERSION = 10
+artifact_lock    = threading.Lock()
+
+# the named outputs of get_data, grouped by the page sections that use them
+# the first page is computed by update_data, the other sections on first use, see get_data_section
+DATA_SECTIONS = { 'main':        [ 'dates', 'dates2', 'new', 'hosp', 'hosp_uci', 'cv19_deaths', 'incidence', 'cfr', 'rt', 'positivity',
+                                   'total_deaths', 'avg_deaths', 'avg_deaths_inf', 'avg_deaths_sup', 'total_tests', 'raw_new',
+                                   'raw_cv19_deaths', 'raw_total_deaths', 'raw_avg_deaths', 'stats_sums' ],
+                  'stratified':  [ 'strat_cv19_new', 'strat_cv19_deaths', 'strat_cfr' ],
+                  'vaccination': [ 'vacc_part', 'vacc_full', 'vacc_boost', 'vacc_cfr_data', 'vacc_chr_data' ],
+                  'mortality':   [ 'strat_mortality_info', 'mortality_sums', 'correlation_sums' ],
+                  'prevalence':  [ 'min_prevalence', 'max_prevalence', 'avg_prevalence' ] }
+
+DATA_OUTPUTS = [ name for section in DATA_SECTIONS.values() for name in section ]
+
+# the values that update_data hands to the metric graph, everything else is computed by get_metrics
+METRIC_INPUTS = [ 'main_data', 'tests_data', 'mort_data', 'vacc_data', 'vacc_cfr_data', 'vacc_chr_data', 'previous' ]
+
+# pool for the independent branches of the metric graph, see get_metrics
+metric_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='coviz-metrics')
+
+# process wide cache for the output of get_data, shared by all the bokeh sessions
+# the previous bundle is what update_data needs to recompute only the new days when the input files grow
+data_cache      = { 'signature': None, 'bundle': None }
+data_cache_lock = threading.Lock()
+
+# seconds between checks of the input files by the data watcher, see start_data_watcher
+DATA_WATCH_INTERVAL = 30
+
+# the watcher thread and the functions it calls with each new bundle, one per live document
+data_watcher        = { 'thread': None, 'listeners': [] }
+data_watcher_lock   = threading.Lock()
+
+# the shapefile comes from:
+# https://dados.gov.pt/s/resources/concelhos-de-portugal/20181112-193505/concelhos-shapefile.zip
+
+# we  mention the .shp file but the companion files from the zip must be in the same directory
+SHAPE_FILE = '/home/deployment/data/shape/concelhos.shp'
+
+# persistent cache for the simplified county shapes, see get_counties_patches
+CACHE_DIR = '/home/deployment/coviz-cache/'
+
+# process wide cache for the latest county shapes, with the signature of the shapefile and the resolution
+counties_patches_cache = { 'signature': None, 'patches': None }
+
+# the county incidence file, relative to DATA_DIR
+INCIDENCE_FILE = 'dssg/data_concelhos_incidencia.csv'
+
+# process wide cache for the latest version of the county incidence file
+incidence_file_cache = { 'signature': None, 'table': None }
+
+# process wide cache for the latest county incidence matrix, with the signatures of the incidence file and of the patches
+incidence_matrix_cache = { 'signature': None, 'table': None }
+
+
+def get_smooth_series( data, window_size ):
 
     # the first window_size-1 results are nan, but that's OK
-    return windows.mean().tolist()
+    return rolling_mean(data, window_size)
 
 
 # obtains the new entries from the acumulated entries
 def get_differential_series( data ):
 
-    diff_data = [ 0 ]
+    data = make_array(data)
 
-    for i, element in enumerate(data):
-        if i >= 1:
-            diff_data.append( element - data[i - 1])
+    diff_data = np.zeros(len(data))
+    diff_data[1:] = np.diff(data)
 
     return diff_data
 
 
+# the sum goes back period-1 days, excluding the current one
 def get_incidence_T( data, period, factor ):
 
-    # the first T days have None
-    inc_data = list(np.full( period - 1, None))
-
-    for i, element in enumerate(data):
-        if i >= period - 1:
-            interval = data[(i - period + 1):i]
-            value = sum(interval) / factor
-            inc_data.append(value)
-
-    return inc_data
+    # the first T days are NaN
+    return pad_nan( rolling_sum(data, period - 1, 1) / factor, period - 1 )
 
 
 # go back period days in time to calculate the cases
 def get_cfr( deaths, new, period, ignore_interval ):
 
-    # the first T days have None value because the numbers are not accurate
+    # the first T days are NaN because the numbers are not accurate
     # then we have the user defined interval to ignore and extra rewind days
     # used for averaging the new cases
     fwd = 4
     rew = 3
-    cfr_data = list(np.full( period + ignore_interval + rew, None))
-
-    for i, element in enumerate(deaths):
-        if i > period + ignore_interval + rew - 1:
-            # we smooth the new cases over 7 days around the date
-            new_value = st.mean(new[i - period - rew:i - period + fwd])
-            if new_value > 0:
-                ratio = element / new_value
-            else:
-                ratio = 0
-            cfr_data.append( ratio * 100 )
+
+    # we smooth the new cases over 7 days around the date
+    new_value = rolling_mean(new, rew + fwd, period - fwd + 1)[..., :np.shape(deaths)[-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where( new_value > 0, make_array(deaths) / new_value, 0 )
+
+    cfr_data = pad_nan( ratio * 100, period + ignore_interval + rew )
 
     # let's smooth now
-    result = get_smooth_list(cfr_data, MAV_PERIOD)
+    result = get_smooth_series(cfr_data, MAV_PERIOD)
 
     return result
 
 
 def get_rt( new, period, ignore_interval ):
 
-    r_data = list(np.full( period + ignore_interval, None))
-
-    for i, element in enumerate(new):
-        if i > period + ignore_interval - 1:
-            slice = new[i - period:i]
-            total = sum(slice)
-            r_data.append( new[i] / (total / period) )
+    # the new cases of each day relative to the average of the previous period days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_data = pad_nan( make_array(new) / rolling_mean(new, period, 1), period + ignore_interval )
 
     # let's smooth now
-    result = get_smooth_list(r_data, MAV_PERIOD)
+    result = get_smooth_series(r_data, MAV_PERIOD)
 
     return result
 
@@ -130,447 +213,219 @@ def get_rt( new, period, ignore_interval ):
 # obtain the minimum prevalence, using the detected cases
 def get_min_prevalence( new, period, ignore_interval, population ):
 
-    r_data = list(np.full( period + ignore_interval, None))
-
-    for i, element in enumerate(new):
-        if i > period + ignore_interval - 1:
-            slice = new[i - period + 1:i + 1]  # period days, including today
-            total = sum(slice)
-            min_prevalence = ( total / population) * 100
-            # print('min', min_prevalence)
-            r_data.append( min_prevalence )
+    # period days, including today
+    r_data = pad_nan( rolling_sum(new, period) / population * 100, period + ignore_interval )
 
     # let's smooth now
-    result = get_smooth_list(r_data, MAV_PERIOD)
+    result = get_smooth_series(r_data, MAV_PERIOD)
 
     return result
 
 
 # get the worst case scenario for prevalence
-def get_max_prevalence(new, min_prevalence, tests, positivity, population):
+def get_max_prevalence( new, min_prevalence, tests, positivity, population, immunity_days=PREV_IMMUNITY_DAYS ):
 
-    r_data = []
+    length = len(min_prevalence)
 
-    for i, element in enumerate(min_prevalence):
-        left_index = max(0, i - PREV_IMMUNITY_DAYS)
-        previous_positives = sum( new[  left_index:i] )
-        # the population that was tested this day or was previously infected is not part of the potentially infected set
-        available_fraction = ( 1 - tests[i] / population - previous_positives / population )
-        # worst case scenario positivity % of them could be positive
-        extra_prevalence = available_fraction * positivity[i]
-        max_prevalence = min_prevalence[i] + extra_prevalence
-        r_data.append(max_prevalence)
-        # print('max', max_prevalence)
+    # the positives of the previous immunity_days days, or of all the previous days at the start
+    previous_positives = rolling_sum(new, immunity_days, 1, True)[:length]
+
+    # the population that was tested this day or was previously infected is not part of the potentially infected set
+    available_fraction = ( 1 - make_array(tests)[:length] / population - previous_positives / population )
+    # worst case scenario positivity % of them could be positive
+    extra_prevalence = available_fraction * make_array(positivity)[:length]
+    r_data = make_array(min_prevalence) + extra_prevalence
 
     # let's smooth now
-    result = get_smooth_list(r_data, MAV_PERIOD)
+    result = get_smooth_series(r_data, MAV_PERIOD)
 
     return result
 
 
-def get_positivity( tests, new, period, ignore_interval ):
+# the minimum and maximum prevalence and their average, for a given immunity period
+def get_prevalence_envelope( new, tests, positivity, population, immunity_days=PREV_IMMUNITY_DAYS ):
 
-    pos_data = list(np.full( period + ignore_interval, None))
+    min_prevalence = get_min_prevalence( new, PREV_PERIOD, PREV_IGNORE, population )
+    max_prevalence = get_max_prevalence( new, min_prevalence, tests, positivity, population, immunity_days )
+    avg_prevalence = 0.5 * ( make_array(min_prevalence) + make_array(max_prevalence) )
 
-    for i, element in enumerate(tests):
-        # print(i, element)
-        if i > period + ignore_interval - 1:
-            num = new[i]
-            den = tests[i - period]
-            if num and den:
-                pos_data.append( (num / den) * 100 )
-            else:
-                pos_data.append(None)
+    return min_prevalence, max_prevalence, avg_prevalence
 
-    # let's smooth now
-    result = get_smooth_list(pos_data, MAV_PERIOD)
-
-    return result
 
+def get_positivity( tests, new, period, ignore_interval ):
 
-# corrects old overall deaths with the trend due to ageing population
-def get_normalized_2020_deaths( death_array, daily_extra ):
+    # the days without new cases or tests are left empty
+    pos_data = pad_nan( lagged_ratio(new, tests, period) * 100, period + ignore_interval )
 
-    normalized_death_array = []
+    # let's smooth now
+    result = get_smooth_series(pos_data, MAV_PERIOD)
 
-    for value in death_array:
-        corrected_value = value + daily_extra
-        normalized_death_array.append(corrected_value)
+    return result
 
-    return normalized_death_array
 
+# the 2015-2019 reference for several series at once, arranged as groups x years x day of year
+# returns the average and the standard deviation of each group for the span days that start on the 26th of February 2020
+# the groups flagged in correct are normalized to the equivalent 2020 deaths
+def get_baseline_2015_2019( precovid_deaths, span, correct ):
 
-# this function is situation specific for the sake of code readability
-# returns the average number of deaths in the "same" day of 2015-2019 and the corresponding standard deviation
-def get_avg_deaths_2015_2019(total_deaths, span, smoothen=False, correct=False):
+    deaths = make_array(precovid_deaths)
 
-    avg_data = []
-    sd_data  = []
+    # note: 2016 is a leap year, its last day is left out
+    years = np.stack( [ deaths[:, start:start + 365] for start in BASELINE_YEAR_STARTS ], axis=1 )
 
-    deaths_2015_in = total_deaths[    0:365    ]  # normal year
-    deaths_2016_in = total_deaths[  365:730 + 1]  # leap year
-    deaths_2017_in = total_deaths[  731:1096   ]  # normal year
-    deaths_2018_in = total_deaths[ 1096:1461   ]  # normal year
-    deaths_2019_in = total_deaths[ 1461:1826   ]  # normal year
+    # Fit for overall yearly mortality by Carlos Antunes (x=1 for 2009)
+    #   y = 102621 + 966.99x
 
-    # when correct is True we are normalizing historical deaths to that equivalent 2020 deaths
-    if correct:
+    # The yearly extra of 966.99 can be converted to a daily extra, 966.99 / 365 = 2.64929
+    daily_extra = 2.64929
+    correct     = np.asarray(correct, dtype=bool)
 
-        # Fit for overall yearly mortality by Carlos Antunes (x=1 for 2009)
-        #   y = 102621 + 966.99x
+    years[correct] += daily_extra * np.array([ 5, 4, 3, 2, 1 ])[:, None]
 
-        # The yearly extra of 966.99 can be converted to a daily extra, 966.99 / 365 = 2.64929
-        daily_extra = 2.64929
+    # idx varies between 0 and 364 (365 values)
+    # there could be some long term drift resulting from this code, but only over many years
+    first_day_index = 55  # 26th of February
+    d   = np.arange(span)
+    idx = ( d + first_day_index ) % 365
 
-        deaths_2015 = get_normalized_2020_deaths( deaths_2015_in, daily_extra * 5 )
-        deaths_2016 = get_normalized_2020_deaths( deaths_2016_in, daily_extra * 4 )
-        deaths_2017 = get_normalized_2020_deaths( deaths_2017_in, daily_extra * 3 )
-        deaths_2018 = get_normalized_2020_deaths( deaths_2018_in, daily_extra * 2 )
-        deaths_2019 = get_normalized_2020_deaths( deaths_2019_in, daily_extra * 1 )
-    else:
-        deaths_2015 = deaths_2015_in
-        deaths_2016 = deaths_2016_in
-        deaths_2017 = deaths_2017_in
-        deaths_2018 = deaths_2018_in
-        deaths_2019 = deaths_2019_in
+    # because the period spans more than one year we need additional correction converting 2020 to present year
+    delta = np.where( correct[:, None], daily_extra * ( d // 365 ), 0 )
 
-    # should be 365 366 365 365 365 1826
-    # print ( len (deaths_2015), len(deaths_2016), len(deaths_2017), len(deaths_2018), len(deaths_2019), len(total_deaths) )
+    # groups x years x span
+    samples = years[:, :, idx]
+    nyears  = len(BASELINE_YEAR_STARTS)
 
-    # should be 407 366 475 414 371
-    # print ( deaths_2015[0], deaths_2016[0], deaths_2017[0], deaths_2018[0], deaths_2019[0] )
+    avg = ( samples.sum(axis=1) + nyears * delta ) / nyears
+    var = ( ( samples + delta[:, None, :] - avg[:, None, :] ) ** 2 ).sum(axis=1) / nyears
 
-    # should be 323 465 390 357 345
-    # print ( deaths_2015[364], deaths_2016[364], deaths_2017[364], deaths_2018[364], deaths_2019[364] )
+    return avg, np.sqrt(var)
 
-    first_day_index = 55  # 26th of February
-    for d in range(0, span):
-        # idx varies between 0 and 364 (365 values)
-        # there could be some long term drift resulting from this code, but only over many years
-        idx = d + first_day_index - 365 * int( (d + first_day_index) / 365 )
-
-        # because the period spans more than one year we need additional correction converting 2020 to present year
-        if correct:
-            delta = daily_extra * int(d / 365)
-            # print('delta is', delta)
-        else:
-            delta = 0
 
-        avg = ( deaths_2015[idx] + deaths_2016[idx] + deaths_2017[idx] + deaths_2018[idx] + deaths_2019[idx] + 5 * delta ) / 5
-        var = ( (deaths_2015[idx] + delta - avg) ** 2 + (deaths_2016[idx] + delta - avg) ** 2 + (deaths_2017[idx] + delta - avg) ** 2  + (deaths_2018[idx] + delta - avg) ** 2 + (deaths_2019[idx] + delta - avg) ** 2 ) / 5
-        sd  = math.sqrt(var)
-        # print(d, idx, avg, sd)
+# this function is situation specific for the sake of code readability
+# returns the average number of deaths in the "same" day of 2015-2019 and the corresponding standard deviation
+def get_avg_deaths_2015_2019(total_deaths, span, smoothen=False, correct=False):
 
-        avg_data.append(avg)
-        sd_data.append(sd)
+    avg_data, sd_data = get_baseline_2015_2019( [ total_deaths ], span, [ correct ] )
 
     if smoothen:
-        return get_smooth_list( avg_data, MAV_PERIOD ), sd_data
+        return get_smooth_series( avg_data[0], MAV_PERIOD ), sd_data[0]
     else:
-        return avg_data, sd_data
+        return avg_data[0], sd_data[0]
 
 
-def get_avg_deaths( total_deaths, span, years ):
+def get_deaths_band( avg_deaths, sd_deaths ):
 
-    avg_data = []
-    sd_data  = []
+    avg_deaths = make_array(avg_deaths)
+    sd_deaths  = make_array(sd_deaths)
 
-    data_length = len(total_deaths)
-    for d in range(0, span):
+    return avg_deaths - sd_deaths, avg_deaths + sd_deaths
 
-        daily_sum = 0
-        daily_var_sum = 0
 
-        # we go back 2 years so this is always considering 2015-2019 (pre-Covid)
-        for i in range(2, years + 2):
-            base_index = data_length - 1 - span
-            # we never let the day index go beyound 365
-            day_index = d - 365 * int(d / 365)
-            index = base_index - i * 365 + day_index
-            daily_sum = daily_sum + total_deaths[ index ]
+# converts dd-mm-yyyy strings to datetime64[D]
+# rearranging the characters to yyyy-mm-dd lets numpy parse them, which is much faster than pd.to_datetime
+# that only works for zero padded dates, anything else goes through pd.to_datetime, which raises on invalid dates
+def get_dates( date_strings ):
 
-        daily_average = daily_sum / years
-        avg_data.append( daily_average )
+    strings = np.char.strip( np.asarray(date_strings, dtype=str) )
 
-        for i in range(2, years + 2):
-            base_index = data_length - 1 - span
-            # we never let the day index go beyound 365
-            day_index = d - 365 * int(d / 365)
-            index = base_index - i * 365 + day_index
-            daily_var_sum = daily_var_sum + (daily_average - total_deaths[ index ]) ** 2
+    if strings.size == 0 or not is_padded_date( strings ):
+        print('parsing irregular dates with pandas\n', end='')
+        return pd.to_datetime( pd.Series(strings), format='%d-%m-%Y' ).to_numpy().astype('datetime64[D]')
 
-        daily_sd = math.sqrt( daily_var_sum / years )
-        sd_data.append( daily_sd )
+    chars = strings.astype('U10').view('U1').reshape(-1, 10)
+    iso   = chars[ :, [ 6, 7, 8, 9, 5, 3, 4, 2, 0, 1 ] ].copy().view('U10').ravel()
 
-        # print(daily_average, daily_sd)
+    return iso.astype('datetime64[D]')
 
-    return avg_data, sd_data
 
+# True if all the strings are dd-mm-yyyy with the day and the month zero padded
+def is_padded_date( strings ):
 
-def get_deaths_band( avg_deaths, sd_deaths ):
+    if not ( np.char.str_len(strings) == 10 ).all():
+        return False
 
-    d_inf_data = []
-    d_sup_data = []
+    chars  = strings.astype('U10').view('U1').reshape(-1, 10)
+    digits = chars[ :, [ 0, 1, 3, 4, 6, 7, 8, 9 ] ]
 
-    for i, element in enumerate(avg_deaths):
-        d_inf = element - sd_deaths[i]
-        d_sup = element + sd_deaths[i]
-        d_inf_data.append(d_inf)
-        d_sup_data.append(d_sup)
+    return bool( ( chars[:, [ 2, 5 ]] == '-' ).all() and np.char.isdigit(digits).all() )
 
-    return d_inf_data, d_sup_data
 
+# the daily new cases and deaths of each age group, as two groups x days matrices
+# both come from the cumulative columns of data.csv, which were summed over sexes when reading the file
+def get_stratified_data( data, maxlen ):
 
-def get_dates( date_strings ):
+    # the report holes of the cumulative columns were patched when reading the file, see DATA_SCHEMAS
+    cumulative = data[ list(STRAT_TOTALS) ].to_numpy(dtype=np.float64).T.reshape( 2, len(STRAT_GROUPS), -1 )
 
-    dates = []
-    for d in date_strings:
-        dates.append(datetime.strptime(d, '%d-%m-%Y').date())
-
-    return dates
-
-
-def get_stratified_data( data, base_str, smoothen, period, maxlen):
-
-    data_0_9_f     = data[ base_str + '_0_9_f'    ]
-    data_0_9_m     = data[ base_str + '_0_9_m'    ]
-    data_10_19_f   = data[ base_str + '_10_19_f'  ]
-    data_10_19_m   = data[ base_str + '_10_19_m'  ]
-    data_20_29_f   = data[ base_str + '_20_29_f'  ]
-    data_20_29_m   = data[ base_str + '_20_29_m'  ]
-    data_30_39_f   = data[ base_str + '_30_39_f'  ]
-    data_30_39_m   = data[ base_str + '_30_39_m'  ]
-    data_40_49_f   = data[ base_str + '_40_49_f'  ]
-    data_40_49_m   = data[ base_str + '_40_49_m'  ]
-    data_50_59_f   = data[ base_str + '_50_59_f'  ]
-    data_50_59_m   = data[ base_str + '_50_59_m'  ]
-    data_60_69_f   = data[ base_str + '_60_69_f'  ]
-    data_60_69_m   = data[ base_str + '_60_69_m'  ]
-    data_70_79_f   = data[ base_str + '_70_79_f'  ]
-    data_70_79_m   = data[ base_str + '_70_79_m'  ]
-    data_80_plus_f = data[ base_str + '_80_plus_f']
-    data_80_plus_m = data[ base_str + '_80_plus_m']
-
-    # we are patching some report holes in the cumulative series using the average value for adjacent days
-    data_0_9_total     = get_differential_series( get_patched_data( (data_0_9_f     + data_0_9_m     ).tolist(), 1, True ) )[0:maxlen]
-    data_10_19_total   = get_differential_series( get_patched_data( (data_10_19_f   + data_10_19_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_20_29_total   = get_differential_series( get_patched_data( (data_20_29_f   + data_20_29_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_30_39_total   = get_differential_series( get_patched_data( (data_30_39_f   + data_30_39_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_40_49_total   = get_differential_series( get_patched_data( (data_40_49_f   + data_40_49_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_50_59_total   = get_differential_series( get_patched_data( (data_50_59_f   + data_50_59_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_60_69_total   = get_differential_series( get_patched_data( (data_60_69_f   + data_60_69_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_70_79_total   = get_differential_series( get_patched_data( (data_70_79_f   + data_70_79_m   ).tolist(), 1, True ) )[0:maxlen]
-    data_80_plus_total = get_differential_series( get_patched_data( (data_80_plus_f + data_80_plus_m ).tolist(), 1, True ) )[0:maxlen]
-
-    tmp_list = [ data_0_9_total, data_10_19_total, data_20_29_total, data_30_39_total, data_40_49_total, data_50_59_total, data_60_69_total, data_70_79_total, data_80_plus_total ]
-
-    data_list = []
-    if smoothen:
-        for l in tmp_list:
-            data_list.append( get_smooth_list(l, period) )
-    else:
-        data_list = tmp_list
+    daily = np.zeros_like(cumulative)
+    daily[..., 1:] = np.diff( cumulative, axis=-1 )
 
-    return data_list
+    strat_cv19_new, strat_cv19_deaths = daily[..., 0:maxlen]
 
+    return strat_cv19_new, strat_cv19_deaths
 
-def get_stratified_mortality_info( mort_data, days ):
-
-    # find the current stratified overall deaths
 
-    # this is a multi year series starting in 01/01/2009
-    # we need to get the lastest -days and smoothen for the plots
-    # the non-smoothed version will be used for the statistics
+def get_stratified_mortality_info( mort_data, days ):
 
-    total_deaths_0_1      = mort_data[ 'grupoetario_1ano'      ].tolist()[-days:]
-    total_deaths_1_4      = mort_data[ 'grupoetario_1a4anos'   ].tolist()[-days:]
-    total_deaths_5_14     = mort_data[ 'grupoetario_5a14anos'  ].tolist()[-days:]
-    total_deaths_15_24    = mort_data[ 'grupoetario_15a24anos' ].tolist()[-days:]
-    total_deaths_25_34    = mort_data[ 'grupoetario_25a34anos' ].tolist()[-days:]
-    total_deaths_35_44    = mort_data[ 'grupoetario_35a44anos' ].tolist()[-days:]
-    total_deaths_45_56    = mort_data[ 'grupoetario_45a54anos' ].tolist()[-days:]
-    total_deaths_55_64    = mort_data[ 'grupoetario_55a64anos' ].tolist()[-days:]
-    total_deaths_65_74    = mort_data[ 'grupoetario_65a74anos' ].tolist()[-days:]
-    total_deaths_75_84    = mort_data[ 'grupoetario_75a84anos' ].tolist()[-days:]
-    total_deaths_85_plus  = mort_data[ 'grupoetario_85+anos'   ].tolist()[-days:]
-    total_deaths_all_ages = mort_data[ 'geral_pais'            ].tolist()[-days:]
-
-    s_total_deaths_0_1        = get_smooth_list( total_deaths_0_1,        MAV_PERIOD )
-    s_total_deaths_1_4        = get_smooth_list( total_deaths_1_4,        MAV_PERIOD )
-    s_total_deaths_5_14       = get_smooth_list( total_deaths_5_14,       MAV_PERIOD )
-    s_total_deaths_15_24      = get_smooth_list( total_deaths_15_24,      MAV_PERIOD )
-    s_total_deaths_25_34      = get_smooth_list( total_deaths_25_34,      MAV_PERIOD )
-    s_total_deaths_35_44      = get_smooth_list( total_deaths_35_44,      MAV_PERIOD )
-    s_total_deaths_45_56      = get_smooth_list( total_deaths_45_56,      MAV_PERIOD )
-    s_total_deaths_55_64      = get_smooth_list( total_deaths_55_64,      MAV_PERIOD )
-    s_total_deaths_65_74      = get_smooth_list( total_deaths_65_74,      MAV_PERIOD )
-    s_total_deaths_75_84      = get_smooth_list( total_deaths_75_84,      MAV_PERIOD )
-    s_total_deaths_85_plus    = get_smooth_list( total_deaths_85_plus,    MAV_PERIOD )
-    s_total_deaths_all_ages   = get_smooth_list( total_deaths_all_ages,   MAV_PERIOD )
+    # the age groups and the overall deaths as rows, in a multi year series starting in 01/01/2009
+    # the overall deaths appear twice, the second row gets the population ageing corrected reference values
+    deaths  = mort_data[ MORTALITY_GROUPS + [ 'geral_pais' ] ].to_numpy().T
+    correct = np.arange(len(deaths)) == len(deaths) - 1
 
     # now let's find the precovid overal deaths
     # note: 2016 is a leap year
-    idx1 = mort_data.index[ mort_data['Data'] == '01-01-2015' ][0]
-    idx2 = mort_data.index[ mort_data['Data'] == '31-12-2019' ][0] + 1
-
-    total_deaths_precovid_0_1      = mort_data.iloc[ idx1:idx2 ]['grupoetario_1ano'     ].to_list()
-    total_deaths_precovid_1_4      = mort_data.iloc[ idx1:idx2 ]['grupoetario_1a4anos'  ].to_list()
-    total_deaths_precovid_5_14     = mort_data.iloc[ idx1:idx2 ]['grupoetario_5a14anos' ].to_list()
-    total_deaths_precovid_15_24    = mort_data.iloc[ idx1:idx2 ]['grupoetario_15a24anos'].to_list()
-    total_deaths_precovid_25_34    = mort_data.iloc[ idx1:idx2 ]['grupoetario_25a34anos'].to_list()
-    total_deaths_precovid_35_44    = mort_data.iloc[ idx1:idx2 ]['grupoetario_35a44anos'].to_list()
-    total_deaths_precovid_45_54    = mort_data.iloc[ idx1:idx2 ]['grupoetario_45a54anos'].to_list()
-    total_deaths_precovid_55_64    = mort_data.iloc[ idx1:idx2 ]['grupoetario_55a64anos'].to_list()
-    total_deaths_precovid_65_74    = mort_data.iloc[ idx1:idx2 ]['grupoetario_65a74anos'].to_list()
-    total_deaths_precovid_75_84    = mort_data.iloc[ idx1:idx2 ]['grupoetario_75a84anos'].to_list()
-    total_deaths_precovid_85_plus  = mort_data.iloc[ idx1:idx2 ]['grupoetario_85+anos'  ].to_list()
-    total_deaths_precovid_all_ages = mort_data.iloc[ idx1:idx2 ]['geral_pais'           ].to_list()
-
-    # we are not smoothing the curve here
-    avg_deaths_precovid_0_1,      sd_deaths_precovid_0_1      = get_avg_deaths_2015_2019(total_deaths_precovid_0_1,      days, False)
-    avg_deaths_precovid_1_4,      sd_deaths_precovid_1_4      = get_avg_deaths_2015_2019(total_deaths_precovid_1_4,      days, False)
-    avg_deaths_precovid_5_14,     sd_deaths_precovid_5_14     = get_avg_deaths_2015_2019(total_deaths_precovid_5_14,     days, False)
-    avg_deaths_precovid_15_24,    sd_deaths_precovid_15_24    = get_avg_deaths_2015_2019(total_deaths_precovid_15_24,    days, False)
-    avg_deaths_precovid_25_34,    sd_deaths_precovid_25_34    = get_avg_deaths_2015_2019(total_deaths_precovid_25_34,    days, False)
-    avg_deaths_precovid_35_44,    sd_deaths_precovid_35_44    = get_avg_deaths_2015_2019(total_deaths_precovid_35_44,    days, False)
-    avg_deaths_precovid_45_54,    sd_deaths_precovid_45_54    = get_avg_deaths_2015_2019(total_deaths_precovid_45_54,    days, False)
-    avg_deaths_precovid_55_64,    sd_deaths_precovid_55_64    = get_avg_deaths_2015_2019(total_deaths_precovid_55_64,    days, False)
-    avg_deaths_precovid_65_74,    sd_deaths_precovid_65_74    = get_avg_deaths_2015_2019(total_deaths_precovid_65_74,    days, False)
-    avg_deaths_precovid_75_84,    sd_deaths_precovid_75_84    = get_avg_deaths_2015_2019(total_deaths_precovid_75_84,    days, False)
-    avg_deaths_precovid_85_plus,  sd_deaths_precovid_85_plus  = get_avg_deaths_2015_2019(total_deaths_precovid_85_plus,  days, False)
-    avg_deaths_precovid_all_ages, sd_deaths_precovid_all_ages = get_avg_deaths_2015_2019(total_deaths_precovid_all_ages, days, False)
-
-    # population ageing corrected reference values
-    avg_deaths_precovid_all_ages_c, sd_deaths_precovid_all_ages_c = get_avg_deaths_2015_2019(total_deaths_precovid_all_ages, days, False, True)
-
-    avg_deaths_inf_0_1,        avg_deaths_sup_0_1        = get_deaths_band( avg_deaths_precovid_0_1,        sd_deaths_precovid_0_1        )
-    avg_deaths_inf_1_4,        avg_deaths_sup_1_4        = get_deaths_band( avg_deaths_precovid_1_4,        sd_deaths_precovid_1_4        )
-    avg_deaths_inf_5_14,       avg_deaths_sup_5_14       = get_deaths_band( avg_deaths_precovid_5_14,       sd_deaths_precovid_5_14       )
-    avg_deaths_inf_15_24,      avg_deaths_sup_15_24      = get_deaths_band( avg_deaths_precovid_15_24,      sd_deaths_precovid_15_24      )
-    avg_deaths_inf_25_34,      avg_deaths_sup_25_34      = get_deaths_band( avg_deaths_precovid_25_34,      sd_deaths_precovid_25_34      )
-    avg_deaths_inf_35_44,      avg_deaths_sup_35_44      = get_deaths_band( avg_deaths_precovid_35_44,      sd_deaths_precovid_35_44      )
-    avg_deaths_inf_45_54,      avg_deaths_sup_45_54      = get_deaths_band( avg_deaths_precovid_45_54,      sd_deaths_precovid_45_54      )
-    avg_deaths_inf_55_64,      avg_deaths_sup_55_64      = get_deaths_band( avg_deaths_precovid_55_64,      sd_deaths_precovid_55_64      )
-    avg_deaths_inf_65_74,      avg_deaths_sup_65_74      = get_deaths_band( avg_deaths_precovid_65_74,      sd_deaths_precovid_65_74      )
-    avg_deaths_inf_75_84,      avg_deaths_sup_75_84      = get_deaths_band( avg_deaths_precovid_75_84,      sd_deaths_precovid_75_84      )
-    avg_deaths_inf_85_plus,    avg_deaths_sup_85_plus    = get_deaths_band( avg_deaths_precovid_85_plus,    sd_deaths_precovid_85_plus    )
-    avg_deaths_inf_all_ages,   avg_deaths_sup_all_ages   = get_deaths_band( avg_deaths_precovid_all_ages,   sd_deaths_precovid_all_ages   )
-    avg_deaths_inf_all_ages_c, avg_deaths_sup_all_ages_c = get_deaths_band( avg_deaths_precovid_all_ages_c, sd_deaths_precovid_all_ages_c )
+    idx1 = mort_data.index[ mort_data['Data'] == np.datetime64('2015-01-01') ][0]
+    idx2 = mort_data.index[ mort_data['Data'] == np.datetime64('2019-12-31') ][0] + 1
 
-    # now let's create all the smooth versions
+    avg_deaths, sd_deaths = get_baseline_2015_2019( deaths[:, idx1:idx2], days, correct )
 
-    s_avg_deaths_precovid_0_1        = get_smooth_list( avg_deaths_precovid_0_1,        MAV_PERIOD )
-    s_avg_deaths_precovid_1_4        = get_smooth_list( avg_deaths_precovid_1_4,        MAV_PERIOD )
-    s_avg_deaths_precovid_5_14       = get_smooth_list( avg_deaths_precovid_5_14,       MAV_PERIOD )
-    s_avg_deaths_precovid_15_24      = get_smooth_list( avg_deaths_precovid_15_24,      MAV_PERIOD )
-    s_avg_deaths_precovid_25_34      = get_smooth_list( avg_deaths_precovid_25_34,      MAV_PERIOD )
-    s_avg_deaths_precovid_35_44      = get_smooth_list( avg_deaths_precovid_35_44,      MAV_PERIOD )
-    s_avg_deaths_precovid_45_54      = get_smooth_list( avg_deaths_precovid_45_54,      MAV_PERIOD )
-    s_avg_deaths_precovid_55_64      = get_smooth_list( avg_deaths_precovid_55_64,      MAV_PERIOD )
-    s_avg_deaths_precovid_65_74      = get_smooth_list( avg_deaths_precovid_65_74,      MAV_PERIOD )
-    s_avg_deaths_precovid_75_84      = get_smooth_list( avg_deaths_precovid_75_84,      MAV_PERIOD )
-    s_avg_deaths_precovid_85_plus    = get_smooth_list( avg_deaths_precovid_85_plus,    MAV_PERIOD )
-    s_avg_deaths_precovid_all_ages   = get_smooth_list( avg_deaths_precovid_all_ages,   MAV_PERIOD )
-    s_avg_deaths_precovid_all_ages_c = get_smooth_list( avg_deaths_precovid_all_ages_c, MAV_PERIOD )
-
-    s_avg_deaths_inf_0_1        = get_smooth_list( avg_deaths_inf_0_1,        MAV_PERIOD )
-    s_avg_deaths_inf_1_4        = get_smooth_list( avg_deaths_inf_1_4,        MAV_PERIOD )
-    s_avg_deaths_inf_5_14       = get_smooth_list( avg_deaths_inf_5_14,       MAV_PERIOD )
-    s_avg_deaths_inf_15_24      = get_smooth_list( avg_deaths_inf_15_24,      MAV_PERIOD )
-    s_avg_deaths_inf_25_34      = get_smooth_list( avg_deaths_inf_25_34,      MAV_PERIOD )
-    s_avg_deaths_inf_35_44      = get_smooth_list( avg_deaths_inf_35_44,      MAV_PERIOD )
-    s_avg_deaths_inf_45_54      = get_smooth_list( avg_deaths_inf_45_54,      MAV_PERIOD )
-    s_avg_deaths_inf_55_64      = get_smooth_list( avg_deaths_inf_55_64,      MAV_PERIOD )
-    s_avg_deaths_inf_65_74      = get_smooth_list( avg_deaths_inf_65_74,      MAV_PERIOD )
-    s_avg_deaths_inf_75_84      = get_smooth_list( avg_deaths_inf_75_84,      MAV_PERIOD )
-    s_avg_deaths_inf_85_plus    = get_smooth_list( avg_deaths_inf_85_plus,    MAV_PERIOD )
-    s_avg_deaths_inf_all_ages   = get_smooth_list( avg_deaths_inf_all_ages,   MAV_PERIOD )
-    s_avg_deaths_inf_all_ages_c = get_smooth_list( avg_deaths_inf_all_ages_c, MAV_PERIOD )
-
-    s_avg_deaths_sup_0_1        = get_smooth_list( avg_deaths_sup_0_1,        MAV_PERIOD )
-    s_avg_deaths_sup_1_4        = get_smooth_list( avg_deaths_sup_1_4,        MAV_PERIOD )
-    s_avg_deaths_sup_5_14       = get_smooth_list( avg_deaths_sup_5_14,       MAV_PERIOD )
-    s_avg_deaths_sup_15_24      = get_smooth_list( avg_deaths_sup_15_24,      MAV_PERIOD )
-    s_avg_deaths_sup_25_34      = get_smooth_list( avg_deaths_sup_25_34,      MAV_PERIOD )
-    s_avg_deaths_sup_35_44      = get_smooth_list( avg_deaths_sup_35_44,      MAV_PERIOD )
-    s_avg_deaths_sup_45_54      = get_smooth_list( avg_deaths_sup_45_54,      MAV_PERIOD )
-    s_avg_deaths_sup_55_64      = get_smooth_list( avg_deaths_sup_55_64,      MAV_PERIOD )
-    s_avg_deaths_sup_65_74      = get_smooth_list( avg_deaths_sup_65_74,      MAV_PERIOD )
-    s_avg_deaths_sup_75_84      = get_smooth_list( avg_deaths_sup_75_84,      MAV_PERIOD )
-    s_avg_deaths_sup_85_plus    = get_smooth_list( avg_deaths_sup_85_plus,    MAV_PERIOD )
-    s_avg_deaths_sup_all_ages   = get_smooth_list( avg_deaths_sup_all_ages,   MAV_PERIOD )
-    s_avg_deaths_sup_all_ages_c = get_smooth_list( avg_deaths_sup_all_ages_c, MAV_PERIOD )
-
-    # create the arrays
-
-    # we have a duplication in the last two values to avoid complicating the handling code on main.py
-    total_deaths    = [ total_deaths_0_1,   total_deaths_1_4,   total_deaths_5_14,  total_deaths_15_24, total_deaths_25_34, total_deaths_35_44,
-                        total_deaths_45_56, total_deaths_55_64, total_deaths_65_74, total_deaths_75_84, total_deaths_85_plus, total_deaths_all_ages, total_deaths_all_ages ]
-
-    # same as above
-    s_total_deaths  = [ s_total_deaths_0_1,   s_total_deaths_1_4,   s_total_deaths_5_14,  s_total_deaths_15_24, s_total_deaths_25_34, s_total_deaths_35_44,
-                        s_total_deaths_45_56, s_total_deaths_55_64, s_total_deaths_65_74, s_total_deaths_75_84, s_total_deaths_85_plus, s_total_deaths_all_ages, s_total_deaths_all_ages ]
-
-    # on these arrays we have the extra item with the corrected reference values
-    avg_deaths      = [ avg_deaths_precovid_0_1,   avg_deaths_precovid_1_4,   avg_deaths_precovid_5_14,  avg_deaths_precovid_15_24, avg_deaths_precovid_25_34, avg_deaths_precovid_35_44,
-                        avg_deaths_precovid_45_54, avg_deaths_precovid_55_64, avg_deaths_precovid_65_74, avg_deaths_precovid_75_84, avg_deaths_precovid_85_plus, avg_deaths_precovid_all_ages, avg_deaths_precovid_all_ages_c ]
-
-    avg_deaths_inf = [ avg_deaths_inf_0_1,   avg_deaths_inf_1_4,   avg_deaths_inf_5_14,  avg_deaths_inf_15_24, avg_deaths_inf_25_34,   avg_deaths_inf_35_44,
-                       avg_deaths_inf_45_54, avg_deaths_inf_55_64, avg_deaths_inf_65_74, avg_deaths_inf_75_84, avg_deaths_inf_85_plus, avg_deaths_inf_all_ages, avg_deaths_inf_all_ages_c ]
-
-    avg_deaths_sup = [ avg_deaths_sup_0_1,   avg_deaths_sup_1_4,   avg_deaths_sup_5_14,  avg_deaths_sup_15_24, avg_deaths_sup_25_34,   avg_deaths_sup_35_44,
-                       avg_deaths_sup_45_54, avg_deaths_sup_55_64, avg_deaths_sup_65_74, avg_deaths_sup_75_84, avg_deaths_sup_85_plus, avg_deaths_sup_all_ages, avg_deaths_sup_all_ages_c ]
-
-    s_avg_deaths      = [ s_avg_deaths_precovid_0_1,   s_avg_deaths_precovid_1_4,   s_avg_deaths_precovid_5_14,  s_avg_deaths_precovid_15_24, s_avg_deaths_precovid_25_34, s_avg_deaths_precovid_35_44,
-                          s_avg_deaths_precovid_45_54, s_avg_deaths_precovid_55_64, s_avg_deaths_precovid_65_74, s_avg_deaths_precovid_75_84, s_avg_deaths_precovid_85_plus, s_avg_deaths_precovid_all_ages, s_avg_deaths_precovid_all_ages_c ]
-
-    s_avg_deaths_inf = [ s_avg_deaths_inf_0_1,   s_avg_deaths_inf_1_4,   s_avg_deaths_inf_5_14,  s_avg_deaths_inf_15_24, s_avg_deaths_inf_25_34,   s_avg_deaths_inf_35_44,
-                         s_avg_deaths_inf_45_54, s_avg_deaths_inf_55_64, s_avg_deaths_inf_65_74, s_avg_deaths_inf_75_84, s_avg_deaths_inf_85_plus, s_avg_deaths_inf_all_ages, s_avg_deaths_inf_all_ages_c ]
-
-    s_avg_deaths_sup = [ s_avg_deaths_sup_0_1,   s_avg_deaths_sup_1_4,   s_avg_deaths_sup_5_14,  s_avg_deaths_sup_15_24, s_avg_deaths_sup_25_34,   s_avg_deaths_sup_35_44,
-                         s_avg_deaths_sup_45_54, s_avg_deaths_sup_55_64, s_avg_deaths_sup_65_74, s_avg_deaths_sup_75_84, s_avg_deaths_sup_85_plus, s_avg_deaths_sup_all_ages, s_avg_deaths_sup_all_ages_c ]
-
-    strat_mort_info = [ total_deaths, s_total_deaths, avg_deaths, avg_deaths_inf, avg_deaths_sup, s_avg_deaths, s_avg_deaths_inf, s_avg_deaths_sup ]
+    strat_mort_info = np.zeros( len(deaths), dtype=get_mortality_info_dtype(days) )
 
-    return strat_mort_info
+    # we need to get the lastest -days and smoothen for the plots
+    # the non-smoothed version will be used for the statistics
+    strat_mort_info['total']   = deaths[:, -days:]
+    strat_mort_info['s_total'] = rolling_mean( deaths[:, -days:], MAV_PERIOD )
+
+    strat_mort_info['avg']     = avg_deaths
+    strat_mort_info['avg_inf'] = avg_deaths - sd_deaths
+    strat_mort_info['avg_sup'] = avg_deaths + sd_deaths
 
+    # now let's create all the smooth versions
+    strat_mort_info['s_avg']     = rolling_mean( strat_mort_info['avg'],     MAV_PERIOD )
+    strat_mort_info['s_avg_inf'] = rolling_mean( strat_mort_info['avg_inf'], MAV_PERIOD )
+    strat_mort_info['s_avg_sup'] = rolling_mean( strat_mort_info['avg_sup'], MAV_PERIOD )
 
-def get_stratified_cfr( data, CFR_DELTA, CFR_IGNORE, maxlen ):
+    return strat_mort_info
 
-    strat_cv19_new    = get_stratified_data( data, 'confirmados', False, -1, maxlen )
-    strat_cv19_deaths = get_stratified_data( data, 'obitos', False, -1, maxlen )
 
-    strat_cfr = []
-    for j in range(0, len(strat_cv19_new) ):
-        my_cfr = get_cfr(strat_cv19_deaths[j], strat_cv19_new[j], CFR_DELTA, CFR_IGNORE)
-        my_len = len(strat_cv19_new[j])
+# one record per age group, each field holds the days of a series, see get_stratified_mortality_info
+def get_mortality_info_dtype( days ):
 
-        # helper variable to set the last part to None instead of zero
-        empty_list = np.full( my_len - maxlen , None)
+    return [ ( field, np.float64, ( days, ) ) for field in MORTALITY_INFO_FIELDS ]
 
-        # UPDATE: this line stopped being necessary since we introduced the maxline arg to this function
-        # important: this assignement conserves the list size
-        # my_cfr[maxlen:-1] = np.full( my_len - maxlen - 1 , None)
 
-        strat_cfr.append( my_cfr )
+# takes the raw daily series from get_stratified_data, already clipped to the days with stratified data
+# get_cfr works along the days, so all the age groups are computed at once, one row per group
+def get_stratified_cfr( strat_cv19_deaths, strat_cv19_new, CFR_DELTA, CFR_IGNORE ):
 
-    return strat_cfr
+    return get_cfr(strat_cv19_deaths, strat_cv19_new, CFR_DELTA, CFR_IGNORE)
 
 
-def pad_data( data, target_size, element, left=True ):
+# a float64 series of target_size days with the data at offset, the days without data are filled with element
+# the data beyond target_size is trimmed, with left=True the data is aligned to the end instead of the start
+def pad_data( data, target_size, element, left=True, offset=0 ):
 
-    delta = target_size - len(data)
+    data   = make_array(data)
+    result = np.full(target_size, element, dtype=np.float64)
 
-    # if we don't have enough data we pad with "element"
-    if delta >= 0:
-        for j in range( target_size - len(data) ):
-            if left:
-                data.insert(0, element)
-            else:
-                data.append(element)
+    # if we don't have enough data we pad with "element", in case we had more data than wanted we trim it
+    length = max( min(len(data), target_size - offset), 0 )
+    if left:
+        result[target_size - length:] = data[:length]
+    else:
+        result[offset:offset + length] = data[:length]
 
-    # in case we had more data than wanted we trim it
-    return data[:target_size]
+    return result
 
 
 def get_days_until_patch( data ):
@@ -581,132 +436,735 @@ def get_days_until_patch( data ):
     return idx + 1
 
 
+# first index where two series differ, or the length of the shortest one if they match
+# None and NaN compare as equal
+def get_first_change( old, new ):
+
+    old = np.asarray(old, dtype=float)
+    new = np.asarray(new, dtype=float)
+
+    n = min(len(old), len(new))
+    changed = ( old[:n] != new[:n] ) & ~( np.isnan(old[:n]) & np.isnan(new[:n]) )
+
+    return int(np.argmax(changed)) if changed.any() else n
+
+
+# the result of function(*inputs) reusing the previous result for the elements before index change
+# lookback is how many input elements before an output element it depends on, including None padding and smoothing,
+# so only the last len - change + lookback input elements are processed
+def get_suffix_update( previous, function, inputs, change, lookback ):
+
+    start = change - lookback
+    if previous is None or start <= 0:
+        return function(*inputs)
+
+    tail = function(*[ series[start:] for series in inputs ])
+
+    return np.concatenate( ( previous[:change], tail[lookback:] ) )
+
+
+# reads one of the DATA_FILES keeping only the columns and types described in DATA_SCHEMAS
+def read_data_file( name ):
+
+    schema = DATA_SCHEMAS[name]
+    data   = pd.read_csv(DATA_DIR + DATA_FILES[name], usecols=schema['columns'], engine=CSV_ENGINE)
+
+    # the parsers are slower with explicit types than with their own inference, so we convert afterwards
+    columns = {}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        dtype  = np.dtype(schema['dtype'].get(column, schema.get('default', values.dtype)))
+
+        if column in schema['dates']:
+            values = get_dates(values)
+        elif dtype.kind == 'i' and values.dtype.kind != 'i' and pd.isna(values).any():
+            # a hole in a count series would be converted to garbage, so the column keeps its missing days as NaN
+            print('column ' + column + ' of ' + DATA_FILES[name] + ' has ' + str(pd.isna(values).sum()) + ' missing values\n', end='')
+            values = values.astype(np.float32)
+        else:
+            values = values.astype(dtype, copy=False)
+
+        columns[column] = values
+
+    # the parts are summed in float64, the sum keeps the type of the first one
+    for column, parts in schema.get('sums', {}).items():
+        dtype = columns[parts[0]].dtype
+        columns[column] = sum( columns.pop(part).astype(np.float64) for part in parts ).astype(dtype)
+
+    if 'patch' in schema:
+        patched = patch_columns( columns, schema['patch']['columns'], schema['patch']['max_gap'], schema['patch']['leading'] )
+        if patched.any():
+            print('patched ' + str(patched.sum()) + ' values of ' + DATA_FILES[name] + '\n', end='')
+
+    return pd.DataFrame(columns)
+
+
+# fills the report holes of a set of columns in a single pass over their matrix, keeping their types
+# returns the mask of the patched values, with one row per column
+def patch_columns( columns, names, max_gap, leading ):
+
+    values, patched = patch_gaps( np.array([ columns[name] for name in names ]), max_gap, leading )
+
+    for name, row in zip(names, values):
+        columns[name] = row.astype(columns[name].dtype)
+
+    return patched
+
+
+# runs function(*args) on the loader pool and prints how long it took
+def submit_timed( label, function, *args ):
+
+    def run():
+        start  = time.perf_counter()
+        result = function(*args)
+        # a single write, so that the lines of concurrent loads don't get mixed
+        print('loaded ' + label + ' in ' + str(round( (time.perf_counter() - start) * 1000 )) + ' ms\n', end='')
+        return result
+
+    return loader_pool.submit(run)
+
+
+# reads several DATA_FILES in parallel, returns a dict with the same keys
+def read_data_files( names ):
+
+    futures = { name: submit_timed( DATA_FILES[name], read_data_file, name ) for name in names }
+
+    return { name: future.result() for name, future in futures.items() }
+
+
 def get_data():
 
+    bundle = update_data()
+
+    get_metrics(bundle, DATA_OUTPUTS)
+
+    return bundle
+
+
+# reads the input files and computes the first page metrics, the other sections are computed on first use
+# when previous is an earlier bundle and the input files only gained rows, the windowed series
+# are recomputed only for the new days plus their lookback, if the history was revised everything is rebuilt
+def update_data( previous=None ):
+
     # get the latest of each file type
-    main_file     = DATA_DIR + 'merged/data.csv'
-    tests_file    = DATA_DIR + 'merged/amostras.csv'
-    mort_file     = DATA_DIR + 'dssg/mortalidade.csv'
-    vacc_file     = DATA_DIR + 'dssg/vacinas.csv'
-    vacc_cfr_file = DATA_DIR + 'custom/CFR-vs-status.csv'
-    vacc_chr_file = DATA_DIR + 'custom/CHR-vs-status.csv'
-
-    main_data     = pd.read_csv(main_file)
-    tests_data    = pd.read_csv(tests_file)
-    mort_data     = pd.read_csv(mort_file)
-    vacc_data     = pd.read_csv(vacc_file)
-    vacc_cfr_data = pd.read_csv(vacc_cfr_file)
-    vacc_chr_data = pd.read_csv(vacc_chr_file)
-
-    new          = main_data['confirmados_novos'].tolist()
-
-    # converting the dd-mm-yyyy strings to date objects
-    # starts at 26th of February of 2020
-    dates        = get_dates(main_data['data'].tolist())
+    start = time.perf_counter()
+    files = read_data_files(DATA_FILES)
+    print('loaded all data files in', round( (time.perf_counter() - start) * 1000 ), 'ms')
+
+    # only the computed values of the previous bundle are kept, so that bundles don't chain
+    if previous is not None:
+        previous = { name: value for name, value in previous['values'].items() if name not in METRIC_INPUTS + [ 'old' ] }
+
+    bundle = make_bundle( { 'main_data': files['main'], 'tests_data': files['tests'], 'mort_data': files['mort'], 'vacc_data': files['vacc'],
+                            'vacc_cfr_data': files['vacc_cfr'], 'vacc_chr_data': files['vacc_chr'], 'previous': previous } )
+
+    get_metrics(bundle, DATA_SECTIONS['main'])
+
+    return bundle
+
+
+# a set of named values and the metrics computed from them, see get_metrics
+# bundles are shared by all the sessions, so the values must be treated as read-only
+def make_bundle( values, exported=False ):
+
+    return { 'values': values, 'timings': {}, 'lock': threading.Lock(), 'exported': exported }
+
+
+# the values of the previous bundle, or nothing if there is none or if its history was revised
+# appended rows are fine, but if any of the previous input rows changed we rebuild all the series
+def get_old_values( previous, raw_new, deaths, tests, days ):
+
+    if previous is None or not all( name in previous for name in [ 'raw_new', 'deaths', 'tests', 'days' ] ):
+        return {}
+
+    revised = any( get_first_change(previous[name], values) < len(previous[name]) for name, values in [ ( 'raw_new', raw_new ), ( 'deaths', deaths ), ( 'tests', tests ) ] )
+    if revised or days < previous['days']:
+        print('data history was revised, rebuilding all the series')
+        return {}
+
+    print('data grew from', previous['days'], 'to', days, 'days, updating the series')
+
+    return previous
+
+
+# the day from which a series changed since the previous bundle, nothing before it needs to be recomputed
+def get_change( old, name, values ):
+
+    return get_first_change(old[name], values) if name in old else 0
+
+
+# the stratified series end at days2, so they only change if those rows change
+# the rows are compared after the hole patching, which already accounts for the days after them
+def get_strat_unchanged( old, strat_values ):
+
+    return 'strat_values' in old and np.array_equal(old['strat_values'], strat_values, equal_nan=True)
+
+
+# the mortality series depend on the mortality file and on the number of days
+def get_mortality_unchanged( old, days, mort_values ):
+
+    return 'mort_values' in old and days == old['days'] and np.array_equal(old['mort_values'], mort_values)
+
+
+# a graph node that updates the suffix of its own series on the previous bundle, see get_suffix_update
+def make_suffix_node( name, function, inputs, change, lookback ):
+
+    return ( [ 'old', change ] + inputs, partial(update_suffix_node, name, function, lookback) )
+
+
+# the function of the nodes of make_suffix_node
+def update_suffix_node( name, function, lookback, old, change, *args ):
+
+    return get_suffix_update( old.get(name), function, list(args), change, lookback )
+
+
+def get_short_dates( dates ):
 
     # but for some data series it ends at 13/03/2022
     diff_days = (datetime.strptime('13-03-2022', '%d-%m-%Y').date() - datetime.strptime('26-02-2020', '%d-%m-%Y').date()).days
-    dates2 = dates[0:diff_days + 1]
 
-    # the amount of Covid data days that we have
-    days        = len(new)
-    days2       = len(dates2)  # for the shorter series
+    return dates[0:diff_days + 1]
+
+
+def get_avg_deaths_reference( mort_data, days ):
+
+    # note: 2016 is a leap year
+    idx1 = mort_data.index[ mort_data['Data'] == np.datetime64('2015-01-01') ][0]
+    idx2 = mort_data.index[ mort_data['Data'] == np.datetime64('2019-12-31') ][0] + 1
+
+    total_deaths_precovid = mort_data['geral_pais'].to_numpy()[ idx1:idx2 ]
+
+    # we get the average and standard deviation per day
+    avg_deaths, sd_deaths = get_avg_deaths_2015_2019(total_deaths_precovid, days)
+
+    avg_deaths_inf, avg_deaths_sup = get_deaths_band( avg_deaths, sd_deaths )
 
-    # print(dates[0],  dates[-1],   days)
-    # print(dates2[0], dates2[-1], days2)
+    return avg_deaths, avg_deaths_inf, avg_deaths_sup
 
-    hosp         = main_data['internados'].tolist()
-    hosp_uci     = main_data['internados_uci'].tolist()
-    cv19_deaths  = get_differential_series(main_data['obitos'].tolist())
-    incidence    = get_incidence_T(new, INC_PERIOD, INC_DIVIDER)
-    cfr          = get_cfr(cv19_deaths, new, CFR_DELTA, CFR_IGNORE)
-    rt           = get_rt(new, RT_PERIOD, RT_IGNORE)
 
-    # padding the pcr_tests series because it has 2 days of delay it seems - checked on 20/05/2021
-    # the padding function also trims it in case it has more data then the other series - checked on 08/10/2021
-    total_tests  = pad_data( tests_data['amostras_novas'].tolist(), days, 0, False)
-    positivity   = get_positivity( total_tests, new, 2, 0)
+def get_vaccination_data( vacc_data, days2 ):
 
     # data starts at 27-12-2020
-    tmp_vacc_part  = vacc_data['pessoas_inoculadas'].interpolate(limit_area='inside').tolist()
-    tmp_vacc_full  = vacc_data['pessoas_vacinadas_completamente'].interpolate(limit_area='inside').tolist()
-    tmp_vacc_boost = vacc_data['pessoas_reforço'].interpolate(limit_area='inside').tolist()
+    tmp_vacc_part  = vacc_data['pessoas_inoculadas'].interpolate(limit_area='inside').to_numpy()
+    tmp_vacc_full  = vacc_data['pessoas_vacinadas_completamente'].interpolate(limit_area='inside').to_numpy()
+    tmp_vacc_boost = vacc_data['pessoas_reforço'].interpolate(limit_area='inside').to_numpy()
 
     # diffing from the main data that starts at 26-02-2020
     diff_days  = (datetime.strptime('27-12-2020', '%d-%m-%Y').date() - datetime.strptime('26-02-2020', '%d-%m-%Y').date()).days
 
-    # fixed left padding
-    padding    = np.array([np.nan] * diff_days).tolist()
-    tmp_vacc_part  = padding + tmp_vacc_part
-    tmp_vacc_full  = padding + tmp_vacc_full
-    tmp_vacc_boost = padding + tmp_vacc_boost
+    # fixed left padding and adaptative right side padding
+    vacc_part  = pad_data(tmp_vacc_part,  days2, np.nan, False, diff_days)
+    vacc_full  = pad_data(tmp_vacc_full,  days2, np.nan, False, diff_days)
+    vacc_boost = pad_data(tmp_vacc_boost, days2, np.nan, False, diff_days)
 
-    # adaptative right side padding
-    vacc_part  = pad_data(tmp_vacc_part,  days2, np.nan, False)
-    vacc_full  = pad_data(tmp_vacc_full,  days2, np.nan, False)
-    vacc_boost = pad_data(tmp_vacc_boost, days2, np.nan, False)
+    return vacc_part, vacc_full, vacc_boost
 
-    # print(len(vacc_boost), len(cfr))
 
-    # this is a multi year series starting in 01/01/2009
-    total_deaths = mort_data['geral_pais'].tolist()
+# the functions of the metric graph nodes, the inputs of each node are its arguments
 
-    # note: 2016 is a leap year
-    idx1 = mort_data.index[ mort_data['Data'] == '01-01-2015' ][0]
-    idx2 = mort_data.index[ mort_data['Data'] == '31-12-2019' ][0] + 1
+# starts at 26th of February of 2020
+def get_main_dates( main_data ):
+    return main_data['data'].to_numpy().astype('datetime64[D]')
 
-    total_deaths_precovid = mort_data.iloc[ idx1:idx2 ]['geral_pais'].to_list()
 
-    # print (idx1, idx2)
-    # print(total_deaths_precovid)
-    # print(len(total_deaths_precovid))
+def get_raw_new( main_data ):
+    return main_data['confirmados_novos'].to_numpy(dtype=np.float64)
 
-    # we get the average and standard deviation per day
-    avg_deaths, sd_deaths = get_avg_deaths_2015_2019(total_deaths_precovid, days)
 
-    avg_deaths_inf, avg_deaths_sup = get_deaths_band( avg_deaths, sd_deaths )
+def get_deaths( main_data ):
+    return main_data['obitos'].to_numpy(dtype=np.float64)
 
-    # smooth data before presenting
-    s_new            = get_smooth_list(new, MAV_PERIOD)
-    s_cv19_deaths    = get_smooth_list(cv19_deaths, MAV_PERIOD)
-    s_total_deaths   = get_smooth_list(total_deaths[-days:], MAV_PERIOD)
-    s_avg_deaths     = get_smooth_list(avg_deaths, MAV_PERIOD)
-    s_avg_deaths_inf = get_smooth_list(avg_deaths_inf, MAV_PERIOD)
-    s_avg_deaths_sup = get_smooth_list(avg_deaths_sup, MAV_PERIOD)
-    s_total_tests    = get_smooth_list(total_tests, MAV_PERIOD)
-
-    # these lists are already smoothed
-    s_strat_cv19_new    = get_stratified_data( main_data, 'confirmados', True, MAV_PERIOD, days2 )
-    s_strat_cv19_deaths = get_stratified_data( main_data, 'obitos', True, MAV_PERIOD, days2 )
 
+def get_hosp( main_data ):
+    return main_data['internados'].to_numpy(dtype=np.float64)
+
+
+def get_hosp_uci( main_data ):
+    return main_data['internados_uci'].to_numpy(dtype=np.float64)
+
+
+def get_tests( tests_data ):
+    return tests_data['amostras_novas'].to_numpy(dtype=np.float64)
+
+
+def get_strat_values( main_data, days2 ):
+    return main_data[list(STRAT_TOTALS)].to_numpy()[0:days2]
+
+
+def get_mort_values( mort_data ):
+    return mort_data[MORTALITY_GROUPS].to_numpy()
+
+
+# padding the pcr_tests series because it has 2 days of delay it seems - checked on 20/05/2021
+# the padding function also trims it in case it has more data then the other series - checked on 08/10/2021
+def get_padded_tests( tests, days ):
+    return pad_data( tests, days, 0, False )
+
+
+def get_change_new( old, raw_new ):
+    return get_change(old, 'raw_new', raw_new)
+
+
+def get_change_deaths( old, deaths ):
+    return get_change(old, 'deaths', deaths)
+
+
+# the padding zeros are replaced when the tests file grows
+def get_change_tests( old, padded_tests ):
+    return get_change(old, 'padded_tests', padded_tests)
+
+
+# the moving average of the plots
+def get_mav_series( data ):
+    return get_smooth_series(data, MAV_PERIOD)
+
+
+# the same, along the last axis of a groups x days matrix
+def get_mav_matrix( data ):
+    return rolling_mean(data, MAV_PERIOD)
+
+
+def get_incidence_series( raw_new ):
+    return get_incidence_T(raw_new, INC_PERIOD, INC_DIVIDER)
+
+
+def get_cfr_series( raw_cv19_deaths, raw_new ):
+    return get_cfr(raw_cv19_deaths, raw_new, CFR_DELTA, CFR_IGNORE)
+
+
+def get_rt_series( raw_new ):
+    return get_rt(raw_new, RT_PERIOD, RT_IGNORE)
+
+
+def get_positivity_series( padded_tests, raw_new ):
+    return get_positivity(padded_tests, raw_new, 2, 0)
+
+
+# this is a multi year series starting in 01/01/2009
+def get_raw_total_deaths( mort_data, days ):
+    return mort_data['geral_pais'].to_numpy(dtype=np.float64)[-days:]
+
+
+# prefix sums of the raw new cases, covid deaths, overall deaths and 2015-2019 deaths, for the totals of the stats table
+def get_stats_sums( raw_new, raw_cv19_deaths, raw_total_deaths, raw_avg_deaths ):
+    return get_prefix_sums( np.array([ raw_new, raw_cv19_deaths, raw_total_deaths, raw_avg_deaths ]) )[0]
+
+
+def get_strat_cfr( raw_strat_cv19_deaths, raw_strat_cv19_new ):
+    return get_stratified_cfr(raw_strat_cv19_deaths, raw_strat_cv19_new, CFR_DELTA, CFR_IGNORE)
+
+
+# prefix sums of the raw deaths and of the 2015-2019 reference with its band, as 4 x groups x days, for the mortality stats table
+def get_mortality_sums( strat_mortality_info ):
+    return get_prefix_sums( np.array([ strat_mortality_info[field] for field in [ 'total', 'avg', 'avg_inf', 'avg_sup' ] ]) )[0]
+
+
+# regression sums of the smoothed excess deaths against the smoothed covid deaths, for the correlation plot
+def get_correlation_sums( cv19_deaths, total_deaths, avg_deaths ):
+    return get_regression_sums(cv19_deaths, total_deaths - avg_deaths)
+
+
+def get_min_prevalence_series( raw_new ):
+    return get_min_prevalence(raw_new, PREV_PERIOD, PREV_IGNORE, POPULATION)
+
+
+def get_max_prevalence_series( raw_new, min_prevalence, padded_tests, positivity ):
+    return get_max_prevalence(raw_new, min_prevalence, padded_tests, positivity, POPULATION)
+
+
+def get_avg_prevalence( min_prevalence, max_prevalence ):
+    return 0.5 * ( make_array(min_prevalence) + make_array(max_prevalence) )
+
+
+# the derived metrics as a dependency graph, computed on demand by get_metrics
+# each node lists the values that it depends on and the function that computes it from them, in that order
+# nodes with several outputs have a tuple of names as key, and the function returns one value for each
+# the optional third element names a flag, when it is set the node takes its outputs from the previous bundle
+METRIC_GRAPH = {
+    # the input series
+    'dates':               ( [ 'main_data' ], get_main_dates ),
+    'dates2':              ( [ 'dates' ], get_short_dates ),
+    'days':                ( [ 'raw_new' ], len ),    # the amount of Covid data days that we have
+    'days2':               ( [ 'dates2' ], len ),     # for the shorter series
+    'raw_new':             ( [ 'main_data' ], get_raw_new ),
+    'deaths':              ( [ 'main_data' ], get_deaths ),
+    'hosp':                ( [ 'main_data' ], get_hosp ),
+    'hosp_uci':            ( [ 'main_data' ], get_hosp_uci ),
+    'tests':               ( [ 'tests_data' ], get_tests ),
+    'strat_values':        ( [ 'main_data', 'days2' ], get_strat_values ),
+    'mort_values':         ( [ 'mort_data' ], get_mort_values ),
+    'padded_tests':        ( [ 'tests', 'days' ], get_padded_tests ),
+
+    # what changed since the previous bundle
+    'old':                 ( [ 'previous', 'raw_new', 'deaths', 'tests', 'days' ], get_old_values ),
+    'change_new':          ( [ 'old', 'raw_new' ], get_change_new ),
+    'change_deaths':       ( [ 'old', 'deaths' ], get_change_deaths ),
+    'change_tests':        ( [ 'old', 'padded_tests' ], get_change_tests ),
+    'change_cfr':          ( [ 'change_new', 'change_deaths' ], min ),
+    'change_pos':          ( [ 'change_new', 'change_tests' ], min ),
+    'strat_unchanged':     ( [ 'old', 'strat_values' ], get_strat_unchanged ),
+    'mortality_unchanged': ( [ 'old', 'days', 'mort_values' ], get_mortality_unchanged ),
+
+    # first page
+    'raw_cv19_deaths':     make_suffix_node( 'raw_cv19_deaths', get_differential_series, [ 'deaths' ], 'change_deaths', 1 ),
+    'incidence':           make_suffix_node( 'incidence', get_incidence_series, [ 'raw_new' ], 'change_new', INC_PERIOD - 1 ),
+    'cfr':                 make_suffix_node( 'cfr', get_cfr_series, [ 'raw_cv19_deaths', 'raw_new' ], 'change_cfr', CFR_DELTA + CFR_IGNORE + 3 + MAV_PERIOD - 1 ),
+    'rt':                  make_suffix_node( 'rt', get_rt_series, [ 'raw_new' ], 'change_new', RT_PERIOD + RT_IGNORE + MAV_PERIOD - 1 ),
+    'positivity':          make_suffix_node( 'positivity', get_positivity_series, [ 'padded_tests', 'raw_new' ], 'change_pos', 2 + MAV_PERIOD - 1 ),
+
+    'raw_total_deaths':    ( [ 'mort_data', 'days' ], get_raw_total_deaths ),
+    ( 'raw_avg_deaths', 'avg_deaths_inf', 'avg_deaths_sup' ):
+                           ( [ 'mort_data', 'days' ], get_avg_deaths_reference, 'mortality_unchanged' ),
+
+    # smooth data before presenting
+    'new':                 make_suffix_node( 'new',         get_mav_series, [ 'raw_new' ],         'change_new',    MAV_PERIOD - 1 ),
+    'cv19_deaths':         make_suffix_node( 'cv19_deaths', get_mav_series, [ 'raw_cv19_deaths' ], 'change_deaths', MAV_PERIOD - 1 ),
+    'total_tests':         make_suffix_node( 'total_tests', get_mav_series, [ 'padded_tests' ],    'change_tests',  MAV_PERIOD - 1 ),
+    'total_deaths':        ( [ 'raw_total_deaths' ], get_mav_series, 'mortality_unchanged' ),
+    'avg_deaths':          ( [ 'raw_avg_deaths' ],   get_mav_series, 'mortality_unchanged' ),
+
+    'stats_sums':          ( [ 'raw_new', 'raw_cv19_deaths', 'raw_total_deaths', 'raw_avg_deaths' ], get_stats_sums ),
+
+    # second page, the raw daily series are shared by the plots and the CFR
+    ( 'raw_strat_cv19_new', 'raw_strat_cv19_deaths' ):
+                           ( [ 'main_data', 'days2' ], get_stratified_data, 'strat_unchanged' ),
+    'strat_cv19_new':      ( [ 'raw_strat_cv19_new' ],    get_mav_matrix, 'strat_unchanged' ),
+    'strat_cv19_deaths':   ( [ 'raw_strat_cv19_deaths' ], get_mav_matrix, 'strat_unchanged' ),
     # unfortunately the stratified data was interrupted
-    strat_cfr = get_stratified_cfr( main_data, CFR_DELTA, CFR_IGNORE, days2 )
+    'strat_cfr':           ( [ 'raw_strat_cv19_deaths', 'raw_strat_cv19_new' ], get_strat_cfr, 'strat_unchanged' ),
+    ( 'vacc_part', 'vacc_full', 'vacc_boost' ):
+                           ( [ 'vacc_data', 'days2' ], get_vaccination_data ),
+
+    # fourth page, average precovid deaths by age group with their standard deviation bands, plus the current deaths
+    'strat_mortality_info': ( [ 'mort_data', 'days' ], get_stratified_mortality_info, 'mortality_unchanged' ),
+    'mortality_sums':      ( [ 'strat_mortality_info' ], get_mortality_sums, 'mortality_unchanged' ),
+    'correlation_sums':    ( [ 'cv19_deaths', 'total_deaths', 'avg_deaths' ], get_correlation_sums ),
+
+    # fifth page, the minimum prevalence changes from the same day as the new cases, so the same lookback applies to both
+    'min_prevalence':      make_suffix_node( 'min_prevalence', get_min_prevalence_series, [ 'raw_new' ], 'change_new', PREV_PERIOD + PREV_IGNORE + MAV_PERIOD - 1 ),
+    'max_prevalence':      make_suffix_node( 'max_prevalence', get_max_prevalence_series, [ 'raw_new', 'min_prevalence', 'padded_tests', 'positivity' ],
+                                             'change_pos', PREV_IMMUNITY_DAYS + MAV_PERIOD - 1 ),
+    'avg_prevalence':      ( [ 'min_prevalence', 'max_prevalence' ], get_avg_prevalence ),
+}
+
+# the node that computes each output
+METRIC_NODES = { name: key for key in METRIC_GRAPH for name in ( key if isinstance(key, tuple) else ( key, ) ) }
+
+
+# runs a node of the metric graph on the metric pool, returning its result and how long it took
+def run_metric( function, args ):
+
+    start  = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start
+
+
+# returns a dict with the requested metrics of a bundle, computing the missing ones and the metrics that they depend on
+# the results are kept in the bundle, and independent nodes of the graph run concurrently on the metric pool
+def get_metrics( bundle, names ):
+
+    values = bundle['values']
+
+    with bundle['lock']:
+        start   = time.perf_counter()
+        pending = []
+        running = {}
+        timings = {}
+
+        # the dependencies of a node are only added when it is considered, so that reused nodes don't pull them
+        def require( name ):
+            if name in values:
+                return
+            key = METRIC_NODES[name]
+            if key not in pending and key not in running.values():
+                pending.append(key)
+
+        for name in names:
+            require(name)
+
+        while pending or running:
+            for key in list(pending):
+                outputs = key if isinstance(key, tuple) else ( key, )
+                dependencies, function, flag = ( METRIC_GRAPH[key] + ( None, ) )[:3]
+
+                if flag is not None:
+                    if flag not in values:
+                        require(flag)
+                        continue
+                    if values[flag] and all( output in values['old'] for output in outputs ):
+                        values.update( ( output, values['old'][output] ) for output in outputs )
+                        pending.remove(key)
+                        continue
+
+                missing = [ dependency for dependency in dependencies if dependency not in values ]
+                if missing:
+                    for dependency in missing:
+                        require(dependency)
+                    continue
+
+                pending.remove(key)
+                running[ metric_pool.submit( run_metric, function, [ values[dependency] for dependency in dependencies ] ) ] = key
+
+            if running:
+                done, not_done = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    result, elapsed = future.result()
+                    if isinstance(key, tuple):
+                        values.update( zip(key, result) )
+                    else:
+                        values[key] = result
+                    timings[ '/'.join(key) if isinstance(key, tuple) else key ] = round(elapsed * 1000, 1)
+
+        if timings:
+            bundle['timings'].update(timings)
+            # a single write, so that the lines of concurrent sessions don't get mixed
+            print('computed ' + str(len(timings)) + ' metrics in ' + str(round( (time.perf_counter() - start) * 1000 )) + ' ms: ' +
+                  ', '.join( name + ' ' + str(elapsed) for name, elapsed in timings.items() ) + '\n', end='')
+
+        return { name: values[name] for name in names }
+
+
+# the metrics of a section of DATA_SECTIONS, computed on first use and then kept in the bundle
+def get_data_section( bundle, name ):
+
+    metrics = get_metrics( bundle, DATA_SECTIONS[name] )
+
+    # the artifact is written once every output of the cached bundle has been computed
+    # only the claim is made under the cache lock, the files are written on the loader pool so that no session waits for the disk
+    with data_cache_lock:
+        export = data_cache['bundle'] is bundle and not bundle['exported'] and all( output in bundle['values'] for output in DATA_OUTPUTS )
+        if export:
+            bundle['exported'] = True
+            signature = data_cache['signature']
+
+    if export:
+        loader_pool.submit( write_data_artifact, bundle, signature, ARTIFACT_DIR )
+
+    return metrics
+
+
+# export_data_artifact in the background, one at a time since they share the temporary directory of the process
+# a bundle that was replaced in the cache while waiting is not written anymore
+def write_data_artifact( bundle, signature, target_dir ):
+
+    with artifact_lock:
+        if data_cache['bundle'] is not bundle:
+            return
+
+        try:
+            export_data_artifact(bundle, signature, target_dir)
+        except OSError as e:
+            print('could not export the data artifact', e)
+
+
+# the mtime and size of each input file, any change invalidates the cached data
+def get_data_signature():
+
+    signature = []
+    for name in sorted(DATA_FILES):
+        path = DATA_DIR + DATA_FILES[name]
+        try:
+            stat = os.stat(path)
+            signature.append( (path, stat.st_mtime_ns, stat.st_size) )
+        except FileNotFoundError:
+            signature.append( (path, None, None) )
+
+    return tuple(signature)
+
+
+# writes the output of get_data as a directory of .npy files plus a json manifest
+# lists of series are stored as 2D or 3D arrays
+def export_data_artifact( bundle, signature, target_dir=ARTIFACT_DIR ):
+
+    metrics = get_metrics( bundle, DATA_OUTPUTS )
+
+    # we write to a temporary directory and then swap it, so that readers never see a partial artifact
+    tmp_dir = target_dir.rstrip('/') + '.tmp.' + str(os.getpid())
+    old_dir = target_dir.rstrip('/') + '.old.' + str(os.getpid())
+    os.makedirs(tmp_dir)
+
+    manifest = { 'version': ARTIFACT_VERSION, 'signature': signature, 'created': datetime.now().isoformat(), 'series': {}, 'frames': {} }
+
+    for name, element in metrics.items():
+        if isinstance(element, pd.DataFrame):
+            manifest['frames'][name] = export_frame( element, tmp_dir, name )
+        else:
+            array = np.asarray(element)
+            np.save(tmp_dir + '/' + name + '.npy', array)
+            manifest['series'][name] = { 'file': name + '.npy', 'shape': list(array.shape) }
+
+    with open(tmp_dir + '/manifest.json', 'w') as f:
+        json.dump(manifest, f)
+
+    if os.path.isdir(target_dir):
+        os.rename(target_dir, old_dir)
+    os.rename(tmp_dir, target_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+# writes each column of a frame as a .npy file, returning the manifest entries with the names and the types of the columns
+# the string columns are stored as fixed width unicode, with the missing values as empty strings
+def export_frame( frame, target_dir, name ):
+
+    columns = []
+    for j, column in enumerate(frame.columns):
+        values = frame[column].to_numpy()
+        dtype  = str(values.dtype)
+        if values.dtype == object:
+            values = np.where( pd.isna(values), '', values ).astype(str)
+
+        file = name + '.' + str(j) + '.npy'
+        np.save(target_dir + '/' + file, values)
+        columns.append({ 'name': column, 'file': file, 'dtype': dtype })
+
+    return columns
+
+
+# the frame of export_frame, with the same column types
+def load_frame( columns, source_dir ):
+
+    frame = {}
+    for column in columns:
+        values = np.load(source_dir + '/' + column['file']).astype(column['dtype'])
+        if column['dtype'] == 'object':
+            values[ values == '' ] = np.nan
+
+        frame[column['name']] = values
+
+    return pd.DataFrame(frame, columns=[ column['name'] for column in columns ])
+
+
+# opens an artifact written by export_data_artifact, returning a bundle with the same outputs as get_data
+# the arrays are memory mapped, so several processes share the same pages through the OS page cache
+# returns None if the artifact is missing, has a different version or was built from other input files
+def load_data_artifact( signature, source_dir=ARTIFACT_DIR ):
+
+    try:
+        with open(source_dir + '/manifest.json') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    stored_signature = tuple( tuple(element) for element in manifest['signature'] )
+    if manifest['version'] != ARTIFACT_VERSION or stored_signature != signature:
+        return None
+
+    values = {}
+    for name in DATA_OUTPUTS:
+        if name in manifest['frames']:
+            values[name] = load_frame( manifest['frames'][name], source_dir )
+            continue
+
+        values[name] = np.load(source_dir + '/' + manifest['series'][name]['file'], mmap_mode='r')
+
+    # there is no previous bundle for these values, so the next update computes everything
+    return make_bundle( values, True )
+
+
+# returns the same output as get_data, but computed only once per process and per version of the input files
+# the returned bundle is shared by all the sessions so it must be treated as read-only by the callers
+def get_cached_data():
 
-    # get age stratified mortality information
-    # average precovid deaths and respective standard deviation bands, plus smoothed current overall deaths
-    # this is an age stratified generalization of what we have already done with the total for all ages
-    strat_mortality_info = get_stratified_mortality_info( mort_data, days )
+    # when the watcher is running it keeps the cache up to date in the background
+    if data_watcher['thread'] is not None and data_cache['bundle'] is not None:
+        return data_cache['bundle']
 
-    s_min_prevalence = get_min_prevalence(new, PREV_PERIOD, PREV_IGNORE, POPULATION)
-    s_max_prevalence = get_max_prevalence(new, s_min_prevalence, total_tests, positivity, POPULATION)
-    s_avg_prevalence = 0.5 * ( np.array(s_min_prevalence) + np.array(s_max_prevalence) )
+    return refresh_data_cache()
 
-    # processed data
-    processed_data = [ s_new, hosp, hosp_uci, s_cv19_deaths, incidence, cfr, rt, positivity, s_total_deaths, s_avg_deaths,
-                       avg_deaths_inf, avg_deaths_sup, s_strat_cv19_new, s_strat_cv19_deaths, strat_cfr, vacc_part, vacc_full,
-                       vacc_boost, strat_mortality_info, s_min_prevalence, s_max_prevalence, s_avg_prevalence, vacc_cfr_data,
-                       vacc_chr_data, s_total_tests ]
 
-    # raw data for stats
-    raw_data = [ new, cv19_deaths, total_deaths[-days:], avg_deaths ]
+# rebuilds the cached bundle if the input files changed, returns the current bundle
+def refresh_data_cache():
 
-    return dates, dates2, processed_data, raw_data
+    signature = get_data_signature()
 
+    # the lock makes concurrent sessions wait for a single computation instead of repeating it
+    with data_cache_lock:
+        if data_cache['bundle'] is None or data_cache['signature'] != signature:
 
-def get_counties_incidence(row, incidence_data, idx):
+            # another process may have already exported the data for these input files
+            bundle = load_data_artifact(signature, ARTIFACT_DIR)
+
+            if bundle is None:
+                print('data cache miss, computing the data bundle')
+                # the previous bundle, if any, makes this an incremental update
+                # the artifact is exported by get_data_section once every section has been computed
+                bundle = update_data(data_cache['bundle'])
+            else:
+                print('data cache miss, loaded the data artifact')
+
+            data_cache['bundle']    = bundle
+            data_cache['signature'] = signature
+
+        return data_cache['bundle']
+
+
+# polls the input files and refreshes the data cache when they change, then hands the new bundle to the listeners
+# a change is only picked up when the files look the same on two checks, so we don't read files that are being written
+def watch_data( interval ):
+
+    last_signature = data_cache['signature']
+
+    while True:
+        time.sleep(interval)
+
+        signature = get_data_signature()
+        if signature == data_cache['signature'] or signature != last_signature:
+            last_signature = signature
+            continue
+
+        print('input files changed, refreshing the data')
+        try:
+            bundle = refresh_data_cache()
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print('could not refresh the data', e)
+            continue
+
+        notify_data_listeners(bundle)
+
+
+# hands a new bundle to each listener, the listeners that fail are removed
+# one fails when its session is gone, and that must not stop the updates of the other sessions
+def notify_data_listeners( bundle ):
+
+    with data_watcher_lock:
+        listeners = list(data_watcher['listeners'])
+
+    for listener in listeners:
+        try:
+            listener(bundle)
+        except Exception as e:
+            print('removing data listener ' + repr(listener) + ' that failed with ' + type(e).__name__ + ': ' + str(e) + '\n', end='')
+            remove_data_listener(listener)
+
+
+# starts the data watcher thread, once per process
+def start_data_watcher( interval=DATA_WATCH_INTERVAL ):
+
+    with data_watcher_lock:
+        if data_watcher['thread'] is None:
+            data_watcher['thread'] = threading.Thread(target=watch_data, args=(interval,), name='coviz-data-watcher', daemon=True)
+            data_watcher['thread'].start()
+
+
+# listener is called from the watcher thread with each new bundle
+def add_data_listener( listener ):
+
+    with data_watcher_lock:
+        data_watcher['listeners'].append(listener)
+
+
+def remove_data_listener( listener ):
+
+    with data_watcher_lock:
+        if listener in data_watcher['listeners']:
+            data_watcher['listeners'].remove(listener)
+
+
+# the incidence data column for a county name from the shapefile
+def get_incidence_column( name ):
 
-    # NAME_2 is the county name (concelho)
-    name = row['NAME_2']
     ucase_name = name.upper()
 
     # handle the only mismatches between the incidence data and the shape file
@@ -716,64 +1174,160 @@ def get_counties_incidence(row, incidence_data, idx):
     if ucase_name == 'PONTE DE SÔR':
         ucase_name = 'PONTE DE SOR'
 
-    try:
-        # select column and then row
-        incidence = incidence_data[ucase_name][idx]
-    except:
-        print('incidence not found for ' + ucase_name)
-        incidence = 0
+    return ucase_name
 
-    # print(ucase_name, incidence)
 
-    return incidence
+# the index of the nearest date to the requested date
+def get_incidence_index( incidence_dates, requested_date ):
 
+    # filter by the requested date, using a nearest match
+    idx = np.abs( incidence_dates - np.datetime64(requested_date, 'D') ).argmin()
 
-def get_incidence_index( incidence_data, requested_date ):
+    print('index for date', requested_date, 'is', idx, 'and corresponding date is', incidence_dates[idx])
 
-    # filter by the requested date, using a nearest match
+    return idx
 
-    # get a series with the differences between the requested date and the existing dates
-    delta_series = abs( pd.to_datetime(incidence_data['data'], format='%d-%m-%Y') - pd.to_datetime(requested_date))
 
-    # print(delta_series)
+# the dates and the contents of the county incidence file, read once per process and version of the file
+def get_incidence_file():
 
-    # find the index of the minimum differnce
-    idx = delta_series.idxmin()
+    incidence_file = DATA_DIR + INCIDENCE_FILE
 
-    print('index for date', requested_date, 'is', idx, 'and corresponding date is', pd.to_datetime(incidence_data['data'][idx]))
+    stat = os.stat(incidence_file)
+    signature = (incidence_file, stat.st_mtime_ns, stat.st_size)
 
-    return idx
+    if incidence_file_cache['signature'] != signature:
+        incidence_data = pd.read_csv(incidence_file, engine=CSV_ENGINE)
+        incidence_file_cache['table']     = ( get_dates(incidence_data['data']), incidence_data )
+        incidence_file_cache['signature'] = signature
 
+    return incidence_file_cache['table']
 
-# get county incidence list at a certain date
-def get_data_counties( requested_date=None ):
 
-    incidence_file = DATA_DIR + 'dssg/data_concelhos_incidencia.csv'
-    incidence_data = pd.read_csv(incidence_file)
+# turns the county incidence file into a float32 matrix with one row per date and one column per patch
+# returns the dates of the rows as datetime64 and the matrix, which is aligned with the rows of the patches
+def make_incidence_matrix( patches ):
 
-    # retrieves strings from the file
-    str_map_date_i = incidence_data['data'].tolist()[0]
-    str_map_date_f = incidence_data['data'].tolist()[-1]
+    incidence_dates, incidence_data = get_incidence_file()
 
-    # converts to proper dates
-    map_date_i = datetime.strptime(str_map_date_i, '%d-%m-%Y').date()
-    map_date_f = datetime.strptime(str_map_date_f, '%d-%m-%Y').date()
+    # NAME_2 is the county name (concelho), there may be several patches for the same county
+    columns = [ get_incidence_column(name) for name in patches['NAME_2'] ]
+
+    for name in sorted(set(columns) - set(incidence_data.columns)):
+        print('incidence not found for ' + name)
+
+    # the counties that are not found have zero incidence
+    matrix = incidence_data.reindex(columns=columns).to_numpy(dtype=np.float32)
+    missing = [ name not in incidence_data.columns for name in columns ]
+    matrix[:, missing] = 0
+
+    # this matrix is shared by all the sessions
+    matrix.flags.writeable = False
+
+    return incidence_dates, matrix
 
-    # the default is the latest available date
-    if requested_date is None:
-        requested_date = map_date_f
 
-    # the shapefile comes from:
-    # https://dados.gov.pt/s/resources/concelhos-de-portugal/20181112-193505/concelhos-shapefile.zip
+# the incidence matrix for a set of patches, built once per process and version of the incidence file
+# patches is the output of get_counties_patches
+def get_incidence_matrix( patches ):
 
-    # we  mention the .shp file but the companion files from the zip must be in the same directory
-    poly_file = '/home/deployment/data/shape/concelhos.shp'
+    # only the patches of the counties cache can be identified, any others get a matrix of their own
+    if patches is not counties_patches_cache['patches']:
+        return make_incidence_matrix(patches)
+
+    incidence_file = DATA_DIR + INCIDENCE_FILE
+
+    stat = os.stat(incidence_file)
+    signature = (incidence_file, stat.st_mtime_ns, stat.st_size, counties_patches_cache['signature'])
+
+    if incidence_matrix_cache['signature'] != signature:
+        incidence_matrix_cache['table']     = make_incidence_matrix(patches)
+        incidence_matrix_cache['signature'] = signature
+
+    return incidence_matrix_cache['table']
+
+
+# hash of the contents of a set of files
+def get_files_hash( paths ):
+
+    file_hash = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+# reads the shapefile, keeps the main land, projects to web mercator and simplifies the shapes with resolution in meters
+# the result has one row per polygon, with the original county row as index, ready to be used by a bokeh patches glyph
+def make_counties_patches( resolution ):
 
     # a GeoDataFrame object is a pandas.DataFrame that has a column with geometry
     # https://geopandas.org/docs/reference/api/geopandas.GeoDataFrame.html
-    poly_data = gpd.read_file(poly_file)
+    poly_data = gpd.read_file(SHAPE_FILE)
+
+    # remove the islands
+    poly_data = poly_data.loc[ poly_data['NAME_1'] != 'Azores'  ]
+    poly_data = poly_data.loc[ poly_data['NAME_1'] != 'Madeira' ]
+
+    # NAME_1 is the district and NAME_2 is the county name (concelho)
+    poly_data = poly_data[ [ 'NAME_1', 'NAME_2', 'geometry' ] ]
+
+    # this is the same processing that the plot_bokeh function of Pandas-Bokeh does for geoplots
+    poly_data = poly_data.to_crs(epsg=3857)
+    poly_data['geometry'] = poly_data['geometry'].simplify(resolution)
+
+    # lines that have multiple polygons are converted into multiple lines with the same index
+    return convert_geoDataFrame_to_patches(poly_data, 'geometry')
+
+
+# the main land county shapes, ready to plot, built once and then persisted on CACHE_DIR
+# the persistent cache is keyed by the shapefile contents and the resolution
+def get_counties_patches( resolution ):
+
+    shape_files = sorted(glob.glob(os.path.splitext(SHAPE_FILE)[0] + '.*'))
 
-    pd.set_option('display.max_rows', None)
+    # cheap check first, so that we don't hash the shapefile for every session
+    signature = tuple( (path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in shape_files ) + (resolution,)
+    if counties_patches_cache['signature'] == signature:
+        return counties_patches_cache['patches']
+
+    cache_file = CACHE_DIR + 'counties-' + get_files_hash(shape_files) + '-' + str(resolution) + '.pkl'
+
+    # a truncated file or one written by other library versions is rebuilt like a missing one
+    try:
+        patches = pd.read_pickle(cache_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError) as e:
+        print('counties cache miss, processing the shapefile', type(e).__name__)
+        patches = make_counties_patches(resolution)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_file = cache_file + '.tmp.' + str(os.getpid())
+            patches.to_pickle(tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print('could not write the counties cache', e)
+
+    counties_patches_cache['patches']   = patches
+    counties_patches_cache['signature'] = signature
+
+    return patches
+
+
+# get county incidence list at a certain date
+# patches is the output of get_counties_patches
+def get_data_counties( patches, requested_date=None ):
+
+    incidence_dates, incidence_matrix = get_incidence_matrix(patches)
+
+    # converts to proper dates
+    map_date_i = incidence_dates[0].astype(object)
+    map_date_f = incidence_dates[-1].astype(object)
+
+    # the default is the latest available date
+    if requested_date is None:
+        requested_date = map_date_f
 
     # based on this work
     # https://github.com/jfexbrayat/bokeh-covid/blob/main/bokeh_covid.ipynb
@@ -781,17 +1335,13 @@ def get_data_counties( requested_date=None ):
     # let's determine the best index on the incidence vs time table for a requested date
     # that is because data_concelhos_incidencia-*.csv seems to be updated only each 7 days
     # but the pattern is not clear and we must make sure we don't crash
-    idx = get_incidence_index( incidence_data, requested_date )
+    idx = get_incidence_index( incidence_dates, requested_date )
 
     # let's add a column with the incidence data for a certain moment in time
-    poly_data['incidence'] = poly_data.apply(get_counties_incidence, incidence_data=incidence_data, idx=idx, axis=1)
-
-    # remove the islands
-    poly_data = poly_data.loc[ poly_data['NAME_1'] != 'Azores'  ]
-    poly_data = poly_data.loc[ poly_data['NAME_1'] != 'Madeira' ]
-
-    # print(poly_data)
+    # the patches belong to a shared cache so we work on a copy
+    poly_data = patches.copy()
+    poly_data['incidence'] = incidence_matrix[idx]
 
-    # we return a GeoDataFrame with the counties from the main land, to which an incidence column has been added
+    # we return a DataFrame with a row per polygon of the main land counties, to which an incidence column has been added
     # we also return the first and last dates available from the incidence time series
     return poly_data, map_date_i, map_date_f
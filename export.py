@@ -0,0 +1,12 @@
+# builds the memory mapped data artifact that the server opens instead of parsing the CSV files
+# usage: python export.py [target_dir]
+
+import sys
+
+from data import ARTIFACT_DIR, get_data, get_data_signature, export_data_artifact
+
+target_dir = sys.argv[1] if len(sys.argv) > 1 else ARTIFACT_DIR
+
+export_data_artifact( get_data(), get_data_signature(), target_dir )
+
+print('data artifact written to', target_dir)
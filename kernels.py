@@ -0,0 +1,180 @@
+import numpy as np
+
+# windowed aggregations over the daily series, computed with cumulative sums in O(n)
+# they are NaN aware: a window that contains a NaN or a None gives NaN, like summing the window in python would
+# the rolling kernels work along the last axis, so a groups x days matrix is handled in one go
+
+
+# float64 copy of a series, None becomes NaN
+def make_array( data ):
+
+    return np.array(data, dtype=np.float64)
+
+
+# cumulative sums with a leading zero, so that the sum of data[i:j] is sums[j] - sums[i]
+# the missing values are counted apart, a window only has a sum if no missing value entered it
+def get_prefix_sums( data ):
+
+    values  = make_array(data)
+    missing = np.isnan(values)
+
+    shape = values.shape[:-1] + ( values.shape[-1] + 1, )
+    sums  = np.zeros(shape)
+    nans  = np.zeros(shape, dtype=np.int64)
+    np.cumsum( np.where(missing, 0, values), axis=-1, out=sums[..., 1:] )
+    np.cumsum( missing, axis=-1, out=nans[..., 1:] )
+
+    return sums, nans
+
+
+# sums of data[left:right] for arrays of left and right indexes
+def get_window_sums( prefix, left, right ):
+
+    sums, nans = prefix
+
+    result = sums[..., right] - sums[..., left]
+    result[ nans[..., right] != nans[..., left] ] = np.nan
+
+    return result
+
+
+# the sums of data[start:end] along the last axis, from the sums of get_prefix_sums, where the missing values count as zero
+# the indexes are clipped to the series like a python slice would, so any range is two lookups
+def get_range_sums( sums, start, end ):
+
+    length = sums.shape[-1] - 1
+    start  = min( max(start, 0), length )
+    end    = min( max(end, start), length )
+
+    return sums[..., end] - sums[..., start]
+
+
+# prefix sums of the count, x, y, x^2, y^2 and x*y of the days where both series are present, as a 6 x (days + 1) matrix
+# with them the least squares fit of any range of days is a few lookups, see get_range_regression
+def get_regression_sums( x, y ):
+
+    x = make_array(x)
+    y = make_array(y)
+
+    present = ~( np.isnan(x) | np.isnan(y) )
+    x = np.where(present, x, 0)
+    y = np.where(present, y, 0)
+
+    return get_prefix_sums( np.array([ present, x, y, x * x, y * y, x * y ], dtype=np.float64) )[0]
+
+
+# slope, intercept and pearson correlation coefficient of y = slope * x + intercept over the days start:end
+# they are NaN if the range has less than two days or if one of the series is constant
+def get_range_regression( sums, start, end ):
+
+    n, sx, sy, sxx, syy, sxy = get_range_sums( sums, start, end )
+
+    cov   = n * sxy - sx * sy
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope     = cov / var_x
+        intercept = ( sy - slope * sx ) / n
+        r_value   = cov / np.sqrt( var_x * var_y )
+
+    return float(slope), float(intercept), float(r_value)
+
+
+# the minimum and the maximum of each day over several series, missing values are ignored
+def get_day_limits( data ):
+
+    # the rows are counted explicitly, as -1 can not be inferred for empty series
+    shape  = np.shape(data)
+    values = make_array(data).reshape( int(np.prod(shape[:-1])), shape[-1] )
+
+    return np.fmin.reduce(values, axis=0), np.fmax.reduce(values, axis=0)
+
+
+# for each day, the sum of the window values that end lag days before it, that is data[i - window - lag + 1:i - lag + 1]
+# the days without a complete window are NaN, unless partial windows are allowed, then they are clipped to the first day
+def rolling_sum( data, window, lag=0, partial=False ):
+
+    shape  = np.shape(data)
+    length = shape[-1]
+    right  = np.arange(length) + 1 - lag
+    left   = right - window
+    if partial:
+        left = np.maximum(left, 0)
+    valid  = ( left >= 0 ) & ( left <= right ) & ( right <= length )
+
+    result = np.full(shape, np.nan)
+    result[..., valid] = get_window_sums( get_prefix_sums(data), left[valid], right[valid] )
+
+    return result
+
+
+def rolling_mean( data, window, lag=0 ):
+
+    return rolling_sum(data, window, lag) / window
+
+
+# for each day, num[i] / den[i - lag]
+# the first lag days are NaN, and so are the days where any of the values is missing or zero
+def lagged_ratio( num, den, lag ):
+
+    num = make_array(num)
+    den = make_array(den)
+
+    result = np.full(len(num), np.nan)
+    if lag < len(num):
+        current  = num[lag:]
+        previous = den[:len(num) - lag]
+        valid    = ( current != 0 ) & ( previous != 0 )
+        result[lag:][valid] = current[valid] / previous[valid]
+
+    return result
+
+
+# a float64 copy of the series with the first count days set to NaN, along the last axis
+# note: like the original list based series, the result has count days if the series is shorter than that
+def pad_nan( values, count ):
+
+    values = make_array(values)
+    length = values.shape[-1]
+
+    result = np.full( values.shape[:-1] + ( max(length, count), ), np.nan )
+    result[..., count:] = values[..., count:]
+
+    return result
+
+
+# fills the gaps of up to max_gap missing days by linear interpolation between the reported days around them, along the last axis
+# longer gaps and the missing days at the end stay missing, the ones before the first reported day follow leading:
+# None keeps them missing, 'zero' sets them to zero and 'first' repeats the first reported value
+# returns the patched copy and a boolean mask of the cells that were filled
+def patch_gaps( data, max_gap=1, leading=None ):
+
+    values  = make_array(data)
+    missing = np.isnan(values)
+    length  = values.shape[-1]
+
+    # for each day, the index of the closest reported day before (or at) it and after (or at) it
+    days      = np.broadcast_to( np.arange(length), values.shape )
+    previous  = np.maximum.accumulate( np.where(missing, -1, days), axis=-1 )
+    following = np.minimum.accumulate( np.where(missing, length, days)[..., ::-1], axis=-1 )[..., ::-1]
+
+    before = np.take_along_axis( values, np.maximum(previous, 0), axis=-1 )
+    after  = np.take_along_axis( values, np.minimum(following, length - 1), axis=-1 )
+
+    inner = missing & ( previous >= 0 ) & ( following < length ) & ( following - previous - 1 <= max_gap )
+    if leading == 'zero':
+        initial = missing & ( previous < 0 )
+    elif leading == 'first':
+        initial = missing & ( previous < 0 ) & ( following < length )
+    else:
+        initial = np.zeros_like(missing)
+
+    # weighted so that a single missing day gets exactly the average of the adjacent days
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interpolated = ( before * ( following - days ) + after * ( days - previous ) ) / ( following - previous )
+
+    values[inner]   = interpolated[inner]
+    values[initial] = 0 if leading == 'zero' else after[initial]
+
+    return values, inner | initial
@@ -1,4 +1,5 @@
 import math
+import time
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -15,7 +16,10 @@ from bokeh.palettes import Inferno256, Magma256, Turbo256, Plasma256, Cividis256
 from bokeh.plotting import figure
 from bokeh.events import DocumentReady
 
-from .data import get_data, get_data_counties
+from .data import get_cached_data, get_counties_patches, get_data_counties, get_incidence_file, get_incidence_matrix, get_incidence_index, submit_timed, \
+    start_data_watcher, add_data_listener, remove_data_listener, get_data_section
+
+from kernels import get_range_sums, get_range_regression
 
 # import configuration variables
 from config import *
@@ -35,14 +39,6 @@ current_horizontal = True
 ### callbacks ####
 
 
-# for the toggle button action
-def update_state(new):
-
-    cline2.visible = clines_switch.active
-    cline3.visible = clines_switch.active
-    cline4.visible = clines_switch.active
-
-
 # for the visible stats
 def update_stats(attr, old, new):
 
@@ -50,16 +46,17 @@ def update_stats(attr, old, new):
     date_f_cmp = date_slider1.value_as_date[1]
 
     # we need to know the list positions to sum the numbers
-    idx1 = (date_i_cmp - data_dates[0]).days
-    idx2 = (date_f_cmp - data_dates[0]).days
+    idx1 = get_date_index(data_dates, date_i_cmp)
+    idx2 = get_date_index(data_dates, date_f_cmp)
 
-    # use nansum because there may be NaNs due to delayed / missing data
+    # the prefix sums skip the NaNs because there may be NaNs due to delayed / missing data
+    sums = get_range_sums( data_stats_sums, idx1, idx2 + 1 )
 
-    sum_new              = make_html_integer(np.nansum(np.array(         raw_data_new[idx1:idx2 + 1] )))
-    sum_cv19_deaths      = make_html_integer(np.nansum(np.array( raw_data_cv19_deaths[idx1:idx2 + 1] )))
-    sum_total_deaths_pre = np.nansum(np.array( raw_data_total_deaths[idx1:idx2 + 1] ))
+    sum_new              = make_html_integer(int( sums[0] ))
+    sum_cv19_deaths      = make_html_integer(int( sums[1] ))
+    sum_total_deaths_pre = int( sums[2] )
 
-    sum_avg_deaths_pre   = int(round( np.nansum(np.array( raw_data_avg_deaths[idx1:idx2 + 1] ) ), 0))
+    sum_avg_deaths_pre   = int(round( sums[3], 0))
 
     excess_deaths     = sum_total_deaths_pre - sum_avg_deaths_pre
     excess_deaths_pct = round( (excess_deaths / sum_avg_deaths_pre) * 100, 1)
@@ -67,225 +64,337 @@ def update_stats(attr, old, new):
     sum_avg_deaths   = make_html_integer( sum_avg_deaths_pre   )
     sum_total_deaths = make_html_integer( sum_total_deaths_pre )
 
-    # this is what is necessary to update an existing table
-
-    # local vars
-    stats_data = pd.DataFrame( { 'updated': str(data_dates[-1]), 'sum_new': [sum_new], 'sum_cv19_deaths': [sum_cv19_deaths], 'sum_total_deaths': [sum_total_deaths], 'sum_avg_deaths': [sum_avg_deaths], 'excess_deaths': [excess_deaths], 'excess_deaths_pct': [excess_deaths_pct] } )
-    stats_source = ColumnDataSource( stats_data )
+    # the single row of the existing table is patched in place, so only the new values are sent to the browser
+    stats_data = { 'updated': str(data_dates[-1]), 'sum_new': sum_new, 'sum_cv19_deaths': sum_cv19_deaths, 'sum_total_deaths': sum_total_deaths,
+                   'sum_avg_deaths': sum_avg_deaths, 'excess_deaths': excess_deaths, 'excess_deaths_pct': excess_deaths_pct }
 
     # pre-existing global var
-    stats_table.source = stats_source
+    stats_table.source.patch({ key: [ ( 0, value ) ] for key, value in stats_data.items() })
 
 
-# makes the legends appear / disappear as necessary
-def update_legends(attr, old, new, section):
+# for the map
+def update_map(attr, old, new):
 
-    if section == "1":
-        date_i_cmp = date_slider1.value_as_date[0]
-        date_f_cmp = date_slider1.value_as_date[1]
-        nr_days = days
-    else:
-        date_i_cmp = date_slider2.value_as_date[0]
-        date_f_cmp = date_slider2.value_as_date[1]
-        nr_days = days2
+    date = date_slider_map.value_as_date
+
+    print('map updating', date)
+
+    # the columns of the incidence matrix are in the same order as the rows of the map data source
+    idx = get_incidence_index( map_incidence_dates, date )
+
+    # we update the data source directly on the column that holds the incidence info
+    # this column, name Colormap, is added inside make_map_plot
+    plot_map_s1.data['Colormap'] = map_incidence_matrix[idx].copy()
+
+    # we refresh the tooltips using the Colormap column as the list
+    plot_map.hover.tooltips = [ ('County', '@NAME_2'), ('Incidence', '@Colormap'), ]
+
+
+def update_mortality_stats(attr, old, new):
+
+    date_i_cmp = date_slider4.value_as_date[0]
+    date_f_cmp = date_slider4.value_as_date[1]
 
     # we need to know the list positions to sum the numbers
-    idx1 = (date_i_cmp - data_dates[0]).days
-    idx2 = (date_f_cmp - data_dates[0]).days
-
-    # the -7 is because we start 7 days later on the dates, due to the moving average :-)
-    if idx2 - idx1 < nr_days - 7:
-        my_visibility   = False
-        my_click_policy = 'none'
-        my_location     = (0, -1000)
-    else:
-        my_visibility   = True
-        my_click_policy = 'mute'
-        my_location     = 'top_left'
-
-    # act on plots that have dynamic legend
-    if section == "1":
-        plot3.legend.visible = my_visibility
-        plot7.legend.visible = my_visibility
-    else:
-        # in this case toggling the visibility is not enough, because the legend,
-        # if invisible but present, prevents hovering the lines
-        plot10.legend.location = my_location
-        plot11.legend.location = my_location
-        # this is because even when the legend is invisible it is clickable
-        # and therefore lines could be muted / unmuted by accident
-        # this shhold not be necessary because we already moved id away above
-        # but it is here for reference
-        plot10.legend.click_policy = my_click_policy
-        plot11.legend.click_policy = my_click_policy
-
-
-# for the data range
-def update_plot_range(attr, old, new, section):
-
-    if section == '1':
-        my_slider    = date_slider1
-        my_plot_data = plot_data_s1
-    else:
-        my_slider    = date_slider2
-        my_plot_data = plot_data_s2
+    idx1 = get_date_index(data_dates, date_i_cmp)
+    idx2 = get_date_index(data_dates, date_f_cmp)
 
-    date_i = my_slider.value[0]
-    date_f = my_slider.value[1]
+    # the totals of each age group for the selected days, from the prefix sums of the data bundle
+    # we use the non smoothed version for the stats, the prefix sums skip the NaNs due to delayed / missing data
+    sum_total_deaths, sum_avg_deaths, sum_avg_deaths_inf, sum_avg_deaths_sup = get_range_sums( data_mortality_sums, idx1, idx2 + 1 )
 
-    if date_i == date_f:
-        return
+    sum_avg_deaths     = np.round(sum_avg_deaths)
+    sum_avg_deaths_sup = np.round(sum_avg_deaths_sup)
 
-    date_i_cmp = my_slider.value_as_date[0]
-    date_f_cmp = my_slider.value_as_date[1]
+    # the inf and sup values are symmetrical, so using only one of them simplifies the notation
+    sum_avg_deaths_sup_pct = np.round( ( ( sum_avg_deaths_sup - sum_avg_deaths ) / sum_avg_deaths ) * 100, 1 )
 
-    for d in my_plot_data:
+    # we have to do some funky padding because the normal python format can not insert &nbsp;
+    # and the HTML cells do away with normal spaces
+    str_tmp    = np.char.mod( '%d', sum_avg_deaths )
+    str_spaces = np.char.multiply( '&nbsp;', 6 - np.char.str_len(str_tmp) )
 
-        # we get the plot from the tuple
-        p = d[0]
+    column_avg = np.char.add( np.char.add( str_tmp, str_spaces ), np.char.mod( ' ± %s%%', sum_avg_deaths_sup_pct ) )
 
-        # for some reason we need to pad the range to get an exact day match with the slider
-        p.x_range.start = date_i - pd.Timedelta(days=1).total_seconds() * 1000
+    excess_deaths = sum_total_deaths - sum_avg_deaths
 
-        # this one is just for the line not to be attached to the limit of the plot
-        p.x_range.end   = date_f + pd.Timedelta(days=2).total_seconds() * 1000
+    # to compensate for the minus sign
+    str_pad = np.where( excess_deaths > 0, '&nbsp;', '' )
 
-        # we pass the data source from the tuple
-        y_min, y_max = get_y_limits(d[1], date_i_cmp, date_f_cmp)
-        if math.isnan(y_min) or math.isnan(y_max):
-            print('not rescaling due to having received nan')
-            continue
+    column_exc = np.char.add( str_pad, np.char.mod( '%d', excess_deaths ) )
+    column_pct = np.char.add( str_pad, np.char.mod( '%s%%', np.round( ( excess_deaths / sum_avg_deaths ) * 100, 1 ) ) )
 
-        # print (y_min, y_max)
+    # the rows of the existing table are patched in place, so only the new values are sent to the browser
+    rows = slice( 0, len(sum_total_deaths) )
 
-        # adjust range
-        range_delta = y_max * PLOT_RANGE_FACTOR
-        p.y_range.end    = y_max + range_delta
-        p.y_range.start  = y_min - range_delta
+    # pre-existing global var
+    mortality_stats_table.source.patch({ 'sum_total_deaths':  [ ( rows, sum_total_deaths.astype(int).tolist() ) ],
+                                         'sum_avg_deaths':    [ ( rows, column_avg.tolist() ) ],
+                                         'excess_deaths':     [ ( rows, column_exc.tolist() ) ],
+                                         'excess_deaths_pct': [ ( rows, column_pct.tolist() ) ] })
 
+    update_mortality_correlation(attr, old, new)
 
-# for the map
-def update_map(attr, old, new):
 
-    date = date_slider_map.value_as_date
+# the table caption and the correlation plot, these are updated by the server even when the stats tables are computed in the browser
+def update_mortality_correlation(attr, old, new):
 
-    print('map updating', date)
+    date_i_cmp = date_slider4.value_as_date[0]
+    date_f_cmp = date_slider4.value_as_date[1]
 
-    print('process data counties - START')
+    idx1 = get_date_index(data_dates, date_i_cmp)
+    idx2 = get_date_index(data_dates, date_f_cmp)
 
-    new_data_incidence_counties, xxx, yyy = get_data_counties( date )
+    # update table caption
+    mortality_notes.text = 'Data for period of ' + str(date_i_cmp) + ' to ' + str(date_f_cmp)
 
-    print('process data counties - DONE')
+    # and for the correlation plot, the fit of the selected days comes from the regression sums of the data bundle
+    # the NaNs due to moving averages are skipped by the sums and left out of the scatter
+    slope, intercept, r_value = get_range_regression( data_correlation_sums, idx1, idx2 + 1 )
 
-    # index in aux_index has repeated values, as multipoly rows in the original data were converted into several rows
-    j = 0
-    inc_list = np.array( [] )
-    for index in aux_index:
-        # print (index, j)
-        inc_list = np.append(inc_list, new_data_incidence_counties['incidence'][index])
-        j = j + 1
+    # update the global variables
+    # the source keeps all the days, the scatter shows the selected ones through the filter of its view
+    days_subset = np.arange( max(idx1, 0), min(idx2 + 1, days) )
+    correlation_filter.indices = days_subset[ ~np.isnan(corr_data_cv19_deaths[days_subset]) & ~np.isnan(corr_data_exc_deaths[days_subset]) ].tolist()
 
-    # we update the data source directly on the column that holds the incidence info
-    # this column, name Colormap, is added inside plot_bokeh
-    plot_map_s1.data['Colormap'] = inc_list
+    regression_line.gradient    = slope
+    regression_line.y_intercept = intercept
 
-    # we refresh the tooltips using the Colormap column as the list
-    plot_map.hover.tooltips = [ ('County', '@NAME_2'), ('Incidence', '@Colormap'), ]
+    label_str = make_correlation_str(slope, intercept, r_value)
+    regression_label.text       = label_str
 
 
-# for the overall mortality plot
-def update_mortality_plot_range(attr, old, new):
+# unpacks a data bundle from get_cached_data into the global variables used by the plots and callbacks
+# the bundle is a process wide cache shared by all the sessions, so the data must not be modified in place
+def set_data( bundle ):
+
+    global data_bundle, data_dates, data_dates2, data_new, data_hosp, data_hosp_uci, data_cv19_deaths, data_incidence, data_cfr, data_rt
+    global data_pos, data_total_deaths, data_avg_deaths, data_avg_deaths_inf, data_avg_deaths_sup, data_tests, raw_data_new
+    global raw_data_cv19_deaths, raw_data_total_deaths, raw_data_avg_deaths, data_exc_deaths, raw_data_exc_deaths, corr_data_exc_deaths
+    global corr_data_cv19_deaths, data_stats_sums, days, days2
+
+    # the other sections are only unpacked when the respective plots are built, see set_section_data
+    data_bundle = bundle
+
+    data = get_data_section(bundle, 'main')
+
+    data_dates             = data['dates']
+    data_dates2            = data['dates2']
+    data_new               = data['new']
+    data_hosp              = data['hosp']
+    data_hosp_uci          = data['hosp_uci']
+    data_cv19_deaths       = data['cv19_deaths']
+    data_incidence         = data['incidence']
+    data_cfr               = data['cfr']
+    data_rt                = data['rt']
+    data_pos               = data['positivity']
+    data_total_deaths      = data['total_deaths']
+    data_avg_deaths        = data['avg_deaths']
+    data_avg_deaths_inf    = data['avg_deaths_inf']
+    data_avg_deaths_sup    = data['avg_deaths_sup']
+    data_tests             = data['total_tests']
 
-    pre_box.right = date_slider4.value[0]
-    post_box.left = date_slider4.value[1]
+    raw_data_new          = data['raw_new']
+    raw_data_cv19_deaths  = data['raw_cv19_deaths']
+    raw_data_total_deaths = data['raw_total_deaths']
+    raw_data_avg_deaths   = data['raw_avg_deaths']
+    data_stats_sums       = data['stats_sums']
 
+    data_exc_deaths       = data_total_deaths - data_avg_deaths
+    raw_data_exc_deaths   = raw_data_total_deaths - raw_data_avg_deaths
 
-def update_mortality_stats(attr, old, new):
+    # IMPORTANT
+    #
+    # We use the raw data for the excess mortality calculations
+    # but we are using the smoothed data for the correlation between
+    # excess mortality and cv mortality because doing otherwise leads
+    # to strange results such as week correlation between 26-09-2020 and 22-12-2020
+    # where the correlation is more than obvious (return to school, pre vax)
+    #
+    # It might be that the CV19 reporting dates might not match the dates reported
+    # by the eVM database, for the deaths events of the same people
 
-    date_i_cmp = date_slider4.value_as_date[0]
-    date_f_cmp = date_slider4.value_as_date[1]
+    corr_data_exc_deaths  = data_exc_deaths
+    corr_data_cv19_deaths = data_cv19_deaths
 
-    # we need to know the list positions to sum the numbers
-    idx1 = (date_i_cmp - data_dates[0]).days
-    idx2 = (date_f_cmp - data_dates[0]).days
+    # calculate the nr of days using the most reliable source
+    days  = len(data_new)
+    days2 = len(data_dates2)
 
-    column_total = []
-    column_avg   = []
-    column_exc   = []
-    column_pct   = []
 
-    # we use the non smoothed version for the stats
-    for total_strat_group, avg_strat_group, avg_strat_group_inf, avg_strat_group_sup in zip(total_deaths_strat, avg_deaths_strat, avg_deaths_strat_inf, avg_deaths_strat_sup):
+# unpacks a section of the current data bundle into the global variables, the section is computed on first use
+def set_section_data( name ):
 
-        # use nansum because there may be NaNs due to delayed / missing data
+    global data_strat_new, data_strat_cv19_deaths, data_strat_cfr, data_vacc_part, data_vacc_full, data_vacc_boost, data_vacc_cfr
+    global data_vacc_chr, data_strat_mort, data_min_prevalence, data_max_prevalence, data_avg_prevalence
+    global total_deaths_strat, s_total_deaths_strat, avg_deaths_strat, avg_deaths_strat_inf, avg_deaths_strat_sup
+    global s_avg_deaths_strat, s_avg_deaths_strat_inf, s_avg_deaths_strat_sup, data_mortality_sums, data_correlation_sums
 
-        sum_total_deaths = round(np.nansum(np.array( total_strat_group[idx1:idx2 + 1] )), 0)
-        column_total.append(sum_total_deaths)
+    data = get_data_section(data_bundle, name)
 
-        sum_avg_deaths     = round(np.nansum(np.array(     avg_strat_group[idx1:idx2 + 1] )), 0)
-        sum_avg_deaths_inf = round(np.nansum(np.array( avg_strat_group_inf[idx1:idx2 + 1] )), 0)
-        sum_avg_deaths_sup = round(np.nansum(np.array( avg_strat_group_sup[idx1:idx2 + 1] )), 0)
+    if name == 'stratified':
+        data_strat_new         = data['strat_cv19_new']
+        data_strat_cv19_deaths = data['strat_cv19_deaths']
+        data_strat_cfr         = data['strat_cfr']
 
-        sum_avg_deaths_inf_pct = round(( ( sum_avg_deaths_inf - sum_avg_deaths ) / sum_avg_deaths ) * 100, 1)
-        sum_avg_deaths_sup_pct = round(( ( sum_avg_deaths_sup - sum_avg_deaths ) / sum_avg_deaths ) * 100, 1)
+        # we append the average CFR line clipped to the number of available days
+        # note: vstack builds a new matrix, the original one belongs to the shared data cache
+        data_strat_cfr = np.vstack( ( data_strat_cfr, data_cfr[0:days2] ) )
 
-        # the inf and sup values are symmetrical, so using only one of them simplifies the notation
-        str_avg_deaths = '{:⁢<6} ± {}'.format(int(sum_avg_deaths), sum_avg_deaths_sup_pct)
+    elif name == 'vaccination':
+        data_vacc_part  = data['vacc_part']
+        data_vacc_full  = data['vacc_full']
+        data_vacc_boost = data['vacc_boost']
+        data_vacc_cfr   = data['vacc_cfr_data']
+        data_vacc_chr   = data['vacc_chr_data']
 
-        # we have to do some funky padding because the normal python format can not insert &nbsp;
-        # and the HTML cells do away with normal spaces
+    elif name == 'mortality':
+        data_strat_mort       = data['strat_mortality_info']
+        data_mortality_sums   = data['mortality_sums']
+        data_correlation_sums = data['correlation_sums']
 
-        str_tmp = str(int(sum_avg_deaths))
-        nspaces = 6 - len(str_tmp)
+        # the first one is raw, the second is smoothed
+        total_deaths_strat     = data_strat_mort['total']
+        s_total_deaths_strat   = data_strat_mort['s_total']
 
-        str_spaces = '&nbsp;' * nspaces
+        # the rigorous versions are used for the calculations
+        avg_deaths_strat       = data_strat_mort['avg']
+        avg_deaths_strat_inf   = data_strat_mort['avg_inf']
+        avg_deaths_strat_sup   = data_strat_mort['avg_sup']
 
-        str_avg_deaths = str_tmp + str_spaces + ' ± ' + str(sum_avg_deaths_sup_pct) + '%'
+        # we obtain the smooth versions for the plot
+        s_avg_deaths_strat       = data_strat_mort['s_avg']
+        s_avg_deaths_strat_inf   = data_strat_mort['s_avg_inf']
+        s_avg_deaths_strat_sup   = data_strat_mort['s_avg_sup']
 
-        column_avg.append(str_avg_deaths)
+    elif name == 'prevalence':
+        data_min_prevalence = data['min_prevalence']
+        data_max_prevalence = data['max_prevalence']
+        data_avg_prevalence = data['avg_prevalence']
 
-        excess_deaths = sum_total_deaths - sum_avg_deaths
 
-        # to compensate for the minus sign
-        str_pad = ''
-        if excess_deaths > 0:
-            str_pad = '&nbsp;'
+# the updates of this session waiting for the next tick, by name
+# the update functions read the current slider values, so only the latest update of each name needs to run
+pending_updates = {}
 
-        column_exc.append( str_pad + str(int(excess_deaths)) )
 
-        column_pct.append( str_pad + str(round( (excess_deaths / sum_avg_deaths) * 100, 1)) + '%' )
+# queues an update for the next tick, a newer update with the same name supersedes the pending one
+def schedule_update( name, update ):
 
-    # this is what is necessary to update an existing table
+    if not pending_updates:
+        document.add_next_tick_callback(run_pending_updates)
 
-    # local vars
-    dummy_column = [ 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1 , 1]
-    index_column = [ '<1', '1-4', '5-14', '15-24', '25-34', '35-44', '45-54', '55-64', '65-74', '75-84', '>85', 'all ages', 'all ages*' ]
+    pending_updates[name] = update
 
-    stats_data = pd.DataFrame( { 'age_group': index_column, 'sum_total_deaths': column_total, 'sum_avg_deaths': column_avg, 'excess_deaths': column_exc, 'excess_deaths_pct': column_pct } )
-    stats_source = ColumnDataSource( stats_data )
 
-    # pre-existing global var
-    mortality_stats_table.source = stats_source
+# runs the pending updates with the document on hold, so that all their changes reach the browser in a single message
+def run_pending_updates():
 
-    # update table caption
-    mortality_notes.text = 'Data for period of ' + str(date_i_cmp) + ' to ' + str(date_f_cmp)
+    updates = list(pending_updates.values())
+    pending_updates.clear()
 
-    # and for the correlation plot
+    document.hold('combine')
+    try:
+        for update in updates:
+            update()
+    finally:
+        document.unhold()
 
-    data_cv19_deaths_subset = get_clean_data(corr_data_cv19_deaths[idx1:idx2 + 1])
-    data_exc_deaths_subset  = get_clean_data( corr_data_exc_deaths[idx1:idx2 + 1])
 
-    slope, intercept, r_value = get_correlation_data(data_cv19_deaths_subset, data_exc_deaths_subset)
+# for the slider callbacks, the events that arrive before the next tick are coalesced into one update
+def on_slider_change( name, function, attr, old, new ):
 
-    # update the global variables
-    source_plot_correlation.data = dict(x=data_cv19_deaths_subset, y=data_exc_deaths_subset)
-    correlation_coefficient      = r_value
+    schedule_update( name, partial(function, attr, old, new) )
 
-    regression_line.gradient    = slope
-    regression_line.y_intercept = intercept
 
-    label_str = make_correlation_str(slope, intercept, r_value)
-    regression_label.text       = label_str
+# called by the data watcher, from its own thread, when the input files change
+def on_data_changed( bundle ):
+
+    # the document can only be modified from its own callbacks, a newer bundle supersedes one that is still pending
+    document.add_next_tick_callback( partial(schedule_update, 'data', partial(update_data, bundle)) )
+
+
+# the watcher stops calling a session once it is closed, its document can't take callbacks anymore
+def on_session_destroyed( session_context ):
+
+    remove_data_listener(on_data_changed)
+
+
+# applies a new data bundle to the live document, only the differences are sent to the browser
+def update_data( bundle ):
+
+    global date_f
+
+    print('updating the document with new data')
+
+    old_date_f = date_f
+
+    set_data(bundle)
+
+    date_f = data_dates[days - 1]
+
+    update_data_source( source_plot1,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['total_tests'], y=data_tests) )
+    update_data_source( source_plot2,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['positivity'], y=data_pos) )
+    update_data_source( source_plot3,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['hosp'], y=data_hosp, y2=np.array(data_hosp_uci) * 5, y3=data_hosp_uci) )
+    update_data_source( source_plot4,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['cfr'], y=data_cfr) )
+    update_data_source( source_plot5,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['new'], y=data_new) )
+    update_data_source( source_plot6,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['rt'], y=data_rt) )
+    update_data_source( source_plot7,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['total_deaths'], y=data_total_deaths, y2=data_avg_deaths, y3=data_avg_deaths_inf, y4=data_avg_deaths_sup) )
+    update_data_source( source_plot8,  make_dates_columns(data_dates, PLOT_DATA_PRECISION['cv19_deaths'], y=data_cv19_deaths) )
+
+    update_data_source( source_plot2_critical, make_dates_columns(data_dates, y=np.full( days, POSITIVITY_LIMIT )) )
+    update_data_source( source_plot3_critical, make_dates_columns(data_dates, y=np.full( days, UCI_LIMIT )) )
+    update_data_source( source_plot6_critical, make_dates_columns(data_dates, y=np.full( days, RT_LIMIT )) )
+
+    # the later sections are only updated once they are built, they take the current data when they are
+    if 'section2' in section_layouts:
+        set_section_data('stratified')
+        set_section_data('vaccination')
+
+        update_data_source( source_plot9,  make_multi_dates_columns(data_dates2, data_strat_new, PLOT_DATA_PRECISION['strat_cv19_new']) )
+        update_data_source( source_plot10, make_multi_dates_columns(data_dates2, data_strat_cv19_deaths, PLOT_DATA_PRECISION['strat_cv19_deaths']) )
+        update_data_source( source_plot11, make_multi_dates_columns(data_dates2, data_strat_cfr, PLOT_DATA_PRECISION['strat_cfr']) )
+        update_data_source( source_plot12, make_dates_columns(data_dates2, PLOT_DATA_PRECISION['vacc_part'], y=data_vacc_part, y2=data_vacc_full, y3=data_vacc_boost) )
+
+    if 'section3' in section_layouts:
+        update_data_source( source_plot_incidence, make_dates_columns(data_dates, PLOT_DATA_PRECISION['incidence'], y=data_incidence) )
+
+    if 'section4' in section_layouts:
+        set_section_data('mortality')
+
+        update_data_source( source_plot_correlation, make_correlation_columns(corr_data_cv19_deaths, corr_data_exc_deaths) )
+
+        for j, source in enumerate(p4_sources):
+            update_data_source( source, make_dates_columns(data_dates, PLOT_DATA_PRECISION['strat_mortality_info'], y=s_total_deaths_strat[j], y2=s_avg_deaths_strat[j], y3=avg_deaths_strat_inf[j], y4=avg_deaths_strat_sup[j]) )
+
+    if 'section5' in section_layouts:
+        set_section_data('prevalence')
+
+        update_data_source( source_plot_prevalence, make_dates_columns(data_dates, PLOT_DATA_PRECISION['avg_prevalence'], y=data_max_prevalence, y2=data_avg_prevalence, y3=data_min_prevalence) )
+
+    # replacing the per day limits rescales the plots in the browser, see range_callback_code
+    for limits, d in zip(limits_s1 + limits_s2, plot_data_s1 + plot_data_s2):
+        limits.data = make_limits_columns(d[1])
+
+    # the sliders that ended on the last day keep following it, changing their values rescales the plots
+    for slider in date_sliders:
+        slider.end = date_f
+        if slider.value_as_date[1] == old_date_f.astype(object):
+            slider.value = ( get_date_ms(slider.value_as_date[0]), get_date_ms(date_f) )
+
+    # the plots without a date slider show the whole series
+    for p in full_range_plots:
+        p.x_range.end = date_f
+
+    if STATS_CLIENT_SIDE:
+        stats_sums_source.data = make_sums_columns(data_stats_sums, stats_sums_names)
+        if 'section4' in section_layouts:
+            mortality_sums_source.data = make_sums_columns(data_mortality_sums[mortality_sums_rows], mortality_sums_names)
+
+    # the stats depend on the data even if the slider values did not change
+    update_stats(0, 0, 0)
+    if 'section4' in section_layouts:
+        update_mortality_stats(0, 0, 0)
 
 
 # after document load
@@ -297,6 +406,57 @@ def on_document_ready(evt):
     fake_slider.value = ( date_i, date_i )
     fake_slider.value = ( date_i, date_f )
 
+    # the first section is on the screen, now the others are built
+    if pending_sections:
+        document.add_next_tick_callback(build_next_section)
+
+
+# builds the first of the sections that are still placeholders, each on its own tick so that it reaches the browser before the next one
+def build_next_section():
+
+    if not pending_sections:
+        return
+
+    make_section = pending_sections.pop(0)
+
+    start   = time.perf_counter()
+    layouts = make_section()
+    print('built', ', '.join(layouts), 'in', round( (time.perf_counter() - start) * 1000 ), 'ms')
+
+    section_layouts.update(layouts)
+
+    # the widgets are created for the horizontal layout
+    if not current_horizontal:
+        adjust_widgets_to_layout(current_horizontal)
+
+    set_section_layouts(current_horizontal)
+
+    if pending_sections:
+        document.add_next_tick_callback(build_next_section)
+
+
+# the roots of the sections after the first keep their place in the page, their content follows the orientation
+def set_section_layouts( horizontal ):
+
+    for name, ( layout_h, layout_v ) in section_layouts.items():
+        section_roots[name].children = [ layout_h if horizontal else layout_v ]
+
+
+# adds the roots in the order of the template, each root is shown in the place of the template with the same index
+def add_roots( horizontal ):
+
+    curdoc().add_root(controls1)
+
+    if horizontal:
+        curdoc().add_root(layout1_h)
+    else:
+        curdoc().add_root(layout1_v)
+
+    for root in section_roots.values():
+        curdoc().add_root(root)
+
+    curdoc().add_root(layout7)
+
 
 # this callbacks takes action on the server side upon dimensions change
 def on_dimensions_change(attr, old, new):
@@ -323,29 +483,8 @@ def on_dimensions_change(attr, old, new):
         # adjust the widgets depending on the current orientation
         adjust_widgets_to_layout(horizontal)
 
-        curdoc().add_root(controls1)
-
-        if horizontal:
-            curdoc().add_root(layout1_h)
-        else:
-            curdoc().add_root(layout1_v)
-
-        curdoc().add_root(controls2)
-
-        if horizontal:
-            curdoc().add_root(layout2_h)
-            curdoc().add_root(layout3_h)
-            curdoc().add_root(layout4_h)
-            curdoc().add_root(layout5_h)
-            curdoc().add_root(layout6_h)
-            curdoc().add_root(layout7)
-        else:
-            curdoc().add_root(layout2_v)
-            curdoc().add_root(layout3_v)
-            curdoc().add_root(layout4_v)
-            curdoc().add_root(layout5_v)
-            curdoc().add_root(layout6_v)
-            curdoc().add_root(layout7)
+        set_section_layouts(horizontal)
+        add_roots(horizontal)
 
         # store the horizontalness state
         current_horizontal = horizontal
@@ -366,6 +505,211 @@ ds.change.emit();
 
 """)
 
+# the view only callbacks run in the browser, so dragging a slider needs no round trip to the server
+
+# for the data range: the x range follows the slider and the y range adapts to the values present in the date range
+# each limits source has the per day minimum and maximum of a plot source, see make_limits_source
+# the range index of each one is built on first use and again when the server replaces its data
+range_callback_code = """
+const day = 86400000;
+
+// minimum and maximum that ignore NaN, like np.fmin and np.fmax
+function fmin(a, b) { return isNaN(a) || b < a ? b : a; }
+function fmax(a, b) { return isNaN(a) || b > a ? b : a; }
+
+// a sparse table, level k holds the limits of the 2^k days that start at each day
+function get_index(limits) {
+    if (limits._index_data !== limits.data) {
+        const lows  = [ Array.from(limits.data['low'])  ];
+        const highs = [ Array.from(limits.data['high']) ];
+        for (let width = 1; 2 * width <= lows[0].length; width *= 2) {
+            const low  = lows[lows.length - 1];
+            const high = highs[highs.length - 1];
+            const next_low  = new Array(low.length - width);
+            const next_high = new Array(low.length - width);
+            for (let i = 0; i < next_low.length; i++) {
+                next_low[i]  = fmin(low[i],  low[i + width]);
+                next_high[i] = fmax(high[i], high[i + width]);
+            }
+            lows.push(next_low);
+            highs.push(next_high);
+        }
+        limits._index      = [ lows, highs ];
+        limits._index_data = limits.data;
+    }
+    return limits._index;
+}
+
+// the limits of the days start:end, from the two overlapping blocks that cover them
+function get_limits(index, start, end) {
+    const [ lows, highs ] = index;
+    start = Math.max(start, 0);
+    end   = Math.min(end, lows[0].length);
+    if (end <= start)
+        return [ NaN, NaN ];
+    const level = 31 - Math.clz32(end - start);
+    const last  = end - (1 << level);
+    return [ fmin(lows[level][start], lows[level][last]), fmax(highs[level][start], highs[level][last]) ];
+}
+
+const date_i = slider.value[0];
+const date_f = slider.value[1];
+
+if (date_i == date_f)
+    return;
+
+// all the sources start at the first date
+const idx_i = Math.floor((date_i - first) / day);
+const idx_f = Math.floor((date_f - first) / day);
+
+for (let j = 0; j < plots.length; j++) {
+    const p = plots[j];
+
+    // for some reason we need to pad the range to get an exact day match with the slider
+    p.x_range.start = date_i - day;
+
+    // this one is just for the line not to be attached to the limit of the plot
+    p.x_range.end   = date_f + 2 * day;
+
+    const [ y_min, y_max ] = get_limits(get_index(limits[j]), idx_i, idx_f);
+    if (isNaN(y_min) || isNaN(y_max)) {
+        console.log('not rescaling due to having received nan');
+        continue;
+    }
+
+    const range_delta = y_max * factor;
+    p.y_range.end   = y_max + range_delta;
+    p.y_range.start = y_min - range_delta;
+}
+"""
+
+# makes the legends appear / disappear as necessary
+# when move is set, toggling the visibility is not enough, because the legend,
+# if invisible but present, prevents hovering the lines, so it is moved away instead
+# and as even an invisible legend is clickable, lines could be muted / unmuted by accident,
+# so the click policy is also disabled
+legends_callback_code = """
+const day = 86400000;
+
+const idx1 = Math.floor((slider.value[0] - first) / day);
+const idx2 = Math.floor((slider.value[1] - first) / day);
+
+// the -7 is because we start 7 days later on the dates, due to the moving average :-)
+const visible = idx2 - idx1 >= source.get_length() - 7;
+
+for (const legend of legends) {
+    if (move) {
+        legend.location     = visible ? 'top_left' : [ 0, -1000 ];
+        legend.click_policy = visible ? 'mute' : 'none';
+    } else {
+        legend.visible = visible;
+    }
+}
+"""
+
+# for the overall mortality plot
+mortality_range_callback_code = """
+pre_box.right = slider.value[0];
+post_box.left = slider.value[1];
+"""
+
+# for the toggle button action
+clines_callback_code = """
+for (const line of lines)
+    line.visible = toggle.active;
+"""
+
+# the stats tables, when they are computed in the browser, see STATS_CLIENT_SIDE
+# these mirror update_stats and update_mortality_stats, including the python formatting and rounding,
+# so that the tables look the same whether they were last updated by the server or by the browser
+stats_functions_code = """
+const day = 86400000;
+
+// the day offsets of the slider dates, as in get_date_index
+const idx1 = Math.floor((slider.value[0] - first) / day);
+const idx2 = Math.floor((slider.value[1] - first) / day);
+
+// the sums of a group of the days idx1 to idx2, from its flat column, clipped as in get_range_sums
+function get_range_sum(name, group) {
+    const length = sums.get_length() / groups - 1;
+    const start  = Math.min(Math.max(idx1, 0), length);
+    const end    = Math.min(Math.max(idx2 + 1, start), length);
+    const column = sums.data[name];
+    return column[group * (length + 1) + end] - column[group * (length + 1) + start];
+}
+
+// rounds half to even, like python and numpy do
+function rint(x) {
+    const r = Math.round(x);
+    return r - x == 0.5 && r % 2 != 0 ? r - 1 : r;
+}
+
+function round1(x) {
+    return rint(x * 10) / 10;
+}
+
+// as in make_html_integer
+function make_html_integer(x) {
+    return String(x).replace(/\\B(?=(\\d{3})+(?!\\d))/g, '&nbsp;');
+}
+
+// as python converts a float to a string
+function make_float_str(x) {
+    if (isNaN(x))
+        return 'nan';
+    if (!isFinite(x))
+        return x > 0 ? 'inf' : '-inf';
+    return Number.isInteger(x) ? x.toFixed(1) : String(x);
+}
+"""
+
+stats_callback_code = stats_functions_code + """
+const sum_total_deaths_pre = Math.trunc(get_range_sum('total_deaths', 0));
+const sum_avg_deaths_pre   = rint(get_range_sum('avg_deaths', 0));
+
+const excess_deaths = sum_total_deaths_pre - sum_avg_deaths_pre;
+
+// the single row of the table is changed in place, there is nothing to send to the server
+const data = table.source.data;
+data['sum_new'][0]           = make_html_integer(Math.trunc(get_range_sum('new', 0)));
+data['sum_cv19_deaths'][0]   = make_html_integer(Math.trunc(get_range_sum('cv19_deaths', 0)));
+data['sum_total_deaths'][0]  = make_html_integer(sum_total_deaths_pre);
+data['sum_avg_deaths'][0]    = make_html_integer(sum_avg_deaths_pre);
+data['excess_deaths'][0]     = excess_deaths;
+data['excess_deaths_pct'][0] = round1((excess_deaths / sum_avg_deaths_pre) * 100);
+
+table.source.change.emit();
+"""
+
+mortality_stats_callback_code = stats_functions_code + """
+const data = table.source.data;
+
+for (let j = 0; j < groups; j++) {
+    const sum_total_deaths   = get_range_sum('total_deaths', j);
+    const sum_avg_deaths     = rint(get_range_sum('avg_deaths', j));
+    const sum_avg_deaths_sup = rint(get_range_sum('avg_deaths_sup', j));
+
+    // the inf and sup values are symmetrical, so using only one of them simplifies the notation
+    const sum_avg_deaths_sup_pct = round1(((sum_avg_deaths_sup - sum_avg_deaths) / sum_avg_deaths) * 100);
+
+    // the HTML cells do away with normal spaces
+    const str_tmp    = String(Math.trunc(sum_avg_deaths));
+    const str_spaces = '&nbsp;'.repeat(Math.max(6 - str_tmp.length, 0));
+
+    const excess_deaths = sum_total_deaths - sum_avg_deaths;
+
+    // to compensate for the minus sign
+    const str_pad = excess_deaths > 0 ? '&nbsp;' : '';
+
+    data['sum_total_deaths'][j]  = Math.trunc(sum_total_deaths);
+    data['sum_avg_deaths'][j]    = str_tmp + str_spaces + ' ± ' + make_float_str(sum_avg_deaths_sup_pct) + '%';
+    data['excess_deaths'][j]     = str_pad + String(Math.trunc(excess_deaths));
+    data['excess_deaths_pct'][j] = str_pad + make_float_str(round1((excess_deaths / sum_avg_deaths) * 100)) + '%';
+}
+
+table.source.change.emit();
+"""
+
 #### end of callbacks ####
 
 ### layouts ####
@@ -394,9 +738,32 @@ def make_layouts( ):
                       [ plot2, plot4 ] ],
                       plot_width=PLOT_WIDTH, plot_height=PLOT_HEIGHT, toolbar_location=None, sizing_mode='scale_width')
 
-    # second
+    layout1_h = layout( column(stats_table, grid_h), name='section1', sizing_mode='scale_width')
+    layout1_v = layout(column(stats_table, grid_v), name='section1', sizing_mode='scale_width')
+
+    # seventh
+
+    layout7 = layout(column(final_notes), name='section7', sizing_mode='scale_width')
+
+    return layout1_h, layout1_v, controls1, layout7
+
 
-    controls2 = row(date_slider2, name="section2_controls" )
+# the placeholder roots of the sections after the first, in the order of the template, see build_next_section
+# they have the names that the template embeds and the sizing of the layouts that they will hold
+def make_section_roots( ):
+
+    roots = { 'section2_controls': column(Spacer(width=10, height=10), name='section2_controls') }
+
+    for name, sizing_mode in [ ( 'section2', 'scale_width' ), ( 'section3', None ), ( 'section4', 'scale_width' ), ( 'section5', 'scale_width' ), ( 'section6', 'scale_width' ) ]:
+        roots[name] = column(Div(text=SECTION_LOADING_TEXT), name=name, sizing_mode=sizing_mode)
+
+    return roots
+
+
+# the layouts of each section after the first, by root, as ( horizontal, vertical )
+def make_section2_layouts( ):
+
+    controls2 = row(date_slider2)
 
     grid2_h = gridplot([
                        [plot9,  plot11],
@@ -410,7 +777,13 @@ def make_layouts( ):
                        [plot12] ],
                        plot_width=PLOT_WIDTH, plot_height=PLOT_HEIGHT2, toolbar_location=None, sizing_mode='scale_width')
 
-    # third
+    layout2_h = layout(grid2_h, sizing_mode='scale_width')
+    layout2_v = layout(grid2_v, sizing_mode='scale_width')
+
+    return { 'section2_controls': ( controls2, controls2 ), 'section2': ( layout2_h, layout2_v ) }
+
+
+def make_section3_layouts( ):
 
     notes = Div(text=TEXT_NOTES, width=TEXT_WIDTH)
 
@@ -418,24 +791,21 @@ def make_layouts( ):
 
     slider_spacer = Spacer(width=30, height=50, width_policy='auto', height_policy='fixed')
 
-    layout1_h = layout( column(stats_table, grid_h), name='section1', sizing_mode='scale_width')
-    layout2_h = layout(grid2_h, name='section2', sizing_mode='scale_width')
-
     column_section3_map    = column(plot_map)
     column_section3_others = column( [plot_incidence, row( [slider_spacer, date_slider_map] ), row( [ slider_spacer, notes] ) ] )
 
     row_section3 = row( column_section3_map , column_section3_others )
-    layout3_h = layout( row_section3, name='section3')
-
-    layout1_v = layout(column(stats_table, grid_v), name='section1', sizing_mode='scale_width')
-    layout2_v = layout(grid2_v, name='section2', sizing_mode='scale_width')
+    layout3_h = layout( row_section3 )
 
     # we don't need the notes text on the vertical layout
     column_section3_map = column( [plot_map, row( [slider_spacer, date_slider_map] ), plot_incidence ] )
 
-    layout3_v = layout( column_section3_map, name='section3')
+    layout3_v = layout( column_section3_map )
 
-    # fourth
+    return { 'section3': ( layout3_h, layout3_v ) }
+
+
+def make_section4_layouts( ):
 
     # adds left side spacing for handles lining up with the annotation box
     slider_spacer4 = Spacer(width=40, height=100, width_policy='auto', height_policy='fixed')
@@ -446,66 +816,68 @@ def make_layouts( ):
     in_between_spacer_v = Spacer(width=20, height=10, width_policy='auto', height_policy='fixed')
 
     # the mortality columns come from main
-    layout4_h = layout(row(   mortality_plots_column, in_between_spacer, mort_explorer_tabset2), name='section4', sizing_mode='scale_width')
-    layout4_v = layout(column(mortality_plots_column, mort_explorer_tabset2), name='section4', sizing_mode='scale_width')
+    layout4_h = layout(row(   mortality_plots_column, in_between_spacer, mort_explorer_tabset2), sizing_mode='scale_width')
+    layout4_v = layout(column(mortality_plots_column, mort_explorer_tabset2), sizing_mode='scale_width')
+
+    return { 'section4': ( layout4_h, layout4_v ) }
+
 
-    # fifth
+def make_section5_layouts( ):
 
     prev_spacer  = Spacer(width=20, height=5, width_policy='auto', height_policy='fixed')
     prev_spacer2 = Spacer(width=20, height=60, width_policy='auto', height_policy='fixed')
-    layout5_h = layout(row(plot_prevalence, prev_spacer, column(prev_spacer, prevalence_notes, prev_spacer2) ), name='section5', sizing_mode='scale_width')
+    layout5_h = layout(row(plot_prevalence, prev_spacer, column(prev_spacer, prevalence_notes, prev_spacer2) ), sizing_mode='scale_width')
 
-    layout5_v = layout(column(plot_prevalence), name='section5', sizing_mode='scale_width')
+    layout5_v = layout(column(plot_prevalence), sizing_mode='scale_width')
 
-    # sixth
+    return { 'section5': ( layout5_h, layout5_v ) }
+
+
+def make_section6_layouts( ):
 
     vacc_risk_spacer   = Spacer(width=20, height=5, width_policy='auto', height_policy='fixed')
     vacc_risk_spacer2  = Spacer(width=20, height=5, width_policy='auto', height_policy='fixed')
     vacc_risk_spacer_v = Spacer(width=20, height=70, width_policy='auto', height_policy='fixed')
 
-    layout6_h = layout(column(row(vacc_risk_cfr_tabset, vacc_risk_spacer, vacc_risk_chr_tabset, vacc_risk_spacer2, vacc_risk_notes), vacc_risk_spacer_v ), name='section6', sizing_mode='scale_width')
+    layout6_h = layout(column(row(vacc_risk_cfr_tabset, vacc_risk_spacer, vacc_risk_chr_tabset, vacc_risk_spacer2, vacc_risk_notes), vacc_risk_spacer_v ), sizing_mode='scale_width')
 
-    layout6_v = layout(column(vacc_risk_cfr_tabset, vacc_risk_spacer, vacc_risk_chr_tabset), name='section6', sizing_mode='scale_width')
+    layout6_v = layout(column(vacc_risk_cfr_tabset, vacc_risk_spacer, vacc_risk_chr_tabset), sizing_mode='scale_width')
 
-    # seventh
-
-    layout7 = layout(column(final_notes), name='section7', sizing_mode='scale_width')
-
-    return layout1_h, layout2_h, layout3_h, layout1_v, layout2_v, layout3_v, controls1, controls2, plot_incidence,\
-        layout4_h, layout4_v, layout5_h, layout5_v, layout6_h, layout6_v, layout7
+    return { 'section6': ( layout6_h, layout6_v ) }
 
 
+# the sizes of the titles, legends and map follow the orientation, for the sections that were built so far
 def adjust_widgets_to_layout( horizontal ):
 
-    plot_list   = [ plot1, plot1_map, plot2, plot3, plot4, plot5, plot6, plot7, plot8, plot9, plot10, plot11, plot12, plot_map ]
-    plot_list_l = [ plot3, plot7, plot9, plot10, plot11, plot12 ]  # these ones have legend
-
-    for p in plot_list:
+    for p in titled_plots:
         if horizontal:
             p.title.text_font_size = TITLE_SIZE_HORIZONTAL_LAYOUT
         else:
             p.title.text_font_size = TITLE_SIZE_VERTICAL_LAYOUT
 
-    for p in plot_list_l:
+    for p in legend_plots:
         if horizontal:
             p.legend.label_text_font_size = PLOT_LEGEND_FONT_SIZE
         else:
             p.legend.label_text_font_size = PLOT_LEGEND_FONT_SIZE_VERTICAL_LAYOUT
 
+    if 'section3' not in section_layouts:
+        return
+
     if horizontal:
         plot_map.plot_width   = MAP_WIDTH
         plot_map.plot_height  = MAP_HEIGHT
-        plot1_map.width       = PLOT_WIDTH
-        plot1_map.height      = PLOT_HEIGHT
+        plot_incidence.width  = PLOT_WIDTH
+        plot_incidence.height = PLOT_HEIGHT
         date_slider_map.width = PLOT_WIDTH - 40
     else:
         factor = 1.7
         factor2 = 1.91
         plot_map.plot_width   = int(MAP_WIDTH * factor)
         plot_map.plot_height  = int(MAP_HEIGHT * factor)
-        plot1_map.width       = int(plot1_map.plot_width * factor2)
-        plot1_map.height      = PLOT_HEIGHT
-        date_slider_map.width = plot1_map.width - 40
+        plot_incidence.width  = int(plot_incidence.plot_width * factor2)
+        plot_incidence.height = PLOT_HEIGHT
+        date_slider_map.width = plot_incidence.width - 40
 
 
 ### end of layouts ####
@@ -516,73 +888,12 @@ curdoc().title = PAGE_TITLE
 
 # fetch data from files
 
+# the map files are read in the background while the data for the regular plots is loaded
+map_patches_future   = submit_timed( 'county shapes',    get_counties_patches, MAP_RESOLUTION )
+map_incidence_future = submit_timed( 'county incidence', get_incidence_file )
+
 # data for regular plots
-data_dates, data_dates2, processed_data, raw_data = get_data()
-
-data_new               = processed_data[0]
-data_hosp              = processed_data[1]
-data_hosp_uci          = processed_data[2]
-data_cv19_deaths       = processed_data[3]
-data_incidence         = processed_data[4]
-data_cfr               = processed_data[5]
-data_rt                = processed_data[6]
-data_pos               = processed_data[7]
-data_total_deaths      = processed_data[8]
-data_avg_deaths        = processed_data[9]
-data_avg_deaths_inf    = processed_data[10]
-data_avg_deaths_sup    = processed_data[11]
-data_strat_new         = processed_data[12]
-data_strat_cv19_deaths = processed_data[13]
-data_strat_cfr         = processed_data[14]
-data_vacc_part         = processed_data[15]
-data_vacc_full         = processed_data[16]
-data_vacc_boost        = processed_data[17]
-data_strat_mort        = processed_data[18]
-data_min_prevalence    = processed_data[19]
-data_max_prevalence    = processed_data[20]
-data_avg_prevalence    = processed_data[21]
-data_vacc_cfr          = processed_data[22]
-data_vacc_chr          = processed_data[23]
-data_tests             = processed_data[24]
-
-raw_data_new          = raw_data[0]
-raw_data_cv19_deaths  = raw_data[1]
-raw_data_total_deaths = raw_data[2]
-raw_data_avg_deaths   = raw_data[3]
-
-data_exc_deaths       = np.array(data_total_deaths) - np.array(data_avg_deaths)
-raw_data_exc_deaths   = np.array(raw_data_total_deaths) - np.array(raw_data_avg_deaths)
-
-# IMPORTANT
-#
-# We use the raw data for the excess mortality calculations
-# but we are using the smoothed data for the correlation between
-# excess mortality and cv mortality because doing otherwise leads
-# to strange results such as week correlation between 26-09-2020 and 22-12-2020
-# where the correlation is more than obvious (return to school, pre vax)
-#
-# It might be that the CV19 reporting dates might not match the dates reported
-# by the eVM database, for the deaths events of the same people
-
-corr_data_exc_deaths  = data_exc_deaths
-corr_data_cv19_deaths = data_cv19_deaths
-
-# map data
-data_incidence_counties, map_date_i, map_date_f  = get_data_counties()
-
-# our original data has one line per county, and each line contains a set of polygons
-# for a performant map update on update_map we need to keep a converted version
-# this version has multiple lines with the same index for counties that hove multipolygons
-aux_df = convert_geoDataFrame_to_patches(data_incidence_counties, 'geometry')
-
-# the conversion transforms lines that have multiple polygons into multiple lines with the same index
-# index has repeated values because of that
-aux_index = aux_df.index
-
-# calculate the nr of days using the most reliable source
-
-days = len(data_new)
-days2 = len(data_dates2)
+set_data( get_cached_data() )
 
 plot_data_s1 = []
 plot_data_s2 = []
@@ -591,7 +902,7 @@ plot_data_s2 = []
 
 # one
 
-source_plot1 = make_data_source_dates(data_dates, data_tests)
+source_plot1 = make_data_source_dates(data_dates, data_tests, precision=PLOT_DATA_PRECISION['total_tests'])
 plot1 = make_plot('tests', PLOT1_TITLE, days, 'datetime')
 l11 = plot1.line('x', 'y', source=source_plot1, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
 set_plot_details(plot1, 'Date', 'Count', '@x{%F}', '@y{0.00}', 'vline', False, False)
@@ -601,7 +912,7 @@ plot_data_s1.append( (plot1, source_plot1) )
 
 # two
 
-source_plot2 = make_data_source_dates(data_dates, data_pos)
+source_plot2 = make_data_source_dates(data_dates, data_pos, precision=PLOT_DATA_PRECISION['positivity'])
 plot2 = make_plot('positivity', PLOT2_TITLE, days, 'datetime')
 l21 = plot2.line('x', 'y', source=source_plot2, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
 set_plot_details(plot2, 'Date', '%', '@x{%F}', '@y{0.00}', 'vline', False, False)
@@ -611,7 +922,7 @@ plot_data_s1.append( (plot2, source_plot2) )
 
 # three
 
-source_plot3 = ColumnDataSource(pd.DataFrame(data={ 'x': data_dates, 'y': data_hosp, 'y2': list(np.array(data_hosp_uci) * 5), 'y3': data_hosp_uci }, columns=['x', 'y', 'y2', 'y3']))
+source_plot3 = make_data_source_dates_columns(data_dates, PLOT_DATA_PRECISION['hosp'], y=data_hosp, y2=np.array(data_hosp_uci) * 5, y3=data_hosp_uci)
 
 plot3 = make_plot('hosp', PLOT3_TITLE, days, 'datetime')
 l31 = plot3.line('x', 'y',  source=source_plot3, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Total' )
@@ -627,7 +938,7 @@ plot_data_s1.append( (plot3, source_plot3) )
 
 # four
 
-source_plot4 = make_data_source_dates(data_dates, data_cfr)
+source_plot4 = make_data_source_dates(data_dates, data_cfr, precision=PLOT_DATA_PRECISION['cfr'])
 plot4 = make_plot('cfr', PLOT4_TITLE, days, 'datetime')
 plot4.line('x', 'y', source=source_plot4, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
 set_plot_details(plot4, 'Date', '%', '@x{%F}', '@y{0.00}', 'vline', False, False)
@@ -637,7 +948,7 @@ plot_data_s1.append( (plot4, source_plot4) )
 
 # five
 
-source_plot5 = make_data_source_dates(data_dates, data_new)
+source_plot5 = make_data_source_dates(data_dates, data_new, precision=PLOT_DATA_PRECISION['new'])
 plot5 = make_plot('new', PLOT5_TITLE, days, 'datetime')
 plot5.line('x', 'y', source=source_plot5, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
 set_plot_details(plot5, 'Date', 'Count', '@x{%F}', '@y{0}', 'vline', False, False)
@@ -647,7 +958,7 @@ plot_data_s1.append( (plot5, source_plot5) )
 
 # six
 
-source_plot6 = make_data_source_dates(data_dates, data_rt)
+source_plot6 = make_data_source_dates(data_dates, data_rt, precision=PLOT_DATA_PRECISION['rt'])
 plot6 = make_plot('rt', PLOT8_TITLE, days, 'datetime')
 plot6.line('x', 'y', source=source_plot6, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR,  )
 set_plot_details(plot6, 'Date', 'Value', '@x{%F}', '@y{0.00}', 'vline', False, False)
@@ -657,8 +968,7 @@ plot_data_s1.append( (plot6, source_plot6) )
 
 # seven
 
-df = pd.DataFrame(data={ 'x': data_dates, 'y': data_total_deaths, 'y2': data_avg_deaths, 'y3': data_avg_deaths_inf, 'y4': data_avg_deaths_sup }, columns=['x', 'y', 'y2', 'y3', 'y4'])
-source_plot7 = ColumnDataSource(df)
+source_plot7 = make_data_source_dates_columns(data_dates, PLOT_DATA_PRECISION['total_deaths'], y=data_total_deaths, y2=data_avg_deaths, y3=data_avg_deaths_inf, y4=data_avg_deaths_sup)
 
 plot7 = make_plot('total deaths', PLOT7_TITLE, days, 'datetime')
 l71 = plot7.line('x', 'y',  source=source_plot7, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Current' )
@@ -677,7 +987,7 @@ plot_data_s1.append( (plot7, source_plot7) )
 
 # eight
 
-source_plot8 = make_data_source_dates(data_dates, data_cv19_deaths)
+source_plot8 = make_data_source_dates(data_dates, data_cv19_deaths, precision=PLOT_DATA_PRECISION['cv19_deaths'])
 plot8 = make_plot('deaths', PLOT6_TITLE, days, 'datetime')
 plot8.line('x', 'y', source=source_plot8, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR,  )
 set_plot_details(plot8, 'Date', 'Count', '@x{%F}', '@y{0}', 'vline', False, False)
@@ -688,7 +998,6 @@ plot_data_s1.append( (plot8, source_plot8) )
 # Critical lines
 # default, primary, success, warning, danger, light
 clines_switch = Toggle(label=CLINES_LABEL, button_type='default', align='end', width=CLINES_SWITCH_WIDTH, height=CLINES_SWITCH_HEIGHT, name='section1_button')
-clines_switch.on_click(update_state)
 
 source_plot2_critical = make_data_source_dates(data_dates, np.full( days, POSITIVITY_LIMIT ))
 source_plot3_critical = make_data_source_dates(data_dates, np.full( days, UCI_LIMIT ))
@@ -703,6 +1012,8 @@ cline2.visible = False
 cline3.visible = False
 cline4.visible = False
 
+clines_switch.js_on_click( CustomJS( args=dict(toggle=clines_switch, lines=[ cline2, cline3, cline4 ]), code=clines_callback_code ) )
+
 # date range widget
 
 # for scale calculation we start later because of the moving average
@@ -711,10 +1022,19 @@ date_f = data_dates[days - 1]
 
 date_slider1 = DateRangeSlider(title="Date Range: ", start=date_i, end=date_f, value=( date_i, date_f ), step=1)
 
+# the per day limits of the plot sources, for the range callbacks in the browser
+limits_s1 = [ make_limits_source(d[1]) for d in plot_data_s1 ]
+
+range_callback1   = CustomJS( args=dict(slider=date_slider1, first=get_date_ms(data_dates[0]), plots=[ d[0] for d in plot_data_s1 ], limits=limits_s1, factor=PLOT_RANGE_FACTOR), code=range_callback_code )
+legends_callback1 = CustomJS( args=dict(slider=date_slider1, first=get_date_ms(data_dates[0]), source=source_plot1, legends=[ plot3.legend[0], plot7.legend[0] ], move=False), code=legends_callback_code )
+
 # we want the plots to change in real time but the stats only to be updated after the user stopped moving the mouse
-date_slider1.on_change('value', partial(update_plot_range, section="1"))
-date_slider1.on_change('value', partial(update_legends,    section="1"))
-date_slider1.on_change('value_throttled', partial(update_stats))
+date_slider1.js_on_change('value', range_callback1)
+date_slider1.js_on_change('value', legends_callback1)
+
+# new data also rescales the plots
+for limits in limits_s1:
+    limits.js_on_change('data', range_callback1)
 
 # the statistical summary
 
@@ -723,279 +1043,355 @@ stats_table = make_stats_table(STATS_WIDTH, STATS_HEIGHT, 'end')
 # the parameters are dummy as we take the values directly from the slider
 update_stats(0, 0, 0)
 
+# the names of the rows of the stats sums, see the stats_sums output of the data module
+stats_sums_names = [ 'new', 'cv19_deaths', 'total_deaths', 'avg_deaths' ]
+
+# the rows of the mortality sums that the table of the fourth page needs, and their names
+mortality_sums_rows  = [ 0, 1, 3 ]
+mortality_sums_names = [ 'total_deaths', 'avg_deaths', 'avg_deaths_sup' ]
+
+if STATS_CLIENT_SIDE:
+    # the table then follows the slider in the browser, the server only fills it for the first time and after new data
+    stats_sums_source = ColumnDataSource(data=make_sums_columns(data_stats_sums, stats_sums_names))
+    date_slider1.js_on_change('value', CustomJS( args=dict(slider=date_slider1, first=get_date_ms(data_dates[0]), sums=stats_sums_source, groups=1, table=stats_table), code=stats_callback_code ))
+else:
+    date_slider1.on_change('value_throttled', partial(on_slider_change, 'stats', update_stats))
+
 #### Second page ####
 
-nr_series = len(data_strat_new)
-labels = make_age_labels(nr_series, nr_series)
-palette = PLOT_LINE_COLOR_PALETTE
+# the pages after the first are built once it is shown, see build_next_section
+# their data is computed when first needed, so the first page does not wait for it
+def build_section2():
 
-# spacing the color as much as possible
-color_multiplier = math.floor(256 / nr_series + 1)
+    global source_plot9, source_plot10, source_plot11, source_plot12, plot9, plot10, plot11, plot12, date_slider2
 
-# nine
+    set_section_data('stratified')
+    set_section_data('vaccination')
 
-source_plot9 = make_data_source_multi_dates(data_dates2, data_strat_new)
-plot9 = make_plot('plot9', PLOT9_TITLE, days2, 'datetime')
+    nr_series = len(data_strat_new)
+    labels = make_age_labels(nr_series, nr_series)
+    palette = PLOT_LINE_COLOR_PALETTE
 
-lines = []
-for j in range(0, nr_series ):
-    lines.append( plot9.line('x', 'y' + str(j), source=source_plot9, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
+    # spacing the color as much as possible
+    color_multiplier = math.floor(256 / nr_series + 1)
 
-# we know by inspection that line representing 40-49 is on top
-set_plot_details_multi(plot9, 'Date', labels, '@x{%F}', 'vline', lines[4], False, False)
-set_plot_date_details(plot9, data_dates2, days2, source_plot9)
+    # nine
 
-plot_data_s2.append( (plot9, source_plot9) )
+    source_plot9 = make_data_source_multi_dates(data_dates2, data_strat_new, PLOT_DATA_PRECISION['strat_cv19_new'])
+    plot9 = make_plot('plot9', PLOT9_TITLE, days2, 'datetime')
 
-# ten
+    lines = []
+    for j in range(0, nr_series ):
+        lines.append( plot9.line('x', 'y' + str(j), source=source_plot9, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
 
-source_plot10 = make_data_source_multi_dates(data_dates2, data_strat_cv19_deaths)
-plot10 = make_plot('plot10', PLOT10_TITLE, days2, 'datetime')
+    # we know by inspection that line representing 40-49 is on top
+    set_plot_details_multi(plot9, 'Date', labels, '@x{%F}', 'vline', lines[4], False, False)
+    set_plot_date_details(plot9, data_dates2, days2, source_plot9)
 
-lines = []
-for j in range(0, nr_series ):
-    lines.append( plot10.line('x', 'y' + str(j), source=source_plot10, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
+    plot_data_s2.append( (plot9, source_plot9) )
 
-# the line for >= 80 is on top for this case
-set_plot_details_multi(plot10, 'Date', labels, '@x{%F}', 'vline', lines[nr_series - 1], False, False)
-set_plot_date_details(plot10, data_dates2, days2, source_plot10)
+    # ten
 
-plot_data_s2.append( (plot10, source_plot10) )
+    source_plot10 = make_data_source_multi_dates(data_dates2, data_strat_cv19_deaths, PLOT_DATA_PRECISION['strat_cv19_deaths'])
+    plot10 = make_plot('plot10', PLOT10_TITLE, days2, 'datetime')
 
-# eleven
+    lines = []
+    for j in range(0, nr_series ):
+        lines.append( plot10.line('x', 'y' + str(j), source=source_plot10, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
 
-# we append the average CFR line clipped to the number of available days
-data_strat_cfr.append(data_cfr[0:days2])
-cfr_nr_series = nr_series + 1
+    # the line for >= 80 is on top for this case
+    set_plot_details_multi(plot10, 'Date', labels, '@x{%F}', 'vline', lines[nr_series - 1], False, False)
+    set_plot_date_details(plot10, data_dates2, days2, source_plot10)
 
-source_plot11 = make_data_source_multi_dates(data_dates2, data_strat_cfr)
-plot11 = make_plot('plot11', PLOT11_TITLE, days2, 'datetime')
+    plot_data_s2.append( (plot10, source_plot10) )
 
-lines = []
-# adding the standard age stratified lines
-for j in range(0, nr_series ):
-    lines.append( plot11.line('x', 'y' + str(j), source=source_plot11, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
+    # eleven
 
-# adding the average CFR line to the plot
-lines.append( plot11.line('x', 'y' + str(j + 1), source=source_plot11, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label='Average' ) )
-cfr_tooltip = ('Average', '@' + 'y' + str(j + 1) + '{0.0}')
+    cfr_nr_series = nr_series + 1
 
-# the line for >= 80 is just under the average CFR line, which is on top
-set_plot_details_multi(plot11, 'Days', labels, '@x{%F}', 'vline', lines[cfr_nr_series - 2 ], True, False, cfr_tooltip)
-set_plot_date_details(plot11, data_dates2, days2, source_plot11)
+    source_plot11 = make_data_source_multi_dates(data_dates2, data_strat_cfr, PLOT_DATA_PRECISION['strat_cfr'])
+    plot11 = make_plot('plot11', PLOT11_TITLE, days2, 'datetime')
 
-plot_data_s2.append( (plot11, source_plot11) )
+    lines = []
+    # adding the standard age stratified lines
+    for j in range(0, nr_series ):
+        lines.append( plot11.line('x', 'y' + str(j), source=source_plot11, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=palette[color_multiplier * j], muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label=labels[j] ) )
 
-# twelve
+    # adding the average CFR line to the plot
+    lines.append( plot11.line('x', 'y' + str(j + 1), source=source_plot11, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, muted_alpha=PLOT_LINE_ALPHA_MUTED, legend_label='Average' ) )
+    cfr_tooltip = ('Average', '@' + 'y' + str(j + 1) + '{0.0}')
 
-df12 = pd.DataFrame(data={ 'x': data_dates2, 'y': data_vacc_part, 'y2': data_vacc_full, 'y3': data_vacc_boost }, columns=['x', 'y', 'y2', 'y3'])
-source_plot12 = ColumnDataSource(df12)
+    # the line for >= 80 is just under the average CFR line, which is on top
+    set_plot_details_multi(plot11, 'Days', labels, '@x{%F}', 'vline', lines[cfr_nr_series - 2 ], True, False, cfr_tooltip)
+    set_plot_date_details(plot11, data_dates2, days2, source_plot11)
 
-plot12 = make_plot('vaccination', PLOT12_TITLE, days, 'datetime')
-l121 = plot12.line('x', 'y',  source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Partial' )
-l122 = plot12.line('x', 'y2', source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_HIGHLIGHT, legend_label='Complete' )
-l122 = plot12.line('x', 'y3', source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, legend_label='Booster' )
-plot12.legend.location = 'top_left'
-set_plot_details(plot12, 'Date', 'Partial', '@x{%F}', '@y{0}', 'vline', False, False, 'Complete', "@y2{0}", l121, False, 'Booster', "@y3{0}")
+    plot_data_s2.append( (plot11, source_plot11) )
 
-set_plot_date_details(plot12, data_dates2, days2, source_plot12)
+    # twelve
 
-plot_data_s2.append( (plot12, source_plot12) )
+    source_plot12 = make_data_source_dates_columns(data_dates2, PLOT_DATA_PRECISION['vacc_part'], y=data_vacc_part, y2=data_vacc_full, y3=data_vacc_boost)
 
-# date range widget
+    plot12 = make_plot('vaccination', PLOT12_TITLE, days, 'datetime')
+    l121 = plot12.line('x', 'y',  source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Partial' )
+    l122 = plot12.line('x', 'y2', source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_HIGHLIGHT, legend_label='Complete' )
+    l122 = plot12.line('x', 'y3', source=source_plot12, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, legend_label='Booster' )
+    plot12.legend.location = 'top_left'
+    set_plot_details(plot12, 'Date', 'Partial', '@x{%F}', '@y{0}', 'vline', False, False, 'Complete', "@y2{0}", l121, False, 'Booster', "@y3{0}")
+
+    set_plot_date_details(plot12, data_dates2, days2, source_plot12)
+
+    plot_data_s2.append( (plot12, source_plot12) )
+
+    # date range widget
+
+    # we use the earlier end date for this
+    date2_f = data_dates2[-1]
+    #
+    date_slider2 = DateRangeSlider(title="Date Range: ", start=date_i, end=date2_f, value=( date_i, date2_f ), step=1)
 
-# we use the earlier end date for this
-date2_f = data_dates2[-1]
-#
-date_slider2 = DateRangeSlider(title="Date Range: ", start=date_i, end=date2_f, value=( date_i, date2_f ), step=1)
+    limits_s2.extend( make_limits_source(d[1]) for d in plot_data_s2 )
+
+    range_callback2   = CustomJS( args=dict(slider=date_slider2, first=get_date_ms(data_dates[0]), plots=[ d[0] for d in plot_data_s2 ], limits=limits_s2, factor=PLOT_RANGE_FACTOR), code=range_callback_code )
+    legends_callback2 = CustomJS( args=dict(slider=date_slider2, first=get_date_ms(data_dates[0]), source=source_plot10, legends=[ plot10.legend[0], plot11.legend[0] ], move=True), code=legends_callback_code )
+
+    date_slider2.js_on_change('value', range_callback2)
+    date_slider2.js_on_change('value', legends_callback2)
+
+    for limits in limits_s2:
+        limits.js_on_change('data', range_callback2)
+
+    titled_plots.extend([ plot9, plot10, plot11, plot12 ])
+    legend_plots.extend([ plot9, plot10, plot11, plot12 ])
+
+    return make_section2_layouts()
 
-date_slider2.on_change('value', partial(update_plot_range, section="2"))
-date_slider2.on_change('value', partial(update_legends,    section="2"))
 
 #### Third page ####
 
-# pandas option, necessary for bokeh plots from pandas
-pd.set_option('plotting.backend', 'pandas_bokeh')
+def build_section3():
+
+    global data_counties_patches, data_incidence_counties, map_date_i, map_date_f, map_incidence_dates, map_incidence_matrix
+    global plot_map, plot_map_s1, source_plot_incidence, plot_incidence, date_slider_map
+
+    # our original data has one line per county, and each line contains a set of polygons
+    # the patches have multiple lines with the same index for counties that have multipolygons
+    # they come already projected and simplified from a persistent cache
+    data_counties_patches = map_patches_future.result()
+
+    # the incidence file is cached by now, get_data_counties and get_incidence_matrix build on it
+    map_incidence_future.result()
+
+    data_incidence_counties, map_date_i, map_date_f  = get_data_counties( data_counties_patches )
+
+    # a dates x patches matrix, for fast map updates
+    map_incidence_dates, map_incidence_matrix = get_incidence_matrix( data_counties_patches )
+
+    plot_map, plot_map_s1 = make_map_plot( data_incidence_counties )
+
+    source_plot_incidence = make_data_source_dates(data_dates, data_incidence, precision=PLOT_DATA_PRECISION['incidence'])
+    plot_incidence = make_plot('incidence', PLOT_INCIDENCE_TITLE, days, 'datetime')
+    l_incidence = plot_incidence.line('x', 'y', source=source_plot_incidence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
+    set_plot_details(plot_incidence, 'Date', 'Count', '@x{%F}', '@y{0.00}', 'vline', False, False)
+    set_plot_date_details(plot_incidence, data_dates, days, source_plot_incidence)
+
+    # here the date range is shorter because the data delivery was interrupted earlier
+    plot_incidence.x_range.start = pd.to_datetime(map_date_i)
+    plot_incidence.x_range.end   = pd.to_datetime(map_date_f)
 
-plot_map, plot_map_s1 = make_map_plot( data_incidence_counties )
+    # the step parameter is in miliseconds
+    step_days = 7
+    date_slider_map = DateSlider(title='Selected date', start=map_date_i, end=map_date_f, value=map_date_f, step=step_days * 1000 * 60 * 60 * 24, width_policy='fixed', width=PLOT_WIDTH - 40 )
 
-source_plot_incidence = make_data_source_dates(data_dates, data_incidence)
-plot_incidence = make_plot('incidence', PLOT_INCIDENCE_TITLE, days, 'datetime')
-l_incidence = plot_incidence.line('x', 'y', source=source_plot_incidence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, )
-set_plot_details(plot_incidence, 'Date', 'Count', '@x{%F}', '@y{0.00}', 'vline', False, False)
-set_plot_date_details(plot_incidence, data_dates, days, source_plot_incidence)
+    date_slider_map.on_change('value_throttled', partial(on_slider_change, 'map', update_map))
 
-# here the date range is shorter because the data delivery was interrupted earlier
-plot_incidence.x_range.start = pd.to_datetime(map_date_i)
-plot_incidence.x_range.end   = pd.to_datetime(map_date_f)
+    titled_plots.extend([ plot_incidence, plot_map ])
 
-# the step parameter is in miliseconds
-step_days = 7
-date_slider_map = DateSlider(title='Selected date', start=map_date_i, end=map_date_f, value=map_date_f, step=step_days * 1000 * 60 * 60 * 24, width_policy='fixed', width=PLOT_WIDTH - 40 )
+    return make_section3_layouts()
 
-date_slider_map.on_change('value_throttled', partial(update_map))
 
 #### Fourth page ####
 
-# the first one is raw, the second is smoothed
-total_deaths_strat     = data_strat_mort[0]
-s_total_deaths_strat   = data_strat_mort[1]
+def build_section4():
 
-# the rigorous versions are used for the calculations
-avg_deaths_strat       = data_strat_mort[2]
-avg_deaths_strat_inf   = data_strat_mort[3]
-avg_deaths_strat_sup   = data_strat_mort[4]
+    global p4_plots, p4_sources, date_slider4, mortality_stats_table, mortality_notes, source_plot_correlation, correlation_filter
+    global regression_line, regression_label, mort_explorer_tabset, mort_explorer_tabset2, mortality_sums_source
 
-# we obtain the smooth versions for the plot
-s_avg_deaths_strat       = data_strat_mort[5]
-s_avg_deaths_strat_inf   = data_strat_mort[6]
-s_avg_deaths_strat_sup   = data_strat_mort[7]
+    set_section_data('mortality')
 
-# we are smoothing the average historic mortality on the plot, but not the yellow bands as it does not seem visually necessary
-p4_plot1  = make_mortality_plot( data_dates, s_total_deaths_strat[0],  s_avg_deaths_strat[0],  avg_deaths_strat_inf[0],  avg_deaths_strat_sup[0],  days, '<1'        )
-p4_plot2  = make_mortality_plot( data_dates, s_total_deaths_strat[1],  s_avg_deaths_strat[1],  avg_deaths_strat_inf[1],  avg_deaths_strat_sup[1],  days, '1-4'       )
-p4_plot3  = make_mortality_plot( data_dates, s_total_deaths_strat[2],  s_avg_deaths_strat[2],  avg_deaths_strat_inf[2],  avg_deaths_strat_sup[2],  days, '5-14'      )
-p4_plot4  = make_mortality_plot( data_dates, s_total_deaths_strat[3],  s_avg_deaths_strat[3],  avg_deaths_strat_inf[3],  avg_deaths_strat_sup[3],  days, '15-24'     )
-p4_plot5  = make_mortality_plot( data_dates, s_total_deaths_strat[4],  s_avg_deaths_strat[4],  avg_deaths_strat_inf[4],  avg_deaths_strat_sup[4],  days, '25-34'     )
-p4_plot6  = make_mortality_plot( data_dates, s_total_deaths_strat[5],  s_avg_deaths_strat[5],  avg_deaths_strat_inf[5],  avg_deaths_strat_sup[5],  days, '35-44'     )
-p4_plot7  = make_mortality_plot( data_dates, s_total_deaths_strat[6],  s_avg_deaths_strat[6],  avg_deaths_strat_inf[6],  avg_deaths_strat_sup[6],  days, '45-54'     )
-p4_plot8  = make_mortality_plot( data_dates, s_total_deaths_strat[7],  s_avg_deaths_strat[7],  avg_deaths_strat_inf[7],  avg_deaths_strat_sup[7],  days, '55-64'     )
-p4_plot9  = make_mortality_plot( data_dates, s_total_deaths_strat[8],  s_avg_deaths_strat[8],  avg_deaths_strat_inf[8],  avg_deaths_strat_sup[8],  days, '65-74'     )
-p4_plot10 = make_mortality_plot( data_dates, s_total_deaths_strat[9],  s_avg_deaths_strat[9],  avg_deaths_strat_inf[9],  avg_deaths_strat_sup[9],  days, '75-84'     )
-p4_plot11 = make_mortality_plot( data_dates, s_total_deaths_strat[10], s_avg_deaths_strat[10], avg_deaths_strat_inf[10], avg_deaths_strat_sup[10], days, '>85'       )
-p4_plot12 = make_mortality_plot( data_dates, s_total_deaths_strat[11], s_avg_deaths_strat[11], avg_deaths_strat_inf[11], avg_deaths_strat_sup[11], days, 'all ages'  )
+    # we are smoothing the average historic mortality on the plot, but not the yellow bands as it does not seem visually necessary
+    p4_plot1  = make_mortality_plot( data_dates, s_total_deaths_strat[0],  s_avg_deaths_strat[0],  avg_deaths_strat_inf[0],  avg_deaths_strat_sup[0],  days, '<1'        )
+    p4_plot2  = make_mortality_plot( data_dates, s_total_deaths_strat[1],  s_avg_deaths_strat[1],  avg_deaths_strat_inf[1],  avg_deaths_strat_sup[1],  days, '1-4'       )
+    p4_plot3  = make_mortality_plot( data_dates, s_total_deaths_strat[2],  s_avg_deaths_strat[2],  avg_deaths_strat_inf[2],  avg_deaths_strat_sup[2],  days, '5-14'      )
+    p4_plot4  = make_mortality_plot( data_dates, s_total_deaths_strat[3],  s_avg_deaths_strat[3],  avg_deaths_strat_inf[3],  avg_deaths_strat_sup[3],  days, '15-24'     )
+    p4_plot5  = make_mortality_plot( data_dates, s_total_deaths_strat[4],  s_avg_deaths_strat[4],  avg_deaths_strat_inf[4],  avg_deaths_strat_sup[4],  days, '25-34'     )
+    p4_plot6  = make_mortality_plot( data_dates, s_total_deaths_strat[5],  s_avg_deaths_strat[5],  avg_deaths_strat_inf[5],  avg_deaths_strat_sup[5],  days, '35-44'     )
+    p4_plot7  = make_mortality_plot( data_dates, s_total_deaths_strat[6],  s_avg_deaths_strat[6],  avg_deaths_strat_inf[6],  avg_deaths_strat_sup[6],  days, '45-54'     )
+    p4_plot8  = make_mortality_plot( data_dates, s_total_deaths_strat[7],  s_avg_deaths_strat[7],  avg_deaths_strat_inf[7],  avg_deaths_strat_sup[7],  days, '55-64'     )
+    p4_plot9  = make_mortality_plot( data_dates, s_total_deaths_strat[8],  s_avg_deaths_strat[8],  avg_deaths_strat_inf[8],  avg_deaths_strat_sup[8],  days, '65-74'     )
+    p4_plot10 = make_mortality_plot( data_dates, s_total_deaths_strat[9],  s_avg_deaths_strat[9],  avg_deaths_strat_inf[9],  avg_deaths_strat_sup[9],  days, '75-84'     )
+    p4_plot11 = make_mortality_plot( data_dates, s_total_deaths_strat[10], s_avg_deaths_strat[10], avg_deaths_strat_inf[10], avg_deaths_strat_sup[10], days, '>85'       )
+    p4_plot12 = make_mortality_plot( data_dates, s_total_deaths_strat[11], s_avg_deaths_strat[11], avg_deaths_strat_inf[11], avg_deaths_strat_sup[11], days, 'all ages'  )
 
-# for this special tab the overal deaths are the same, but the references (avg, inf and sup) have been corrected
-p4_plot13 = make_mortality_plot( data_dates, s_total_deaths_strat[12], s_avg_deaths_strat[12], avg_deaths_strat_inf[12], avg_deaths_strat_sup[12], days, 'all ages *')
+    # for this special tab the overal deaths are the same, but the references (avg, inf and sup) have been corrected
+    p4_plot13 = make_mortality_plot( data_dates, s_total_deaths_strat[12], s_avg_deaths_strat[12], avg_deaths_strat_inf[12], avg_deaths_strat_sup[12], days, 'all ages *')
 
-p4_plots = [ p4_plot1, p4_plot2, p4_plot3, p4_plot4, p4_plot5, p4_plot6, p4_plot7, p4_plot8, p4_plot9, p4_plot10, p4_plot11, p4_plot12, p4_plot13 ]
+    p4_plots = [ p4_plot1, p4_plot2, p4_plot3, p4_plot4, p4_plot5, p4_plot6, p4_plot7, p4_plot8, p4_plot9, p4_plot10, p4_plot11, p4_plot12, p4_plot13 ]
 
-tab1  = Panel(child=p4_plot1,  title='<1'         )
-tab2  = Panel(child=p4_plot2,  title='1-4'        )
-tab3  = Panel(child=p4_plot3,  title='5-14'       )
-tab4  = Panel(child=p4_plot4,  title='15-24'      )
-tab5  = Panel(child=p4_plot5,  title='25-34'      )
-tab6  = Panel(child=p4_plot6,  title='35-44'      )
-tab7  = Panel(child=p4_plot7,  title='45-54'      )
-tab8  = Panel(child=p4_plot8,  title='55-64'      )
-tab9  = Panel(child=p4_plot9,  title='65-74'      )
-tab10 = Panel(child=p4_plot10, title='75-84'      )
-tab11 = Panel(child=p4_plot11, title='>85'        )
-tab12 = Panel(child=p4_plot12, title='all ages'   )
-tab13 = Panel(child=p4_plot13, title='all ages *' )
+    # the sources of the mortality plots, for the data updates
+    p4_sources = [ p.renderers[0].data_source for p in p4_plots ]
 
-mort_explorer_tabset = Tabs(tabs=[ tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12, tab13 ])
+    tab1  = Panel(child=p4_plot1,  title='<1'         )
+    tab2  = Panel(child=p4_plot2,  title='1-4'        )
+    tab3  = Panel(child=p4_plot3,  title='5-14'       )
+    tab4  = Panel(child=p4_plot4,  title='15-24'      )
+    tab5  = Panel(child=p4_plot5,  title='25-34'      )
+    tab6  = Panel(child=p4_plot6,  title='35-44'      )
+    tab7  = Panel(child=p4_plot7,  title='45-54'      )
+    tab8  = Panel(child=p4_plot8,  title='55-64'      )
+    tab9  = Panel(child=p4_plot9,  title='65-74'      )
+    tab10 = Panel(child=p4_plot10, title='75-84'      )
+    tab11 = Panel(child=p4_plot11, title='>85'        )
+    tab12 = Panel(child=p4_plot12, title='all ages'   )
+    tab13 = Panel(child=p4_plot13, title='all ages *' )
 
-# make sure the tab for all ages is selected
-mort_explorer_tabset.active = 12
+    mort_explorer_tabset = Tabs(tabs=[ tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12, tab13 ])
 
-date_slider4 = DateRangeSlider(title="Date Range: ", start=date_i, end=date_f, value=( date_i, date_f ), step=1, width=PLOT_WIDTH4 - 50)
+    # make sure the tab for all ages is selected
+    mort_explorer_tabset.active = 12
 
-date_slider4.on_change('value', partial(update_mortality_plot_range))
-date_slider4.on_change('value_throttled', partial(update_mortality_stats))
+    date_slider4 = DateRangeSlider(title="Date Range: ", start=date_i, end=date_f, value=( date_i, date_f ), step=1, width=PLOT_WIDTH4 - 50)
 
-# annotations to visually mask the non-affected date range
-# in the initial moment they are invisible because the left and right parameters are the same
-pre_box  = BoxAnnotation(left=date_i, right=date_i, fill_alpha=PLOT_AREAS_ALPHA4, fill_color=PLOT_AREAS_COLOR4)
-post_box = BoxAnnotation(left=date_f, right=date_f, fill_alpha=PLOT_AREAS_ALPHA4, fill_color=PLOT_AREAS_COLOR4)
 
-for p in p4_plots:
-    p.add_layout(pre_box)
-    p.add_layout(post_box)
+    # annotations to visually mask the non-affected date range
+    # in the initial moment they are invisible because the left and right parameters are the same
+    pre_box  = BoxAnnotation(left=date_i, right=date_i, fill_alpha=PLOT_AREAS_ALPHA4, fill_color=PLOT_AREAS_COLOR4)
+    post_box = BoxAnnotation(left=date_f, right=date_f, fill_alpha=PLOT_AREAS_ALPHA4, fill_color=PLOT_AREAS_COLOR4)
 
-# the statistics table
-mortality_stats_table = make_mortality_stats_table(MORT_STATS_TABLE_WIDTH, MORT_STATS_TABLE_HEIGHT, 'end')
+    for p in p4_plots:
+        p.add_layout(pre_box)
+        p.add_layout(post_box)
 
-# and its caption
-mortality_notes  = Div(text='dummy', width=MORT_TEXT_WIDTH, align='center')
+    date_slider4.js_on_change('value', CustomJS( args=dict(slider=date_slider4, pre_box=pre_box, post_box=post_box), code=mortality_range_callback_code ))
 
-# plus the note for the special row
-mortality_notes2 = Div(text='</br>* contains a correction for population aging that converts deaths from 2015-2019 into equivalent current year deaths', align='start')
+    # the statistics table
+    mortality_stats_table = make_mortality_stats_table(MORT_STATS_TABLE_WIDTH, MORT_STATS_TABLE_HEIGHT, 'end')
 
-# forces vertical alignement on the table stats column
-table_spacer4_top  = Spacer(width=40, height=10, width_policy='auto', height_policy='fixed')
+    # and its caption
+    mortality_notes  = Div(text='dummy', width=MORT_TEXT_WIDTH, align='center')
 
-mortality_stats_column = column(table_spacer4_top, mortality_stats_table, mortality_notes, mortality_notes2)
+    # plus the note for the special row
+    mortality_notes2 = Div(text='</br>* contains a correction for population aging that converts deaths from 2015-2019 into equivalent current year deaths', align='start')
 
-# now let's create the correlation plot
+    # forces vertical alignement on the table stats column
+    table_spacer4_top  = Spacer(width=40, height=10, width_policy='auto', height_policy='fixed')
 
-# fix the data in case it has leading NaNs due to moving averages
-# we assume the leading NaNs are the same for x and y, when they exist
+    mortality_stats_column = column(table_spacer4_top, mortality_stats_table, mortality_notes, mortality_notes2)
 
-clean_data_cv19_deaths = get_clean_data(corr_data_cv19_deaths)
-clean_data_exc_deaths  = get_clean_data(corr_data_exc_deaths)
+    # now let's create the correlation plot
 
-# height and width are the same because we want it to be square for easier reading
-corr_width = MORT_STATS_TABLE_WIDTH
+    # height and width are the same because we want it to be square for easier reading
+    corr_width = MORT_STATS_TABLE_WIDTH
 
-plot_correlation, source_plot_correlation, correlation_coefficient, regression_line, regression_label = make_correlation_plot( clean_data_cv19_deaths, clean_data_exc_deaths, 'Covid deaths', 'Excess deaths', corr_width, corr_width)
+    plot_correlation, source_plot_correlation, correlation_filter, correlation_coefficient, regression_line, regression_label = make_correlation_plot( corr_data_cv19_deaths, corr_data_exc_deaths, data_correlation_sums, 'Covid deaths', 'Excess deaths', corr_width, corr_width)
 
-table_spacer4_top2   = Spacer(width=40, height=1, width_policy='auto', height_policy='fixed')
-table_spacer4_bottom = Spacer(width=40, height=5, width_policy='auto', height_policy='fixed')
-mortality_correlation_column = column(table_spacer4_top2, plot_correlation, table_spacer4_bottom, mortality_notes)
+    table_spacer4_top2   = Spacer(width=40, height=1, width_policy='auto', height_policy='fixed')
+    table_spacer4_bottom = Spacer(width=40, height=5, width_policy='auto', height_policy='fixed')
+    mortality_correlation_column = column(table_spacer4_top2, plot_correlation, table_spacer4_bottom, mortality_notes)
 
-# and a tabset for the table + plot
+    # and a tabset for the table + plot
 
-tab2_1 = Panel(child=mortality_stats_column,       title='Stats'       )
-tab2_2 = Panel(child=mortality_correlation_column, title='Correlation' )
+    tab2_1 = Panel(child=mortality_stats_column,       title='Stats'       )
+    tab2_2 = Panel(child=mortality_correlation_column, title='Correlation' )
 
-mort_explorer_tabset2 = Tabs(tabs=[ tab2_1, tab2_2 ])
+    mort_explorer_tabset2 = Tabs(tabs=[ tab2_1, tab2_2 ])
 
-# with the table selected by default
+    # with the table selected by default
 
-mort_explorer_tabset2.active = 0
+    mort_explorer_tabset2.active = 0
+
+    # the parameters are dummy as we take the values directly from the slider
+    update_mortality_stats(0, 0, 0)
+
+    if STATS_CLIENT_SIDE:
+        # the correlation plot is still fitted by the server
+        mortality_sums_source = ColumnDataSource(data=make_sums_columns(data_mortality_sums[mortality_sums_rows], mortality_sums_names))
+        date_slider4.js_on_change('value', CustomJS( args=dict(slider=date_slider4, first=get_date_ms(data_dates[0]), sums=mortality_sums_source, groups=np.shape(data_mortality_sums)[1], table=mortality_stats_table), code=mortality_stats_callback_code ))
+        date_slider4.on_change('value_throttled', partial(on_slider_change, 'mortality', update_mortality_correlation))
+    else:
+        date_slider4.on_change('value_throttled', partial(on_slider_change, 'mortality', update_mortality_stats))
+
+    date_sliders.append(date_slider4)
+    full_range_plots.extend(p4_plots)
+
+    return make_section4_layouts()
 
-# the parameters are dummy as we take the values directly from the slider
-update_mortality_stats(0, 0, 0)
 
 #### Fifth page ####
 
-source_plot_prevalence = ColumnDataSource(pd.DataFrame(data={ 'x': data_dates, 'y': data_max_prevalence, 'y2': data_avg_prevalence, 'y3': data_min_prevalence,  }, columns=['x', 'y', 'y2', 'y3' ]))
+def build_section5():
+
+    global source_plot_prevalence, plot_prevalence, prevalence_notes
 
-plot_prevalence = make_plot('prevalance', PLOT_PREVALENCE_TITLE, days, 'datetime', PLOT_HEIGHT5, PLOT_WIDTH5)
-l_prev1 = plot_prevalence.line('x', 'y',  source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, legend_label='Max prevalence' )
-l_prev2 = plot_prevalence.line('x', 'y2', source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=0.9, line_color=PLOT_LINE_COLOR, legend_label='Avg prevalence' )
-l_prev3 = plot_prevalence.line('x', 'y3', source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Min prevalence' )
+    set_section_data('prevalence')
 
-plot_prevalence.legend.location = 'top_left'
-set_plot_details(plot_prevalence, 'Date', 'Max %', '@x{%F}', '@y{0.00}', 'vline', False, False, 'Avg %', "@y2{0.00}", l_prev1, True, 'Min %', "@y3{0.00}")
-set_plot_date_details(plot_prevalence, data_dates, days, source_plot_prevalence)
+    source_plot_prevalence = make_data_source_dates_columns(data_dates, PLOT_DATA_PRECISION['avg_prevalence'], y=data_max_prevalence, y2=data_avg_prevalence, y3=data_min_prevalence)
 
-plot_prevalence.legend.label_text_font_size = PLOT_LEGEND_FONT_SIZE
+    plot_prevalence = make_plot('prevalance', PLOT_PREVALENCE_TITLE, days, 'datetime', PLOT_HEIGHT5, PLOT_WIDTH5)
+    l_prev1 = plot_prevalence.line('x', 'y',  source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR_REFERENCE, legend_label='Max prevalence' )
+    l_prev2 = plot_prevalence.line('x', 'y2', source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=0.9, line_color=PLOT_LINE_COLOR, legend_label='Avg prevalence' )
+    l_prev3 = plot_prevalence.line('x', 'y3', source=source_plot_prevalence, line_width=PLOT_LINE_WIDTH, line_alpha=PLOT_LINE_ALPHA, line_color=PLOT_LINE_COLOR, legend_label='Min prevalence' )
+
+    plot_prevalence.legend.location = 'top_left'
+    set_plot_details(plot_prevalence, 'Date', 'Max %', '@x{%F}', '@y{0.00}', 'vline', False, False, 'Avg %', "@y2{0.00}", l_prev1, True, 'Min %', "@y3{0.00}")
+    set_plot_date_details(plot_prevalence, data_dates, days, source_plot_prevalence)
+
+    plot_prevalence.legend.label_text_font_size = PLOT_LEGEND_FONT_SIZE
+
+    prevalence_notes = Div(text=PREV_TEXT, width=PREV_TEXT_WIDTH, align='start')
+
+    full_range_plots.append(plot_prevalence)
+
+    return make_section5_layouts()
 
-prevalence_notes = Div(text=PREV_TEXT, width=PREV_TEXT_WIDTH, align='start')
 
 #### Sixth page ####
 
-# one plot with CFR and CHR per age group
+def build_section6():
+
+    global vacc_risk_cfr_tabset, vacc_risk_chr_tabset, vacc_risk_notes
 
-p6_plot_cfr_50_59   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '50_59')
-p6_plot_cfr_60_69   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '60_69')
-p6_plot_cfr_70_79   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '70_79')
-p6_plot_cfr_80_plus = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '80mais')
+    # one plot with CFR and CHR per age group
 
-tab6_cfr_1 = Panel(child=p6_plot_cfr_50_59,   title='50-59')
-tab6_cfr_2 = Panel(child=p6_plot_cfr_60_69,   title='60-69')
-tab6_cfr_3 = Panel(child=p6_plot_cfr_70_79,   title='70-79')
-tab6_cfr_4 = Panel(child=p6_plot_cfr_80_plus, title='>80')
+    p6_plot_cfr_50_59   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '50_59')
+    p6_plot_cfr_60_69   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '60_69')
+    p6_plot_cfr_70_79   = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '70_79')
+    p6_plot_cfr_80_plus = make_vacc_risk_plot(data_vacc_cfr, VACC_CFR_TITLE, '80mais')
 
-p6_plot_chr_50_59   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '50_59')
-p6_plot_chr_60_69   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '60_69')
-p6_plot_chr_70_79   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '70_79')
-p6_plot_chr_80_plus = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '80mais')
+    tab6_cfr_1 = Panel(child=p6_plot_cfr_50_59,   title='50-59')
+    tab6_cfr_2 = Panel(child=p6_plot_cfr_60_69,   title='60-69')
+    tab6_cfr_3 = Panel(child=p6_plot_cfr_70_79,   title='70-79')
+    tab6_cfr_4 = Panel(child=p6_plot_cfr_80_plus, title='>80')
 
-tab6_chr_1 = Panel(child=p6_plot_chr_50_59,   title='50-59')
-tab6_chr_2 = Panel(child=p6_plot_chr_60_69,   title='60-69')
-tab6_chr_3 = Panel(child=p6_plot_chr_70_79,   title='70-79')
-tab6_chr_4 = Panel(child=p6_plot_chr_80_plus, title='>80')
+    p6_plot_chr_50_59   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '50_59')
+    p6_plot_chr_60_69   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '60_69')
+    p6_plot_chr_70_79   = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '70_79')
+    p6_plot_chr_80_plus = make_vacc_risk_plot(data_vacc_chr, VACC_CHR_TITLE, '80mais')
 
-vacc_risk_cfr_tabset = Tabs(tabs=[ tab6_cfr_1, tab6_cfr_2, tab6_cfr_3, tab6_cfr_4 ])
-vacc_risk_chr_tabset = Tabs(tabs=[ tab6_chr_1, tab6_chr_2, tab6_chr_3, tab6_chr_4 ])
+    tab6_chr_1 = Panel(child=p6_plot_chr_50_59,   title='50-59')
+    tab6_chr_2 = Panel(child=p6_plot_chr_60_69,   title='60-69')
+    tab6_chr_3 = Panel(child=p6_plot_chr_70_79,   title='70-79')
+    tab6_chr_4 = Panel(child=p6_plot_chr_80_plus, title='>80')
 
-vacc_risk_cfr_tabset.active = 3
-vacc_risk_chr_tabset.active = 3
+    vacc_risk_cfr_tabset = Tabs(tabs=[ tab6_cfr_1, tab6_cfr_2, tab6_cfr_3, tab6_cfr_4 ])
+    vacc_risk_chr_tabset = Tabs(tabs=[ tab6_chr_1, tab6_chr_2, tab6_chr_3, tab6_chr_4 ])
+
+    vacc_risk_cfr_tabset.active = 3
+    vacc_risk_chr_tabset.active = 3
+
+    vacc_risk_notes = Div(text=VACC_RISK_TEXT, width=VACC_RISK_TEXT_WIDTH, align='start')
+
+    return make_section6_layouts()
 
-vacc_risk_notes = Div(text=VACC_RISK_TEXT, width=VACC_RISK_TEXT_WIDTH, align='start')
 
 #### Seventh page ####
 
@@ -1011,37 +1407,39 @@ curdoc().on_event(DocumentReady, on_document_ready)
 fake_slider = DateRangeSlider(title="Fake Range: ", start=date_i, end=date_f, value=( date_i, date_f ), step=1)
 fake_slider.js_on_change('value', dimensions_callback)
 
+# the plots and sliders that follow the orientation and the data, the later sections add theirs when they are built
+titled_plots     = [ plot1, plot2, plot3, plot4, plot5, plot6, plot7, plot8 ]
+legend_plots     = [ plot3, plot7 ]
+date_sliders     = [ date_slider1, fake_slider ]
+full_range_plots = []
+
+# the per day limits of the plot sources of the second page
+limits_s2 = []
+
+# the sections built so far, by root, as ( horizontal, vertical ) layouts
+section_layouts = {}
+
+# the sections that are still placeholders, built in this order once the first one is shown
+pending_sections = [ build_section2, build_section3, build_section4, build_section5, build_section6 ]
+
 # register callback to be called upon JS callback executions
 window_size_data_source.on_change('data', on_dimensions_change)
 
 # the layout name is added here then invoked from the HTML template
 # all roots added here must be invoked on the HTML
 
-layout1_h, layout2_h, layout3_h, layout1_v, layout2_v, layout3_v, controls1, controls2, plot1_map, \
-    layout4_h, layout4_v, layout5_h, layout5_v, layout6_h, layout6_v, layout7 = make_layouts()
+layout1_h, layout1_v, controls1, layout7 = make_layouts()
+
+section_roots = make_section_roots()
 
 # by default layouts are created assuming we have enough width for the ideal visualization mode
 # that is, we start with horizontal layouts
+add_roots(True)
 
-# section 1
-curdoc().add_root(controls1)
-curdoc().add_root(layout1_h)
-
-# section 2
-curdoc().add_root(controls2)
-curdoc().add_root(layout2_h)
-
-# section 3
-curdoc().add_root(layout3_h)
-
-# section 4
-curdoc().add_root(layout4_h)
-
-# section 5
-curdoc().add_root(layout5_h)
+# live data updates, the watcher is shared by all the sessions of the process
+document = curdoc()
 
-# section 6
-curdoc().add_root(layout6_h)
+add_data_listener(on_data_changed)
+document.on_session_destroyed(on_session_destroyed)
 
-# section 7
-curdoc().add_root(layout7)
+start_data_watcher()
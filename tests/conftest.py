@@ -0,0 +1,103 @@
+# the modules of the app are imported by name, like main.py does, so the app directory must be on the path
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the synthetic input files start on the first day of the real ones and have DATA_DAYS days
+# the history is fixed up to MAX_DAYS, so files written with more days only gain rows
+DATA_DAYS = 760
+MAX_DAYS  = 800
+
+
+def format_dates( dates ):
+
+    return pd.DatetimeIndex(dates).strftime('%d-%m-%Y')
+
+
+# writes the files of data.DATA_FILES under root with the first days of the synthetic history
+def write_data_files( root, days ):
+
+    import data
+
+    rng   = np.random.default_rng(1)
+    dates = np.datetime64('2020-02-26') + np.arange(MAX_DAYS)
+    # the stratified series stop being reported after the 13th of March 2022, like the real ones
+    cut   = int( ( np.datetime64('2022-03-14') - dates[0] ) // np.timedelta64(1, 'D') )
+
+    for directory in [ 'merged', 'dssg', 'custom' ]:
+        os.makedirs(root + directory, exist_ok=True)
+
+    main = { 'data':              format_dates(dates),
+             'confirmados_novos': rng.integers(0, 5000, MAX_DAYS),
+             'internados':        rng.integers(0, 3000, MAX_DAYS).astype(float),
+             'internados_uci':    rng.integers(0, 300, MAX_DAYS).astype(float),
+             'obitos':            np.cumsum( rng.integers(0, 30, MAX_DAYS) ),
+             'recuperados':       rng.integers(0, 5000, MAX_DAYS) }
+    for column in data.STRAT_COLUMNS:
+        values = np.cumsum( rng.integers(0, 100, MAX_DAYS) ).astype(float)
+        values[:3] = np.nan
+        values[ rng.choice( np.arange(10, cut - 5), 8, replace=False ) ] = np.nan
+        values[cut:] = np.nan
+        main[column] = values
+    pd.DataFrame(main)[:days].to_csv(root + data.DATA_FILES['main'], index=False)
+
+    tests = { 'data': format_dates(dates), 'amostras_novas': rng.integers(1000, 50000, MAX_DAYS) }
+    pd.DataFrame(tests)[:days - 2].to_csv(root + data.DATA_FILES['tests'], index=False)
+
+    mort_dates = np.arange( np.datetime64('2014-01-01'), dates[days - 1] + 1 )
+    mort = { 'Data': format_dates(mort_dates) }
+    for column in data.MORTALITY_GROUPS[:-1]:
+        mort[column] = rng.integers(0, 40, len(mort_dates))
+    mort['geral_pais'] = sum( mort[column] for column in data.MORTALITY_GROUPS[:-1] )
+    mort['extra']      = 1
+    pd.DataFrame(mort).to_csv(root + data.DATA_FILES['mort'], index=False)
+
+    vacc_dates = np.arange( np.datetime64('2020-12-27'), np.datetime64('2022-03-01') )
+    inoculated = np.cumsum( rng.integers(0, 1000, len(vacc_dates)) ).astype(float)
+    inoculated[5:9] = np.nan
+    vacc = { 'data': format_dates(vacc_dates), 'pessoas_inoculadas': inoculated,
+             'pessoas_vacinadas_completamente': inoculated / 2, 'pessoas_reforço': inoculated / 3 }
+    pd.DataFrame(vacc).to_csv(root + data.DATA_FILES['vacc'], index=False)
+
+    for name in [ 'vacc_cfr', 'vacc_chr' ]:
+        status = { 'data': [ '2021-%02d' % month for month in range(1, 13) ] }
+        for group in [ '50_59', '60_69', '70_79', '80mais' ]:
+            for kind in [ 'outros_', 'vac_completa_', 'vac_reforco_', 'vac_reforco2_' ]:
+                status[kind + group] = rng.random(12)
+        pd.DataFrame(status).to_csv(root + data.DATA_FILES[name], index=False)
+
+
+@pytest.fixture(scope='session')
+def data_dir( tmp_path_factory ):
+
+    root = str( tmp_path_factory.mktemp('coviz-data') ) + '/'
+    write_data_files(root, DATA_DAYS)
+
+    return root
+
+
+# points data.DATA_DIR to the synthetic input files
+@pytest.fixture
+def data_files( data_dir, monkeypatch ):
+
+    import data
+
+    monkeypatch.setattr(data, 'DATA_DIR', data_dir)
+
+    return data_dir
+
+
+# the complete output of get_data for the synthetic input files, computed once and shared like the cached bundle
+@pytest.fixture(scope='session')
+def data_bundle( data_dir ):
+
+    import data
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(data, 'DATA_DIR', data_dir)
+        return data.get_data()
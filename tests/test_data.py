@@ -0,0 +1,307 @@
+# checks the data layer on synthetic input files, see conftest.py
+
+import math
+import shutil
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data
+from conftest import DATA_DAYS, write_data_files
+
+
+# same type, shape and values, NaN included, field by field for the structured arrays
+# the floats are compared with rtol, by default they must be exactly the same
+def assert_same_array( result, expected, rtol=0 ):
+
+    assert result.dtype == expected.dtype
+    assert result.shape == expected.shape
+
+    for field in expected.dtype.names or [ None ]:
+        values, expected_values = ( result[field], expected[field] ) if field else ( result, expected )
+        if values.dtype.kind == 'f':
+            np.testing.assert_allclose( values, expected_values, rtol=rtol, atol=0, equal_nan=True )
+        else:
+            np.testing.assert_array_equal( values, expected_values )
+
+
+def assert_same_outputs( result, expected, rtol=0 ):
+
+    assert set(result) >= set(data.DATA_OUTPUTS)
+
+    for name in data.DATA_OUTPUTS:
+        if isinstance(expected[name], pd.DataFrame):
+            pd.testing.assert_frame_equal( result[name], expected[name] )
+        else:
+            assert_same_array( np.asarray(result[name]), np.asarray(expected[name]), rtol )
+
+
+def test_artifact_round_trip( data_bundle, tmp_path ):
+
+    target_dir = str(tmp_path / 'artifact')
+    signature  = ( ( 'data.csv', 1, 2 ), )
+
+    data.export_data_artifact( data_bundle, signature, target_dir )
+    loaded = data.load_data_artifact( signature, target_dir )
+
+    assert loaded['exported']
+    assert set(loaded['values']) == set(data.DATA_OUTPUTS)
+    assert_same_outputs( loaded['values'], data_bundle['values'] )
+
+
+def test_artifact_signature( data_bundle, tmp_path ):
+
+    target_dir = str(tmp_path / 'artifact')
+    data.export_data_artifact( data_bundle, ( ( 'data.csv', 1, 2 ), ), target_dir )
+
+    assert data.load_data_artifact( ( ( 'data.csv', 1, 3 ), ), target_dir ) is None
+    assert data.load_data_artifact( ( ( 'data.csv', 1, 2 ), ), str(tmp_path / 'missing') ) is None
+
+
+# the artifact of the cached bundle is written in the background once its last section is computed
+def test_section_export( data_bundle, tmp_path, monkeypatch ):
+
+    target_dir = str(tmp_path / 'artifact')
+    signature  = ( ( 'data.csv', 1, 2 ), )
+    bundle     = data.make_bundle( dict(data_bundle['values']) )
+
+    monkeypatch.setattr(data, 'ARTIFACT_DIR', target_dir)
+    monkeypatch.setitem(data.data_cache, 'bundle', bundle)
+    monkeypatch.setitem(data.data_cache, 'signature', signature)
+
+    data.get_data_section( bundle, 'prevalence' )
+    assert bundle['exported']
+
+    # the artifact directory is swapped in when complete, so it is either missing or whole
+    deadline = time.monotonic() + 10
+    while data.load_data_artifact( signature, target_dir ) is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert data.load_data_artifact( signature, target_dir ) is not None
+
+
+# a copy of the synthetic input files where some can be changed, with data.DATA_DIR pointing to it
+def copy_data_files( data_dir, tmp_path, monkeypatch ):
+
+    root = str(tmp_path / 'coviz-data') + '/'
+    shutil.copytree(data_dir, root)
+    monkeypatch.setattr(data, 'DATA_DIR', root)
+
+    return root
+
+
+@pytest.mark.parametrize('name', list(data.DATA_FILES))
+def test_read_schema( data_files, name ):
+
+    schema = data.DATA_SCHEMAS[name]
+    sums   = schema.get('sums', {})
+    frame  = data.read_data_file(name)
+
+    # the columns that are not in the schema are left out and the summed parts are replaced by their sums
+    if schema['columns'] is not None:
+        parts = [ part for columns in sums.values() for part in columns ]
+        assert list(frame.columns) == [ column for column in schema['columns'] if column not in parts ] + list(sums)
+
+    for column in frame.columns:
+        if column in schema['dates']:
+            assert frame[column].dtype.kind == 'M'
+            continue
+
+        source = sums[column][0] if column in sums else column
+        assert frame[column].dtype == np.dtype( schema['dtype'].get(source, schema.get('default')) ), column
+
+
+def test_read_sums( data_files ):
+
+    frame = data.read_data_file('main')
+    raw   = pd.read_csv( data_files + data.DATA_FILES['main'] )
+
+    for column, parts in data.STRAT_TOTALS.items():
+        expected = raw[parts].sum(axis=1, min_count=len(parts)).to_numpy()
+        present  = ~np.isnan(expected)
+        # the holes were patched, the reported days keep their sums
+        np.testing.assert_array_equal( frame[column].to_numpy()[present], expected[present] )
+
+
+def test_read_int_holes( data_dir, tmp_path, monkeypatch, capsys ):
+
+    root = copy_data_files( data_dir, tmp_path, monkeypatch )
+    raw  = pd.read_csv( root + data.DATA_FILES['main'] )
+    raw.loc[ [ 5, 6 ], 'confirmados_novos' ] = np.nan
+    raw.to_csv( root + data.DATA_FILES['main'], index=False )
+
+    values = data.read_data_file('main')['confirmados_novos'].to_numpy()
+
+    assert values.dtype == np.float32
+    assert np.isnan(values[[ 5, 6 ]]).all() and not np.isnan(np.delete(values, [ 5, 6 ])).any()
+    assert 'confirmados_novos' in capsys.readouterr().out
+
+
+def test_read_missing_column( data_dir, tmp_path, monkeypatch ):
+
+    root = copy_data_files( data_dir, tmp_path, monkeypatch )
+    raw  = pd.read_csv( root + data.DATA_FILES['tests'] )
+    raw.drop( columns=[ 'amostras_novas' ] ).to_csv( root + data.DATA_FILES['tests'], index=False )
+
+    with pytest.raises(ValueError):
+        data.read_data_file('tests')
+
+
+def test_read_bad_values( data_dir, tmp_path, monkeypatch ):
+
+    root = copy_data_files( data_dir, tmp_path, monkeypatch )
+    raw  = pd.read_csv( root + data.DATA_FILES['tests'] )
+    raw['amostras_novas'] = raw['amostras_novas'].astype(object)
+    raw.loc[ 3, 'amostras_novas' ] = 'unknown'
+    raw.to_csv( root + data.DATA_FILES['tests'], index=False )
+
+    with pytest.raises(ValueError):
+        data.read_data_file('tests')
+
+
+@pytest.mark.parametrize('strings', [ [ '01-02-2021', ' 28-02-2021 ' ], [ '1-2-2021', '28-02-2021' ], [] ])
+def test_get_dates( strings ):
+
+    expected = pd.to_datetime( pd.Series(strings, dtype=str).str.strip(), format='%d-%m-%Y' ).to_numpy().astype('datetime64[D]')
+
+    np.testing.assert_array_equal( data.get_dates(strings), expected )
+
+
+def test_get_dates_invalid():
+
+    with pytest.raises(ValueError):
+        data.get_dates([ '31-02-2021' ])
+    with pytest.raises(ValueError):
+        data.get_dates([ '2021-02-01' ])
+
+
+
+def test_suffix_update():
+
+    smooth   = partial( data.get_smooth_series, window_size=7 )
+    series   = np.arange(40, dtype=float) ** 1.5
+    previous = smooth( series[:30] )
+
+    # the previous result is extended from the change on, or rebuilt when the change is within the lookback of the start
+    for change in [ 30, 20, 6, 0 ]:
+        result = data.get_suffix_update( previous if change else None, smooth, [ series ], change, 6 )
+        np.testing.assert_allclose( result, smooth(series), equal_nan=True )
+
+
+# the incremental update of a bundle against a full rebuild, for files that gained days and for a revised history
+@pytest.mark.parametrize('days, revised', [ ( DATA_DAYS + 1, False ), ( DATA_DAYS + 10, False ), ( DATA_DAYS, True ) ])
+def test_incremental_update( data_bundle, tmp_path, monkeypatch, capsys, days, revised ):
+
+    root = str(tmp_path / 'coviz-data') + '/'
+    write_data_files(root, days)
+    if revised:
+        main = pd.read_csv( root + data.DATA_FILES['main'] )
+        main.loc[ 500, 'confirmados_novos' ] += 17
+        main.to_csv( root + data.DATA_FILES['main'], index=False )
+    monkeypatch.setattr(data, 'DATA_DIR', root)
+
+    updated = data.update_data(data_bundle)
+    data.get_metrics( updated, data.DATA_OUTPUTS )
+
+    output = capsys.readouterr().out
+    assert ( 'data history was revised' in output ) == revised
+    assert ( 'data grew from' in output ) == ( not revised )
+
+    assert_same_outputs( updated['values'], data.get_data()['values'], rtol=1e-9 )
+
+
+# a listener that fails is removed, and the listeners after it still get the bundle
+def test_notify_data_listeners( monkeypatch, capsys ):
+
+    received = []
+
+    def closed( bundle ):
+        raise RuntimeError('the document was destroyed')
+
+    monkeypatch.setitem(data.data_watcher, 'listeners', [ closed, received.append ])
+
+    data.notify_data_listeners('first')
+    data.notify_data_listeners('second')
+
+    assert received == [ 'first', 'second' ]
+    assert data.data_watcher['listeners'] == [ received.append ]
+    assert 'RuntimeError' in capsys.readouterr().out
+
+
+# the max prevalence against the per day loop that it replaced
+@pytest.mark.parametrize('immunity_days', [ 1, 5, data.PREV_IMMUNITY_DAYS ])
+def test_max_prevalence( immunity_days ):
+
+    rng        = np.random.default_rng(2)
+    new        = rng.integers(0, 5000, 300).astype(float)
+    tests      = rng.integers(1000, 50000, 300).astype(float)
+    positivity = rng.random(300) / 10
+    minimum    = data.get_min_prevalence( new, data.PREV_PERIOD, data.PREV_IGNORE, data.POPULATION )
+
+    r_data = []
+    for i, element in enumerate(minimum):
+        previous_positives = sum( new[ max(0, i - immunity_days):i ] )
+        available_fraction = ( 1 - tests[i] / data.POPULATION - previous_positives / data.POPULATION )
+        r_data.append( element + available_fraction * positivity[i] )
+
+    expected = data.get_smooth_series( np.array(r_data, dtype=float), data.MAV_PERIOD )
+    result   = data.get_max_prevalence( new, minimum, tests, positivity, data.POPULATION, immunity_days )
+
+    np.testing.assert_allclose( result, expected, rtol=1e-12, equal_nan=True )
+
+
+# the per day loop of the 2015-2019 reference that get_baseline_2015_2019 replaced, for a single series
+def baseline_loop( total_deaths, span, correct ):
+
+    daily_extra = 2.64929 if correct else 0
+    years       = [ total_deaths[0:365], total_deaths[365:731], total_deaths[731:1096], total_deaths[1096:1461], total_deaths[1461:1826] ]
+    years       = [ [ value + daily_extra * ( 5 - j ) for value in year ] for j, year in enumerate(years) ]
+
+    avg_data = []
+    sd_data  = []
+    for d in range(0, span):
+        idx   = d + 55 - 365 * int( (d + 55) / 365 )
+        delta = daily_extra * int(d / 365)
+
+        avg = ( sum( year[idx] for year in years ) + 5 * delta ) / 5
+        var = sum( ( year[idx] + delta - avg ) ** 2 for year in years ) / 5
+
+        avg_data.append(avg)
+        sd_data.append(math.sqrt(var))
+
+    return avg_data, sd_data
+
+
+def test_baseline_2015_2019():
+
+    rng     = np.random.default_rng(3)
+    deaths  = rng.integers(0, 400, ( 3, 1826 )).astype(float)
+    correct = [ False, True, False ]
+
+    # the span covers more than a year so that the yearly correction is checked too
+    avg, sd = data.get_baseline_2015_2019( deaths, 800, correct )
+
+    assert avg.shape == sd.shape == ( 3, 800 )
+    for group, group_correct in enumerate(correct):
+        expected_avg, expected_sd = baseline_loop( deaths[group].tolist(), 800, group_correct )
+        np.testing.assert_allclose( avg[group], expected_avg, rtol=1e-12 )
+        np.testing.assert_allclose( sd[group], expected_sd, rtol=1e-9, atol=1e-9 )
+
+
+@pytest.mark.parametrize('smoothen', [ False, True ])
+@pytest.mark.parametrize('correct', [ False, True ])
+def test_avg_deaths_2015_2019( smoothen, correct ):
+
+    deaths = np.random.default_rng(4).integers(0, 400, 1826).astype(float)
+
+    expected_avg, expected_sd = baseline_loop( deaths.tolist(), 500, correct )
+    if smoothen:
+        expected_avg = data.get_smooth_series( np.array(expected_avg), data.MAV_PERIOD )
+
+    avg, sd = data.get_avg_deaths_2015_2019( deaths, 500, smoothen, correct )
+
+    np.testing.assert_allclose( avg, expected_avg, rtol=1e-12, equal_nan=True )
+    np.testing.assert_allclose( sd, expected_sd, rtol=1e-9, atol=1e-9 )
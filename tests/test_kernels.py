@@ -0,0 +1,251 @@
+# checks the numerical kernels against plain python versions of the same computations
+# the series cover missing values, empty and short series and windows that do not fit
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from kernels import get_prefix_sums, get_window_sums, get_range_sums, get_regression_sums, get_range_regression, get_day_limits, \
+    rolling_sum, rolling_mean, lagged_ratio, make_array, pad_nan, patch_gaps
+
+nan = float('nan')
+
+
+def make_series( length, seed, holes=0.2 ):
+
+    rng = random.Random(seed)
+
+    return [ nan if rng.random() < holes else float(rng.randint(-5, 50)) for _ in range(length) ]
+
+
+SERIES = [ [], [ 1.0 ], [ nan ], [ 2.0, nan ], [ nan, nan, nan ], [ 1.0, 2.0, 3.0, 4.0 ] ] + \
+         [ make_series(length, seed) for seed, length in enumerate([ 5, 8, 17, 40, 100 ]) ]
+
+
+# python sum of a window, NaN if a value of the window is missing
+def window_sum( data, left, right ):
+
+    window = data[left:right]
+    if any( math.isnan(x) for x in window ):
+        return nan
+
+    return float(sum(window))
+
+
+def assert_same( result, expected ):
+
+    np.testing.assert_allclose( np.asarray(result, dtype=float), np.asarray(expected, dtype=float), rtol=1e-12, atol=1e-9, equal_nan=True )
+
+
+def test_make_array():
+
+    result = make_array([ 1, None, 2.5, nan ])
+
+    assert result.dtype == np.float64
+    assert_same( result, [ 1.0, nan, 2.5, nan ] )
+    assert make_array([]).shape == ( 0, )
+
+
+@pytest.mark.parametrize('data', SERIES)
+@pytest.mark.parametrize('count', [ 0, 1, 3, 50, 200 ])
+def test_pad_nan( data, count ):
+
+    expected = [ nan ] * min(count, len(data)) + data[count:]
+    expected = expected + [ nan ] * ( count - len(expected) )
+
+    result = pad_nan(data, count)
+    assert result.dtype == np.float64
+    assert_same( result, expected )
+
+
+def test_pad_nan_matrix():
+
+    rows   = [ make_series(10, seed) for seed in range(3) ]
+    result = pad_nan(rows, 4)
+
+    assert result.shape == ( 3, 10 )
+    for row, row_result in zip(rows, result):
+        assert_same( row_result, [ nan ] * 4 + row[4:] )
+
+
+@pytest.mark.parametrize('data', SERIES)
+def test_window_sums( data ):
+
+    prefix = get_prefix_sums(data)
+    assert prefix[0].shape == ( len(data) + 1, )
+
+    pairs = [ ( left, right ) for left in range(len(data) + 1) for right in range(left, len(data) + 1) ]
+    if not pairs:
+        return
+
+    left, right = np.array(pairs).T
+    assert_same( get_window_sums(prefix, left, right), [ window_sum(data, l, r) for l, r in pairs ] )
+
+
+def test_prefix_sums_matrix():
+
+    rows = [ make_series(12, seed) for seed in range(3) ]
+    sums, nans = get_prefix_sums(rows)
+
+    for row, row_sums, row_nans in zip(rows, sums, nans):
+        assert_same( row_sums, [ sum( x for x in row[:i] if not math.isnan(x) ) for i in range(len(row) + 1) ] )
+        assert list(row_nans) == [ sum( math.isnan(x) for x in row[:i] ) for i in range(len(row) + 1) ]
+
+
+@pytest.mark.parametrize('data', SERIES)
+@pytest.mark.parametrize('window', [ 1, 3, 7 ])
+@pytest.mark.parametrize('lag', [ 0, 2 ])
+@pytest.mark.parametrize('partial', [ False, True ])
+def test_rolling_sum( data, window, lag, partial ):
+
+    # the partial windows at the start sum the days that are available
+    expected = []
+    for i in range(len(data)):
+        right = i + 1 - lag
+        left  = max(right - window, 0) if partial else right - window
+        if left < 0 or left > right or right > len(data):
+            expected.append(nan)
+        else:
+            expected.append( window_sum(data, left, right) )
+
+    assert_same( rolling_sum(data, window, lag, partial), expected )
+
+
+def test_rolling_mean_matrix():
+
+    rows = [ make_series(20, seed) for seed in range(4) ]
+    result = rolling_mean(rows, 7)
+
+    assert result.shape == ( 4, 20 )
+    for row, row_result in zip(rows, result):
+        assert_same( row_result, [ nan if i < 6 else window_sum(row, i - 6, i + 1) / 7 for i in range(20) ] )
+
+
+@pytest.mark.parametrize('data', SERIES)
+@pytest.mark.parametrize('lag', [ 0, 1, 3, 200 ])
+def test_lagged_ratio( data, lag ):
+
+    den = [ x + 1 for x in data ]
+
+    expected = []
+    for i in range(len(data)):
+        if i < lag or data[i] == 0 or den[i - lag] == 0 or math.isnan(data[i]) or math.isnan(den[i - lag]):
+            expected.append(nan)
+        else:
+            expected.append( data[i] / den[i - lag] )
+
+    assert_same( lagged_ratio(data, den, lag), expected )
+
+
+# python version of patch_gaps for a single series
+def patch_series( data, max_gap, leading ):
+
+    values  = list(data)
+    patched = [ False ] * len(data)
+    present = [ i for i, x in enumerate(data) if not math.isnan(x) ]
+
+    for i, x in enumerate(data):
+        if not math.isnan(x):
+            continue
+
+        before = [ j for j in present if j < i ]
+        after  = [ j for j in present if j > i ]
+
+        if before and after:
+            previous, following = before[-1], after[0]
+            if following - previous - 1 <= max_gap:
+                weight = ( i - previous ) / ( following - previous )
+                values[i]  = data[previous] * ( 1 - weight ) + data[following] * weight
+                patched[i] = True
+        elif not before and leading == 'zero':
+            values[i], patched[i] = 0.0, True
+        elif not before and leading == 'first' and after:
+            values[i], patched[i] = data[after[0]], True
+
+    return values, patched
+
+
+PATCH_SERIES = SERIES + [ [ nan, nan, 3.0, nan, 5.0, nan, nan, 8.0, nan, nan, nan, 12.0, nan ] ]
+
+
+@pytest.mark.parametrize('data', PATCH_SERIES)
+@pytest.mark.parametrize('max_gap', [ 1, 2 ])
+@pytest.mark.parametrize('leading', [ None, 'zero', 'first' ])
+def test_patch_gaps( data, max_gap, leading ):
+
+    values, patched = patch_gaps(data, max_gap, leading)
+    expected_values, expected_patched = patch_series(data, max_gap, leading)
+
+    assert_same( values, expected_values )
+    assert list(patched) == expected_patched
+
+
+def test_patch_gaps_matrix():
+
+    rows = [ PATCH_SERIES[-1], make_series(13, 1, 0.5), make_series(13, 2, 0.5) ]
+    values, patched = patch_gaps(rows, 2, 'first')
+
+    for row, row_values, row_patched in zip(rows, values, patched):
+        expected_values, expected_patched = patch_series(row, 2, 'first')
+        assert_same( row_values, expected_values )
+        assert list(row_patched) == expected_patched
+
+
+@pytest.mark.parametrize('data', SERIES)
+def test_range_sums( data ):
+
+    sums = get_prefix_sums(data)[0]
+    clean = [ 0.0 if math.isnan(x) else x for x in data ]
+
+    # any range, clipped like a python slice would
+    for start in range(-2, len(data) + 3):
+        for end in range(-2, len(data) + 3):
+            expected = sum( clean[ max(start, 0):max(end, 0) ] )
+            assert_same( get_range_sums(sums, start, end), expected )
+
+
+def test_range_regression():
+
+    x = make_series(60, 7)
+    y = [ 3 * a - 2 + ( i % 5 ) for i, a in enumerate(x) ]
+    y[10] = nan
+    sums = get_regression_sums(x, y)
+
+    for start, end in [ ( 0, 60 ), ( 5, 30 ), ( 20, 23 ), ( 40, 41 ), ( 30, 30 ) ]:
+        pairs = [ ( a, b ) for a, b in zip(x[start:end], y[start:end]) if not ( math.isnan(a) or math.isnan(b) ) ]
+        slope, intercept, r_value = get_range_regression(sums, start, end)
+
+        if len(pairs) < 2:
+            assert math.isnan(slope) and math.isnan(r_value)
+            continue
+
+        expected = np.polyfit( [ a for a, b in pairs ], [ b for a, b in pairs ], 1 )
+        assert_same( [ slope, intercept ], expected )
+        assert_same( r_value, np.corrcoef( [ a for a, b in pairs ], [ b for a, b in pairs ] )[0, 1] )
+
+
+# python limits of each day over several series, ignoring the missing values
+def day_limits( rows, day ):
+
+    values = [ row[day] for row in rows if not math.isnan(row[day]) ]
+    if not values:
+        return nan, nan
+
+    return min(values), max(values)
+
+
+@pytest.mark.parametrize('data', SERIES)
+def test_day_limits( data ):
+
+    rows = [ data, [ x * 2 - 7 for x in data ], make_series(len(data), 9, 0.5) ]
+    low, high = get_day_limits(rows)
+
+    assert low.shape == high.shape == ( len(data), )
+    assert_same( low,  [ day_limits(rows, i)[0] for i in range(len(data)) ] )
+    assert_same( high, [ day_limits(rows, i)[1] for i in range(len(data)) ] )
+
+    # a single series is its own limits
+    for limits in get_day_limits(data):
+        assert_same( limits, data )
@@ -0,0 +1,98 @@
+# checks the data source helpers, through the events that the document would send to the browser
+
+import numpy as np
+import pytest
+from bokeh.document import Document
+from bokeh.document.events import ColumnDataChangedEvent, ColumnsPatchedEvent, ColumnsStreamedEvent
+from bokeh.models import ColumnDataSource
+
+from util import get_y_limits, update_data_source
+
+nan = float('nan')
+
+
+def make_columns( days, y ):
+
+    return { 'x': np.datetime64('2021-01-01', 'ms') + np.arange(days) * np.timedelta64(1, 'D'), 'y': np.asarray(y, dtype=float) }
+
+
+# applies update_data_source to a source in a document, returning the events it made
+# the streams and the patches arrive as a change of the data with the specific event as hint
+def get_update_events( old, new ):
+
+    source   = ColumnDataSource(data=old)
+    document = Document()
+    document.add_root(source)
+
+    events = []
+    document.on_change( lambda event: events.append( event.hint if getattr(event, 'hint', None) is not None else event ) )
+    update_data_source( source, new )
+
+    for key in new:
+        np.testing.assert_array_equal( np.asarray(source.data[key]), np.asarray(new[key]) )
+
+    return events
+
+
+def get_event_types( events ):
+
+    return [ type(event) for event in events ]
+
+
+def test_unchanged():
+
+    assert get_update_events( make_columns(4, [ 1, nan, 3, 4 ]), make_columns(4, [ 1, nan, 3, 4 ]) ) == []
+
+
+def test_stream():
+
+    events = get_update_events( make_columns(4, [ 1, nan, 3, 4 ]), make_columns(6, [ 1, nan, 3, 4, 5, 6 ]) )
+
+    assert get_event_types(events) == [ ColumnsStreamedEvent ]
+    np.testing.assert_array_equal( events[0].data['y'], [ 5, 6 ] )
+
+
+def test_patch():
+
+    events = get_update_events( make_columns(5, [ 1, 2, 3, 4, 5 ]), make_columns(5, [ 1, 7, 3, 8, 5 ]) )
+
+    assert get_event_types(events) == [ ColumnsPatchedEvent ]
+    ( rows, values ), = events[0].patches['y']
+    assert rows == slice(1, 4)
+    np.testing.assert_array_equal( values, [ 7, 3, 8 ] )
+
+
+def test_patch_and_stream():
+
+    events = get_update_events( make_columns(4, [ 1, 2, nan, 4 ]), make_columns(6, [ 1, 2, 3, 4, 5, 6 ]) )
+
+    assert get_event_types(events) == [ ColumnsPatchedEvent, ColumnsStreamedEvent ]
+    assert list(events[0].patches) == [ 'y' ]
+
+
+# a shorter series, a shifted date axis or different columns can't be expressed as patches and streams
+@pytest.mark.parametrize('new', [ make_columns(3, [ 1, 2, 3 ]),
+                                  { 'x': make_columns(4, [])['x'] + np.timedelta64(1, 'D'), 'y': np.ones(4) },
+                                  dict(make_columns(4, [ 1, 2, 3, 4 ]), z=np.ones(4)) ])
+def test_replace( new ):
+
+    events = get_update_events( make_columns(4, [ 1, 2, 3, 4 ]), new )
+
+    assert get_event_types(events) == [ ColumnDataChangedEvent ]
+
+
+# the limits of the y columns against the loop over the columns of the source that get_y_limits replaced
+def test_y_limits():
+
+    rng     = np.random.default_rng(5)
+    columns = make_columns(30, rng.normal(size=30))
+    columns['y2'] = rng.normal(size=30) * 3
+    columns['y'][[ 3, 4, 12 ]] = nan
+    columns['y2'][[ 4, 20 ]]   = nan
+    source = ColumnDataSource(data=columns)
+
+    for y_i, y_f in [ ( 0, 30 ), ( 6, 29 ), ( 10, 13 ), ( 2, 6 ) ]:
+        y_min = min( np.nanmin(columns[s][y_i:y_f]) for s in [ 'y', 'y2' ] )
+        y_max = max( np.nanmax(columns[s][y_i:y_f]) for s in [ 'y', 'y2' ] )
+
+        assert get_y_limits( source, y_i, y_f ) == ( y_min, y_max )
@@ -9,11 +9,14 @@ from functools import partial
 from datetime import datetime, timedelta
 from bokeh.io import curdoc
 from bokeh.layouts import layout, gridplot, column, row
-from bokeh.models import Button, Toggle, CategoricalColorMapper, ColumnDataSource, TableColumn, DataTable, HoverTool, Label, SingleIntervalTicker, Slider, Spacer, GlyphRenderer, DatetimeTickFormatter, DateRangeSlider, DataRange1d, Range1d, DateSlider, LinearColorMapper, Div, CustomJS, Band, HTMLTemplateFormatter, StringFormatter, Scatter, Slope
+from bokeh.models import Button, Toggle, CategoricalColorMapper, ColumnDataSource, TableColumn, DataTable, HoverTool, Label, SingleIntervalTicker, Slider, Spacer, GlyphRenderer, DatetimeTickFormatter, DateRangeSlider, DataRange1d, Range1d, DateSlider, LinearColorMapper, Div, CustomJS, Band, HTMLTemplateFormatter, StringFormatter, Scatter, Slope, ColorBar, CDSView, IndexFilter
 from bokeh.palettes import Inferno256, Magma256, Turbo256, Plasma256, Cividis256, Viridis256, OrRd
 from bokeh.plotting import figure
+from bokeh.tile_providers import get_provider
 from bokeh.events import DocumentReady
 
+from kernels import get_range_regression, get_day_limits
+
 # import configuration variables
 from config import *
 
@@ -72,33 +75,103 @@ def make_data_source_multi( datax, datay_list ):
     return data_dict
 
 
-# create a data source based on dates
-def make_data_source_dates( dates, datay, datay2=None ):
+# the y series as float arrays
+# this is a copy, because the sources own their columns and may patch them on data updates
+# with PLOT_COMPACT_DATA they are float32, rounded to precision decimals unless it is None
+def make_float_series( datay, precision=None ):
 
-    if datay2:
-        df = pd.DataFrame(data={ 'x': dates, 'y': datay, 'y2': datay2 }, columns=['x', 'y', 'y2'])
-    else:
-        df = pd.DataFrame(data={ 'x': dates, 'y': datay }, columns=['x', 'y'])
+    if not PLOT_COMPACT_DATA:
+        return np.array(datay, dtype=float)
+
+    if precision is not None:
+        datay = np.round(datay, precision)
+
+    return np.array(datay, dtype=np.float32)
 
-    return ColumnDataSource(df)
+
+# the columns of a data source based on dates
+# the dates are a datetime64 array that is shared by all the sources
+def make_dates_columns( dates, precision=None, **columns ):
+
+    data_dict = { 'x': dates }
+    for key, datay in columns.items():
+        data_dict[key] = make_float_series(datay, precision)
+
+    return data_dict
 
 
 # receives a list of lists on for y0, y1, y2, ....
-def make_data_source_multi_dates( datax, datay_list ):
+def make_multi_dates_columns( datax, datay_list, precision=None ):
+
+    return make_dates_columns( datax, precision, **{ 'y' + str(j): datay for j, datay in enumerate(datay_list) } )
+
+
+# create a data source based on dates
+def make_data_source_dates( dates, datay, datay2=None, precision=None ):
+
+    if datay2 is not None:
+        return ColumnDataSource(data=make_dates_columns(dates, precision, y=datay, y2=datay2))
+
+    return ColumnDataSource(data=make_dates_columns(dates, precision, y=datay))
+
+
+# same as above, for sources with several y columns, named as in the keyword arguments
+def make_data_source_dates_columns( dates, precision=None, **columns ):
+    return ColumnDataSource(data=make_dates_columns(dates, precision, **columns))
+
+
+# same as above, for a list of y series named y0, y1, y2, ...
+def make_data_source_multi_dates( datax, datay_list, precision=None ):
+    return ColumnDataSource(data=make_multi_dates_columns(datax, datay_list, precision))
+
+
+# the rows of old that have a different value in new, NaN is equal to NaN
+def get_changed_rows( old, new ):
+
+    old = np.asarray(old)
+    new = np.asarray(new)[:len(old)]
+
+    changed = old != new
+    if old.dtype.kind == 'f':
+        changed &= ~( np.isnan(old) & np.isnan(new) )
+
+    return changed
+
+
+# brings a data source to the new columns sending only the differences to the browser
+# revised rows are patched and new rows are streamed, anything else replaces the data
+def update_data_source( source, data ):
+
+    old_length = len(source.data['x'])
+    new_length = len(data['x'])
+
+    if set(source.data) != set(data) or new_length < old_length or get_changed_rows(source.data['x'], data['x']).any():
+        source.data = data
+        return
+
+    patches = {}
+    for key in data:
+        changed = np.flatnonzero( get_changed_rows(source.data[key], data[key]) )
+        if len(changed) > 0:
+            # a single slice from the first to the last revised row
+            first, last = changed[0], changed[-1] + 1
+            patches[key] = [ ( slice(first, last), data[key][first:last] ) ]
+
+    if patches:
+        source.patch(patches)
+
+    if new_length > old_length:
+        source.stream({ key: data[key][old_length:] for key in data })
 
-    length = len(datay_list)
-    columns = []
-    data_dict = {}
-    data_dict['x'] = datax
-    columns.append('x')
-    for j in range(0, length):
-        key = 'y' + str(j)
-        data_dict[key] = datay_list[j]
-        columns.append(key)
 
-    df = pd.DataFrame(data=data_dict, columns=columns)
+# the position of a date on a daily date axis, as an integer day offset
+def get_date_index( dates, date ):
+    return int( ( np.datetime64(date, 'D') - dates[0] ) // np.timedelta64(1, 'D') )
 
-    return ColumnDataSource(df)
+
+# the milliseconds since the epoch that the bokeh date widgets use
+def get_date_ms( date ):
+    return int( np.datetime64(date, 'ms').astype('int64') )
 
 
 # generate the labels for the age stratified plots
@@ -114,14 +187,11 @@ def make_age_labels( nr_labels, nr_series ):
     return labels
 
 
-# create the map plot, using Pandas-Bokeh
+# create the map plot, with the patches from get_counties_patches plus an incidence column
 def make_map_plot( data ):
 
     hover_string = [ ('County', '@NAME_2'), ('Incidence', '@incidence'), ]
 
-    # According to the docs the colormap parameter of the plot_bokeh function:
-    # "Defines the colors to plot. Can be either a list of colors or the name of a Bokeh color palette"
-
     # because our original palette has the colors in the wrong direction
     # and because of this https://github.com/bokeh/bokeh/issues/7297
     # we can't just invert the colormap_range or we loose the legend on the color bar
@@ -129,14 +199,27 @@ def make_map_plot( data ):
 
     colormap = reverse_palette(OrRd)[MAP_INCIDENCE_RESOLUTION]
 
-    # we now create a plot based on a geodataframe to which an incidence column has been added
+    # the shapes are already projected and simplified, so we build the same plot that
+    # the plot_bokeh function of Pandas-Bokeh used to build, without processing the geometry
     # https://patrikhlobil.github.io/Pandas-Bokeh/#geoplots
-    aplot = data.plot_bokeh( name='themap', title=MAP_TITLE, category='incidence', hovertool=True, colormap=colormap, colormap_range=(MAP_INCIDENCE_MIN, MAP_INCIDENCE_MAX),
-                             hovertool_string=hover_string, legend=False, figsize=(MAP_WIDTH, MAP_HEIGHT), simplify_shapes=MAP_RESOLUTION, tile_provider=MAP_TILE_PROVIDER)
+    aplot = figure( title=MAP_TITLE, plot_width=MAP_WIDTH, plot_height=MAP_HEIGHT, x_axis_type='mercator', y_axis_type='mercator', match_aspect=True, output_backend='webgl' )
+
+    if MAP_TILE_PROVIDER is not None:
+        aplot.add_tile(get_provider(MAP_TILE_PROVIDER))
+
+    # the Colormap column is the one that gets updated when the date changes
+    map_data = data.copy()
+    map_data['Colormap'] = map_data['incidence']
+
+    data_source  = ColumnDataSource(map_data)
+    color_mapper = LinearColorMapper(palette=colormap, low=MAP_INCIDENCE_MIN, high=MAP_INCIDENCE_MAX)
 
-    # we are selecting the plot by name and then getting the data_source
-    # the name was given in the invocatino of plot_bokeh
-    data_source = aplot.select(name='themap').data_source
+    glyph = aplot.multi_polygons( xs='__x__', ys='__y__', source=data_source, fill_color={ 'field': 'Colormap', 'transform': color_mapper }, line_color='black', name='themap' )
+
+    aplot.add_tools( HoverTool(renderers=[ glyph ], tooltips=hover_string) )
+
+    color_bar = ColorBar(color_mapper=color_mapper, label_standoff=12, border_line_color=None, location=(0, 0))
+    aplot.add_layout(color_bar, 'right')
 
     # remove the interactions and decorations
     aplot.toolbar.active_drag   = None
@@ -155,7 +238,8 @@ def make_map_plot( data ):
 def make_stats_table( width, height, alignment ):
 
     # we initialize this with dummy values
-    stats_data   = pd.DataFrame( { 'updated': '01-01-1970', 'sum_new': [0], 'sum_cv19_deaths': [0], 'sum_total_deaths': [0], 'sum_avg_deaths': [0], 'excess_deaths': [0], 'excess_deaths_pct': [0] } )
+    # the columns are lists because update_stats patches them with html strings and numbers
+    stats_data   = { 'updated': [ '01-01-1970' ], 'sum_new': [ 0 ], 'sum_cv19_deaths': [ 0 ], 'sum_total_deaths': [ 0 ], 'sum_avg_deaths': [ 0 ], 'excess_deaths': [ 0 ], 'excess_deaths_pct': [ 0 ] }
     stats_source = ColumnDataSource(stats_data)
 
     # the colors match the plot titles and the main plot lines, respectively
@@ -191,10 +275,11 @@ def make_stats_table( width, height, alignment ):
 def make_mortality_stats_table( width, height, alignment ):
 
     # we initialize this with dummy values
+    # the columns are lists because update_mortality_stats patches them with html strings and numbers
     dummy_column = [ 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0 ]
-    index_column = [ '<1', '1-4', '5-14', '15-24', '25-34', '35-44', '45-54', '55-64', '65-74', '75-84', '>85', 'all ages', 'all ages *' ]
+    index_column = [ '<1', '1-4', '5-14', '15-24', '25-34', '35-44', '45-54', '55-64', '65-74', '75-84', '>85', 'all ages', 'all ages*' ]
 
-    stats_data   = pd.DataFrame( { 'age_group': index_column, 'sum_total_deaths': dummy_column, 'sum_avg_deaths': dummy_column, 'excess_deaths': dummy_column, 'excess_deaths_pct': dummy_column } )
+    stats_data   = { 'age_group': index_column, 'sum_total_deaths': list(dummy_column), 'sum_avg_deaths': list(dummy_column), 'excess_deaths': list(dummy_column), 'excess_deaths_pct': list(dummy_column) }
 
     stats_source = ColumnDataSource(stats_data)
 
@@ -225,6 +310,13 @@ def make_mortality_stats_table( width, height, alignment ):
     return stats_table
 
 
+# the cumulative sums behind a stats table, one flat column per name, for the stats callbacks that run in the browser
+# a matrix of sums becomes a column of its rows one after the other, each with days + 1 values
+def make_sums_columns( sums, names ):
+
+    return { name: np.ravel(series) for name, series in zip(names, sums) }
+
+
 # set properties common to all the plots based on linear xaxis
 def set_plot_details( aplot, xlabel=PLOT_X_LABEL, ylabel=PLOT_Y_LABEL, xtooltip_format="@x{0}", ytooltip_format="@y{0}", tooltip_mode='vline', show_x_label=True, show_y_label=False, ylabel2=PLOT_Y_LABEL, ytooltip_format2=None, tooltip_line=None, show_x_axis=True, ylabel3=PLOT_Y_LABEL, ytooltip_format3=None ):
     aplot.toolbar.active_drag    = None
@@ -332,13 +424,13 @@ def set_plot_date_details( aplot, date_series, length, asource=None ):
 
     aplot.xaxis.formatter = DatetimeTickFormatter( months=["%b %Y"], years=["%b %Y"], )
 
-    aplot.x_range.start = date_series[0]          - datetime(1970, 1, 1).date()
-    aplot.x_range.end   = date_series[length - 1] - datetime(1970, 1, 1).date()
+    aplot.x_range.start = date_series[0]
+    aplot.x_range.end   = date_series[length - 1]
 
     aplot.xaxis.major_label_orientation = math.pi / 4
 
     if asource:
-        y_min, y_max = get_y_limits(asource, date_series[0 + DATE_IGNORE], date_series[length - 1])
+        y_min, y_max = get_y_limits(asource, 0 + DATE_IGNORE, length - 1)
         range_delta = y_max * PLOT_RANGE_FACTOR
 
         # this thing alone prevents an interference from toggling the visibility of clines
@@ -362,32 +454,40 @@ def reverse_palette( original_palette ):
     return palette
 
 
+# the per day minimum and maximum of the y columns of a plot source
+def get_source_day_limits( source ):
+
+    # x and index are also series in the data source, let's ignore them
+    return get_day_limits([ source.data[s] for s in source.data if s != 'x' and s != 'index' ])
+
+
 # calculate a value range adapted to the values present in the date range
-def get_y_limits( source, date_i, date_f ):
-
-    # calculate indexes in the y data
-    y_i = np.where( source.data['x'] == date_i )[0][0]
-    y_f = np.where( source.data['x'] == date_f )[0][0]
-
-    # get min and max iterating over the plot series
-    y_max_list = []
-    y_min_list = []
-    for s in source.data:
-        # x and index are also sries in the data source, let's ignore them
-        if s == 'x' or s == 'index':
-            continue
-        y_max_list.append( np.nanmax(source.data[s][y_i:y_f]) )
-        y_min_list.append( np.nanmin(source.data[s][y_i:y_f]) )
+# y_i and y_f are the day offsets of the dates, see get_date_index
+def get_y_limits( source, y_i, y_f ):
+
+    low, high = get_source_day_limits(source)
 
     # return the minimum of the minimuns for the interval, same for maximum
-    return min(y_min_list), max(y_max_list)
+    return np.nanmin(low[y_i:y_f]), np.nanmax(high[y_i:y_f])
+
+
+# the per day limits of a plot source, for the range callbacks that run in the browser
+# they are shipped instead of a whole range index, which the browser builds from them when first needed
+def make_limits_columns( source ):
+
+    low, high = get_source_day_limits(source)
+
+    return { 'low': make_float_series(low), 'high': make_float_series(high) }
+
+
+def make_limits_source( source ):
+    return ColumnDataSource(data=make_limits_columns(source))
 
 
 # make specific plot for mortality comparisons
 def make_mortality_plot( data_dates, data_total_deaths, data_avg_deaths, data_avg_deaths_inf, data_avg_deaths_sup, days, name ):
 
-    df = pd.DataFrame(data={ 'x': data_dates, 'y': data_total_deaths, 'y2': data_avg_deaths, 'y3': data_avg_deaths_inf, 'y4': data_avg_deaths_sup }, columns=['x', 'y', 'y2', 'y3', 'y4'])
-    data_source = ColumnDataSource(df)
+    data_source = make_data_source_dates_columns(data_dates, PLOT_DATA_PRECISION['strat_mortality_info'], y=data_total_deaths, y2=data_avg_deaths, y3=data_avg_deaths_inf, y4=data_avg_deaths_sup)
 
     aplot = figure(plot_height=PLOT_HEIGHT4, plot_width=PLOT_WIDTH4, title='Overall deaths by age group', tools=PLOT_TOOLS, x_range=[0, days], name=name, x_axis_type='auto', sizing_mode='scale_width', max_width=PLOT_WIDTH4 )
 
@@ -407,29 +507,6 @@ def make_mortality_plot( data_dates, data_total_deaths, data_avg_deaths, data_av
     return aplot
 
 
-# the index of the first non-NaN element
-def get_nn_index( data ):
-
-    index = 0
-    for element in data:
-        if not math.isnan(element):
-            # print('first non NaN is index', index)
-            return index
-        else:
-            index = index + 1
-
-    print('did not found any non-NaN element')
-    return -1
-
-
-# return lists without leading NaNs
-def get_clean_data( data ):
-
-    index = get_nn_index(data)
-
-    return data[index:]
-
-
 # creates a correlation description string
 def make_correlation_str( slope, intercept, r_value ):
 
@@ -442,42 +519,32 @@ def make_correlation_str( slope, intercept, r_value ):
     return corr_str
 
 
-# returns the correlation paramters
-def get_correlation_data( datax, datay ):
-
-    fit_results = np.polyfit(datax, datay, 1, full=True)
-
-    slope     = fit_results[0][0]
-    intercept = fit_results[0][1]
-
-    # this is not necessary, stays here for reference
-    # y_fit = [slope*i + intercept  for i in datax]
-
-    # Pearson correlation coefficient
-    # https://realpython.com/numpy-scipy-pandas-correlation-python/#example-numpy-correlation-calculation
-    r_value   = np.corrcoef( datax, datay )[0, 1]
-
-    # print('slope', slope, 'intercept', intercept, 'coeff', r_value)
-
-    return slope, intercept, r_value
+# the columns of the correlation plot source, with all the days of both series
+def make_correlation_columns( datax, datay ):
+    return dict(x=make_float_series(datax), y=make_float_series(datay))
 
 
 # make specific correlation plot
-def make_correlation_plot( datax, datay, xlabel, ylabel, height, width ):
+# the source has all the days, the scatter shows the ones in the index filter of its view, see get_range_regression for the fit
+def make_correlation_plot( datax, datay, regression_sums, xlabel, ylabel, height, width ):
+
+    source_aplot = ColumnDataSource(data=make_correlation_columns(datax, datay))
 
-    source_aplot = make_data_source(datax, datay)
+    # the NaNs due to moving averages are left out of the view
+    correlation_filter = IndexFilter(indices=np.flatnonzero( ~np.isnan(datax) & ~np.isnan(datay) ).tolist())
+    correlation_view   = CDSView(source=source_aplot, filters=[ correlation_filter ])
 
-    aplot = make_plot('Deaths correlation', PLOT_CORRELATION_TITLE, max(datax), 'auto', height, width)
+    aplot = make_plot('Deaths correlation', PLOT_CORRELATION_TITLE, np.nanmax(datax), 'auto', height, width)
 
     # we want the same limits in both axis
-    max_value = max(max(datay), max(datax) )
+    max_value = max(np.nanmax(datay), np.nanmax(datax) )
     margin = 10
 
     aplot.x_range = Range1d(0, max_value + margin)
     aplot.y_range = Range1d(0, max_value + margin)
 
     glyph = Scatter(x='x', y='y', marker='dot', size=20, line_color=PLOT_LINE_COLOR, line_alpha=PLOT_LINE_ALPHA)
-    aplot.add_glyph(source_aplot, glyph)
+    aplot.add_glyph(source_aplot, glyph, view=correlation_view)
 
     aplot.xaxis.axis_label = xlabel
     aplot.yaxis.axis_label = ylabel
@@ -487,7 +554,7 @@ def make_correlation_plot( datax, datay, xlabel, ylabel, height, width ):
     aplot.toolbar.active_tap    = None
     aplot.toolbar_location      = None
 
-    slope, intercept, r_value = get_correlation_data(datax, datay)
+    slope, intercept, r_value = get_range_regression(regression_sums, 0, len(datax))
 
     regression_line = Slope(gradient=slope, y_intercept=intercept, line_color=PLOT_LINE_COLOR_REFERENCE, line_alpha=PLOT_LINE_ALPHA, line_width=PLOT_LINE_WIDTH, line_dash='dashed')
 
@@ -503,7 +570,7 @@ def make_correlation_plot( datax, datay, xlabel, ylabel, height, width ):
 
     aplot.add_layout(regression_label)
 
-    return aplot, source_aplot, r_value, regression_line, regression_label
+    return aplot, source_aplot, correlation_filter, r_value, regression_line, regression_label
 
 
 # make specific CFR/CHR plots